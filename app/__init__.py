@@ -16,9 +16,21 @@ logging.basicConfig(level=logging.INFO,
 # Garante que a pasta de uploads exista
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Métricas de latência por rota (expostas em /metrics)
+from app.services import metrics
+metrics.init_app(app)
+
 # Importa as rotas no final para evitar importações circulares.
 # O Python irá ler este ficheiro, criar a 'app', e só depois carregar as rotas
 # que dependem da 'app'.
 from app import routes
 
+# Carrega e pré-processa as regras SHACL uma única vez no arranque e, se
+# configurado, o modelo de NLU (para que a primeira pergunta não espere por ele)
+from app.services import chatbot_logic, validation_engine
+with app.app_context():
+    validation_engine.get_shapes()
+    if app.config['NLU_WARMUP']:
+        chatbot_logic.warm_up_nlp()
+
 app.logger.info('Aplicação BIM Unificada iniciada com sucesso.')
\ No newline at end of file
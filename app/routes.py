@@ -1,35 +1,90 @@
+import hashlib
+import json
 import os
 import uuid
-from flask import render_template, request, jsonify, current_app
+from flask import Response, render_template, request, jsonify, current_app, stream_with_context
+from werkzeug.utils import secure_filename
 from app import app
-from .services import validation_engine, fuseki_manager, chatbot_logic
+from .services import fuseki_manager, chatbot_logic, job_manager, metrics, quantity_takeoff, serving, upload_pipeline, sparql_client
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/validate', methods=['POST'])
-def validate_ifc_model():
-    if 'ifc_file' not in request.files: return jsonify({"error": "Nenhum ficheiro enviado."}), 400
+def _save_uploaded_ifc():
+    """
+    Valida e guarda o ficheiro enviado, calculando o seu SHA-256 durante a escrita.
+    Devolve (upload, None) ou (None, resposta de erro), onde upload tem o caminho,
+    o nome do modelo (do nome original do ficheiro) e o hash do conteúdo.
+    """
+    if 'ifc_file' not in request.files: return None, (jsonify({"error": "Nenhum ficheiro enviado."}), 400)
     file = request.files['ifc_file']
     if file.filename == '' or not file.filename.lower().endswith('.ifc'):
-        return jsonify({"error": "Ficheiro inválido. Apenas .ifc é suportado."}), 400
+        return None, (jsonify({"error": "Ficheiro inválido. Apenas .ifc é suportado."}), 400)
 
     filename = str(uuid.uuid4()) + '.ifc'
     ifc_file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    digest = hashlib.sha256()
+    with open(ifc_file_path, 'wb') as f:
+        for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    upload = {
+        "path": ifc_file_path,
+        "model_name": os.path.splitext(secure_filename(file.filename))[0] or "default",
+        "content_hash": digest.hexdigest(),
+    }
+    return upload, None
+
+@app.route('/validate', methods=['POST'])
+def validate_ifc_model():
+    upload, error = _save_uploaded_ifc()
+    if error: return error
     try:
-        file.save(ifc_file_path)
-        validation_results = validation_engine.validate_model(ifc_file_path)
-        rdf_graph = fuseki_manager.convert_ifc_to_rdf(ifc_file_path)
-        if not rdf_graph or not fuseki_manager.upload_to_fuseki(rdf_graph):
-            validation_results.append({"type": "ERRO", "message": "Falha ao carregar modelo no motor de consulta."})
-            return jsonify(validation_results), 500
-        return jsonify(validation_results)
+        outcome = upload_pipeline.process_ifc_upload(upload["path"], upload["model_name"], upload["content_hash"])
+        return jsonify(outcome["results"]), (200 if outcome["success"] else 500)
     except Exception as e:
         current_app.logger.error(f"ERRO CRÍTICO: {e}", exc_info=True)
         return jsonify({"error": "Ocorreu um erro inesperado no servidor."}), 500
-    finally:
-        if os.path.exists(ifc_file_path): os.remove(ifc_file_path)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_validation_job():
+    """Recebe o ficheiro e devolve de imediato o ID da tarefa de processamento."""
+    upload, error = _save_uploaded_ifc()
+    if error: return error
+    job_id = job_manager.submit_job(upload_pipeline.process_ifc_upload, upload["path"], upload["model_name"], upload["content_hash"])
+    if job_id is None:
+        os.remove(upload["path"])
+        return jsonify({"error": "Fila de processamento cheia. Tente novamente mais tarde."}), 503
+    return jsonify({"job_id": job_id}), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_validation_job_status(job_id):
+    status = job_manager.get_job_status(job_id)
+    if status is None: return jsonify({"error": "Tarefa não encontrada."}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result')
+def get_validation_job_result(job_id):
+    job = job_manager.get_job_result(job_id)
+    if job is None: return jsonify({"error": "Tarefa não encontrada."}), 404
+    if job["status"] == job_manager.FAILED:
+        return jsonify({"error": "Ocorreu um erro inesperado no servidor."}), 500
+    if job["status"] != job_manager.DONE:
+        return jsonify({"error": "Tarefa ainda em processamento.", "status": job["status"]}), 409
+    return jsonify(job["result"]["results"]), (200 if job["result"]["success"] else 500)
+
+@app.route('/api/models/<model_name>/reload', methods=['POST'])
+def reload_model(model_name):
+    """Volta a carregar no Fuseki um modelo já convertido, a partir do grafo guardado em disco."""
+    try:
+        reloaded = upload_pipeline.reload_model(secure_filename(model_name) or "default")
+    except Exception as e:
+        current_app.logger.error(f"Erro ao recarregar o modelo '{model_name}': {e}", exc_info=True)
+        return jsonify({"error": "Ocorreu um erro inesperado no servidor."}), 500
+    if reloaded is None: return jsonify({"error": "Modelo não encontrado."}), 404
+    if not reloaded: return jsonify({"error": "Falha ao carregar modelo no motor de consulta."}), 500
+    return jsonify({"success": True, "model": model_name})
 
 @app.route('/ask', methods=['POST'])
 def ask_chatbot():
@@ -37,6 +92,17 @@ def ask_chatbot():
     if not data or 'question' not in data: return jsonify({"error": "Pergunta não fornecida."}), 400
     return jsonify(chatbot_logic.process_user_question(data['question']))
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_chatbot_batch():
+    """Responde a uma lista de perguntas de uma vez (classificadas em lote)."""
+    data = request.get_json()
+    questions = data.get('questions') if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) for q in questions):
+        return jsonify({"error": "Lista de perguntas não fornecida."}), 400
+    if len(questions) > current_app.config['NLU_MAX_BATCH']:
+        return jsonify({"error": f"Máximo de {current_app.config['NLU_MAX_BATCH']} perguntas por pedido."}), 400
+    return jsonify(chatbot_logic.process_user_questions(questions))
+
 @app.route('/ontology-summary')
 def get_ontology_summary():
     try:
@@ -45,23 +111,163 @@ def get_ontology_summary():
         current_app.logger.error(f"Erro ao buscar resumo da ontologia: {e}", exc_info=True)
         return jsonify({"error": "Não foi possível obter os dados da ontologia."}), 500
 
+def _active_takeoff():
+    """Mapa de quantidades do modelo ativo, ou None."""
+    return quantity_takeoff.get(sparql_client.get_active_graph())
+
+def _takeoff_filters():
+    return {dim: request.args.get(dim) for dim in quantity_takeoff.DIMENSIONS if request.args.get(dim)}
+
+def _takeoff_limit(name, default):
+    value = request.args.get(name, default, type=int)
+    if not 1 <= value <= current_app.config['TAKEOFF_MAX_RESULTS']:
+        raise ValueError(f"'{name}' tem de estar entre 1 e {current_app.config['TAKEOFF_MAX_RESULTS']}.")
+    return value
+
+@app.route('/api/takeoff')
+@app.route('/api/takeoff/<analysis>')
+def takeoff(analysis=None):
+    """
+    Mapa de quantidades do modelo ativo. Sem análise, lista as medidas; com
+    'totals' (group_by repetível), 'histogram' (bins) ou 'top' (n, order=asc)
+    analisa a medida `measure`. Filtros opcionais: class, container e material.
+    """
+    table = _active_takeoff()
+    if table is None: return jsonify({"error": "Mapa de quantidades não disponível para o modelo ativo."}), 404
+    try:
+        if analysis is None:
+            return jsonify(table.measures())
+        measure = request.args.get('measure')
+        if not measure: return jsonify({"error": "Medida não fornecida."}), 400
+        if analysis == 'totals':
+            return jsonify(table.totals(measure, group_by=request.args.getlist('group_by'), filters=_takeoff_filters()))
+        if analysis == 'histogram':
+            return jsonify(table.histogram(measure, bins=_takeoff_limit('bins', 10), filters=_takeoff_filters()))
+        if analysis == 'top':
+            return jsonify(table.top(measure, n=_takeoff_limit('n', 10), filters=_takeoff_filters(),
+                                     ascending=request.args.get('order') == 'asc'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"error": "Análise desconhecida."}), 404
+
+@app.route('/api/sparql-metrics')
+def get_sparql_metrics():
+    """Latência e acertos na cache por tipo de consulta SPARQL."""
+    return jsonify(sparql_client.get_metrics())
+
+@app.route('/metrics')
+def get_metrics():
+    """Latência por rota e por etapa, triplos, violações e acessos às caches (formato Prometheus)."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/health')
+def get_health():
+    """Verificação de vida do processo (não depende do Fuseki nem dos modelos)."""
+    return jsonify(serving.health())
+
+@app.route('/ready')
+def get_readiness():
+    """Verificação de prontidão: 200 se o worker pode receber pedidos, 503 caso contrário."""
+    ready, checks = serving.readiness()
+    return jsonify({"status": "pronto" if ready else "indisponível", "checks": checks}), (200 if ready else 503)
+
+@app.route('/api/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Perfil de um pedido feito com ?profile=1 (pilhas no formato "collapsed" do flamegraph)."""
+    profile = metrics.get_profile(profile_id)
+    if profile is None: return jsonify({"error": "Perfil não encontrado."}), 404
+    return Response(profile, mimetype='text/plain')
+
 @app.route('/api/expand-graph', methods=['POST'])
 def expand_graph():
+    """
+    Vizinhança de um nó. Com `depth` maior que 1 ou `predicates`, é calculada no
+    índice de adjacência (opções: direction 'out', 'in' ou 'both' e max_nodes).
+    """
     data = request.get_json()
     if not data or 'node_uri' not in data: return jsonify({"error": "URI do nó não fornecido."}), 400
     try:
-        return jsonify(chatbot_logic.get_graph_for_node(data['node_uri']))
+        depth = int(data.get('depth') or 1)
+        if depth == 1 and not data.get('predicates'):
+            return jsonify(chatbot_logic.get_graph_for_node(data['node_uri']))
+        graph_data = chatbot_logic.expand_graph(data['node_uri'], depth, predicates=data.get('predicates'),
+                                                direction=data.get('direction', 'both'), max_nodes=data.get('max_nodes'))
+        if graph_data is None: return jsonify({"error": "Índice de adjacência não disponível para o modelo ativo."}), 404
+        return jsonify(graph_data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Erro ao focar no nó do grafo: {e}", exc_info=True)
         return jsonify({"error": "Não foi possível obter os dados de foco do nó."}), 500
 
+@app.route('/api/graph-path', methods=['POST'])
+def graph_path():
+    """Caminho mais curto entre dois nós (`source`, `target`), no índice de adjacência."""
+    data = request.get_json()
+    if not data or 'source' not in data or 'target' not in data: return jsonify({"error": "Nós não fornecidos."}), 400
+    try:
+        path = chatbot_logic.find_path(data['source'], data['target'], predicates=data.get('predicates'),
+                                       direction=data.get('direction', 'both'), max_depth=data.get('max_depth'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if path is None: return jsonify({"error": "Índice de adjacência não disponível para o modelo ativo."}), 404
+    return jsonify(path)
+
+@app.route('/api/graph-summary')
+def graph_summary():
+    """Vista resumida (nível de detalhe) com super-nós por contentor espacial e classe IFC."""
+    try:
+        return jsonify(chatbot_logic.get_graph_summary())
+    except Exception as e:
+        current_app.logger.error(f"Erro ao gerar o resumo do grafo: {e}", exc_info=True)
+        return jsonify({"error": "Não foi possível gerar o resumo do grafo."}), 500
+
+@app.route('/api/graph-group', methods=['POST'])
+def graph_group():
+    """Drill-down de um super-nó: devolve uma página dos elementos agregados."""
+    data = request.get_json()
+    if not data or 'group_key' not in data: return jsonify({"error": "Grupo não fornecido."}), 400
+    try:
+        return jsonify(chatbot_logic.get_group_members(data['group_key'], cursor=data.get('cursor'), limit=data.get('limit')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Erro ao expandir o grupo: {e}", exc_info=True)
+        return jsonify({"error": "Não foi possível expandir o grupo."}), 500
+
 # --- INÍCIO DO NOVO CÓDIGO ---
 @app.route('/api/full-graph')
 def full_graph():
-    """Endpoint para buscar o grafo completo."""
+    """
+    Endpoint para buscar o grafo completo, página a página.
+    Parâmetros: cursor, limit, type (repetível), predicate (repetível) e
+    format=ndjson para receber todas as páginas em streaming, uma por linha.
+    """
+    types = request.args.getlist('type')
+    predicates = request.args.getlist('predicate')
+    limit = request.args.get('limit', type=int)
     try:
-        graph_data = chatbot_logic.get_full_graph()
+        if request.args.get('format') == 'ndjson':
+            pages = chatbot_logic.iter_full_graph_pages(types=types, predicates=predicates, limit=limit)
+            # Valida os filtros antes de começar a resposta em streaming
+            first_page = next(pages)
+
+            def generate():
+                yield json.dumps(first_page) + "\n"
+                try:
+                    for page in pages:
+                        yield json.dumps(page) + "\n"
+                except Exception as e:
+                    current_app.logger.error(f"Erro durante o streaming do grafo completo: {e}", exc_info=True)
+                    yield json.dumps({"error": "Não foi possível gerar o grafo completo."}) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        graph_data = chatbot_logic.get_full_graph(
+            cursor=request.args.get('cursor'), limit=limit, types=types, predicates=predicates)
         return jsonify(graph_data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Erro ao buscar o grafo completo: {e}", exc_info=True)
         return jsonify({"error": "Não foi possível gerar o grafo completo."}), 500
@@ -0,0 +1,337 @@
+"""
+Índice de adjacência do modelo carregado, para expansões de vários saltos e
+caminhos mais curtos sem consultas ao Fuseki. Cada nó (URI) recebe um inteiro
+e as arestas entre URIs ficam em formato CSR (compressed sparse row), em
+colunas `array`: para cada nó, o intervalo [offsets[n], offsets[n + 1]) das
+listas de vizinhos e predicados. Há um CSR para as arestas de saída e outro
+para as de entrada.
+
+As arestas rdfs:label e rdf:type não são indexadas: o rótulo e a classe de
+cada nó ficam como atributos (as classes seriam nós com milhares de vizinhos
+que ligariam todos os elementos do mesmo tipo).
+"""
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+from urllib.parse import quote
+
+from flask import current_app
+from rdflib import RDF, RDFS, URIRef
+
+from .ifc_ingestion import BASE_URI
+
+MAGIC = b"BIMADJ01"
+_HEADER = struct.Struct("<8sI")
+
+DIRECTIONS = ("out", "in", "both")
+_REVERSE = {"out": "in", "in": "out", "both": "both"}
+
+_lock = threading.Lock()
+_indexes = {}
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+class Collector:
+    """
+    Codifica os nós e recolhe as arestas a partir dos triplos do grafo de
+    conhecimento, numa única passagem. `watch(triplos)` devolve os mesmos
+    triplos, para ser encadeado na conversão em streaming.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._nodes = []
+        self._labels = {}
+        self._types = {}
+        self._predicate_codes = {}
+        self._sources = array("I")
+        self._targets = array("I")
+        self._predicates = array("I")
+
+    def _code(self, node):
+        code = self._codes.get(node)
+        if code is None:
+            code = self._codes[node] = len(self._nodes)
+            self._nodes.append(node)
+        return code
+
+    def add(self, triple):
+        s, p, o = triple
+        if not isinstance(s, URIRef):
+            return
+        if p == RDFS.label:
+            self._labels.setdefault(s, str(o))
+        elif p == RDF.type:
+            type_name = str(o)
+            self._types.setdefault(s, type_name[len(BASE_URI):] if type_name.startswith(BASE_URI) else type_name)
+        elif isinstance(o, URIRef):
+            predicate = self._predicate_codes.get(p)
+            if predicate is None:
+                predicate = self._predicate_codes[p] = len(self._predicate_codes)
+            self._sources.append(self._code(s))
+            self._targets.append(self._code(o))
+            self._predicates.append(predicate)
+
+    def watch(self, triples):
+        for triple in triples:
+            self.add(triple)
+            yield triple
+
+    def build(self):
+        """Constrói os dois CSR (saída e entrada), sem arestas repetidas."""
+        node_count = len(self._nodes)
+        out_csr = _csr(node_count, self._sources, self._targets, self._predicates)
+        in_csr = _csr(node_count, self._targets, self._sources, self._predicates)
+        meta = {
+            "nodes": [str(node) for node in self._nodes],
+            "labels": [self._labels.get(node) for node in self._nodes],
+            "types": [self._types.get(node) for node in self._nodes],
+            "predicates": [str(p) for p in sorted(self._predicate_codes, key=self._predicate_codes.get)],
+            "edge_counts": [len(out_csr[1]), len(in_csr[1])],
+        }
+        return AdjacencyIndex(meta, out_csr, in_csr)
+
+def _csr(node_count, keys, values, predicates):
+    """Ordenação por contagem das arestas pelo nó `keys`, descartando as repetidas de cada nó."""
+    offsets = array("I", bytes(4 * (node_count + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    positions = array("I", offsets[:-1])
+    neighbours = array("I", bytes(4 * len(keys)))
+    edge_predicates = array("I", bytes(4 * len(keys)))
+    for key, value, predicate in zip(keys, values, predicates):
+        position = positions[key]
+        neighbours[position] = value
+        edge_predicates[position] = predicate
+        positions[key] = position + 1
+
+    # Na conversão em streaming podem chegar triplos repetidos; o Graph já não os tem
+    write = 0
+    start = 0
+    for node in range(node_count):
+        end = offsets[node + 1]
+        seen = set()
+        offsets[node] = write
+        for position in range(start, end):
+            edge = (neighbours[position], edge_predicates[position])
+            if edge not in seen:
+                seen.add(edge)
+                neighbours[write], edge_predicates[write] = edge
+                write += 1
+        start = end
+    offsets[node_count] = write
+    return offsets, neighbours[:write], edge_predicates[:write]
+
+def compute(triples):
+    """Índice de adjacência de um Graph, grafo compacto ou qualquer iterável de triplos."""
+    collector = Collector()
+    for triple in triples:
+        collector.add(triple)
+    return collector.build()
+
+class AdjacencyIndex:
+    """Travessias sobre os CSR de um modelo carregado."""
+
+    def __init__(self, meta, out_csr, in_csr):
+        self.meta = meta
+        self.out_csr = out_csr
+        self.in_csr = in_csr
+        self._codes = {node: code for code, node in enumerate(meta["nodes"])}
+        self._predicate_codes = {predicate: code for code, predicate in enumerate(meta["predicates"])}
+
+    def __len__(self):
+        return len(self.meta["nodes"])
+
+    def code(self, node_uri):
+        return self._codes.get(node_uri)
+
+    def node(self, code):
+        """URI, rótulo e classe do nó `code`."""
+        return self.meta["nodes"][code], self.meta["labels"][code], self.meta["types"][code]
+
+    def predicate(self, code):
+        return self.meta["predicates"][code]
+
+    def _allowed(self, predicates):
+        """Códigos dos predicados permitidos (None = todos). Um predicado desconhecido não corresponde a nada."""
+        if not predicates:
+            return None
+        return {self._predicate_codes[p] for p in predicates if p in self._predicate_codes}
+
+    def _neighbours(self, node, direction, allowed):
+        """Pares (vizinho, predicado, aresta de saída?) do nó, na direção pedida."""
+        if direction != "in":
+            offsets, neighbours, predicates = self.out_csr
+            for position in range(offsets[node], offsets[node + 1]):
+                if allowed is None or predicates[position] in allowed:
+                    yield neighbours[position], predicates[position], True
+        if direction != "out":
+            offsets, neighbours, predicates = self.in_csr
+            for position in range(offsets[node], offsets[node + 1]):
+                if allowed is None or predicates[position] in allowed:
+                    yield neighbours[position], predicates[position], False
+
+    def expand(self, node_uri, depth, predicates=None, direction="both", max_nodes=1000):
+        """
+        Vizinhança de até `depth` saltos (pesquisa em largura). Devolve
+        ({nó: distância}, {(s, p, o)}, truncado) com os códigos dos nós, ou None
+        se o nó não tiver arestas. Com mais de `max_nodes` nós, a expansão pára
+        e as arestas para os nós não incluídos são omitidas.
+        """
+        source = self._codes.get(node_uri)
+        if source is None:
+            return None
+        allowed = self._allowed(predicates)
+        distances = {source: 0}
+        edges = set()
+        truncated = False
+        frontier = [source]
+        for level in range(1, depth + 1):
+            next_frontier = []
+            for node in frontier:
+                for neighbour, predicate, outgoing in self._neighbours(node, direction, allowed):
+                    if neighbour not in distances:
+                        if len(distances) >= max_nodes:
+                            truncated = True
+                            continue
+                        distances[neighbour] = level
+                        next_frontier.append(neighbour)
+                    edges.add((node, predicate, neighbour) if outgoing else (neighbour, predicate, node))
+            frontier = next_frontier
+            if not frontier:
+                break
+        return distances, edges, truncated
+
+    def shortest_path(self, source_uri, target_uri, predicates=None, direction="both", max_depth=6, max_visited=100000):
+        """
+        Caminho mais curto de `source_uri` a `target_uri` com no máximo
+        `max_depth` arestas, por pesquisa em largura bidirecional (expande
+        sempre a fronteira mais pequena). Devolve a lista de nós e a lista de
+        arestas (s, p, o) do caminho, em códigos, ou None se não houver caminho
+        dentro dos limites.
+        """
+        source, target = self._codes.get(source_uri), self._codes.get(target_uri)
+        if source is None or target is None:
+            return None
+        if source == target:
+            return [source], []
+        allowed = self._allowed(predicates)
+        # A pesquisa a partir do destino percorre as arestas no sentido inverso
+        directions = (direction, _REVERSE[direction])
+        parents = ({source: None}, {target: None})
+        frontiers = [[source], [target]]
+        for _ in range(max_depth):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            visited, other = parents[side], parents[1 - side]
+            next_frontier = []
+            for node in frontiers[side]:
+                for neighbour, predicate, outgoing in self._neighbours(node, directions[side], allowed):
+                    if neighbour in visited:
+                        continue
+                    visited[neighbour] = (node, predicate, outgoing)
+                    if neighbour in other:
+                        return self._join(parents, neighbour)
+                    next_frontier.append(neighbour)
+            frontiers[side] = next_frontier
+            if not next_frontier or len(parents[0]) + len(parents[1]) > max_visited:
+                return None
+        return None
+
+    @staticmethod
+    def _join(parents, meeting):
+        """Junta as duas metades do caminho no nó onde as pesquisas se encontraram."""
+        halves = []
+        for visited in parents:
+            nodes, edges = [], []
+            node = meeting
+            while visited[node] is not None:
+                previous, predicate, outgoing = visited[node]
+                nodes.append(previous)
+                edges.append((previous, predicate, node) if outgoing else (node, predicate, previous))
+                node = previous
+            halves.append((nodes, edges))
+        (source_nodes, source_edges), (target_nodes, target_edges) = halves
+        return source_nodes[::-1] + [meeting] + target_nodes, source_edges[::-1] + target_edges
+
+def _path(model_name):
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{quote(model_name, safe='')}.adj")
+
+def _path_for_graph(graph_uri):
+    # O nome do ficheiro é o último segmento do URI do grafo (o nome do modelo já codificado)
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{graph_uri.rsplit('/', 1)[-1]}.adj")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _write(index, path):
+    header = json.dumps(index.meta, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(header)))
+        f.write(header)
+        for column in (*index.out_csr, *index.in_csr):
+            f.write(_little_endian(column).tobytes())
+    os.replace(tmp_path, path)
+
+def _read(path):
+    with open(path, 'rb') as f:
+        magic, header_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} não é um índice de adjacência.")
+        meta = json.loads(f.read(header_size).decode("utf-8"))
+
+        def column(count):
+            values = array("I")
+            values.frombytes(f.read(values.itemsize * count))
+            return _little_endian(values)
+
+        node_count = len(meta["nodes"])
+        out_edges, in_edges = meta["edge_counts"]
+        out_csr = (column(node_count + 1), column(out_edges), column(out_edges))
+        in_csr = (column(node_count + 1), column(in_edges), column(in_edges))
+    return AdjacencyIndex(meta, out_csr, in_csr)
+
+def store(model_name, graph_uri, index):
+    """Guarda o índice de um modelo em disco e em memória."""
+    path = _path(model_name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(index, path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o índice de adjacência: {e}")
+    with _lock:
+        _indexes[str(graph_uri)] = (_mtime(path), index)
+    current_app.logger.info(
+        f"Índice de adjacência de '{model_name}': {len(index)} nós, {index.meta['edge_counts'][0]} arestas.")
+
+def get(graph_uri):
+    """
+    Índice do grafo `graph_uri`, ou None se não existir. A cópia em memória é
+    validada pela data do ficheiro, como o resumo da ontologia.
+    """
+    if not graph_uri:
+        return None
+    path = _path_for_graph(graph_uri)
+    mtime = _mtime(path)
+    with _lock:
+        entry = _indexes.get(graph_uri)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    if mtime is None:
+        return None
+    index = _read(path)
+    with _lock:
+        _indexes[graph_uri] = (mtime, index)
+    return index
@@ -1,22 +1,76 @@
+import base64
+import json
 import os
 import spacy
 import re
-from SPARQLWrapper import SPARQLWrapper, JSON
+import threading
+import time
+from collections import OrderedDict
 from flask import current_app
-from rdflib import Namespace
+from rdflib import Literal, Namespace
 from rdflib.namespace import RDFS, RDF
 
+from . import adjacency_index, label_index, local_store, metrics, sparql_client
+
 nlp = None
+_nlp_lock = threading.Lock()
+_intent_cache = OrderedDict()
 
 def _load_nlp_model():
     global nlp
-    if nlp is None:
-        try:
-            nlp = spacy.load(current_app.config['NLU_MODEL_PATH'])
-            current_app.logger.info("Modelo de NLU carregado.")
-        except IOError:
-            current_app.logger.error("Modelo de NLU não encontrado.")
-            nlp = False
+    with _nlp_lock:
+        if nlp is None:
+            try:
+                nlp = spacy.load(current_app.config['NLU_MODEL_PATH'])
+                current_app.logger.info("Modelo de NLU carregado.")
+            except IOError:
+                current_app.logger.error("Modelo de NLU não encontrado.")
+                nlp = False
+
+def warm_up_nlp():
+    """Carrega o modelo de NLU no arranque e faz uma inferência de aquecimento."""
+    start = time.perf_counter()
+    _load_nlp_model()
+    if nlp:
+        nlp("Olá")
+        current_app.logger.info(f"Modelo de NLU pronto em {time.perf_counter() - start:.2f}s.")
+
+def _intent_key(text):
+    """Chave da cache de intenções: ignora maiúsculas e espaços repetidos."""
+    return " ".join(text.casefold().split())
+
+def _classify(texts):
+    """
+    Intenção de cada texto. Os textos já vistos vêm da cache LRU; os restantes
+    são classificados em lote com `nlp.pipe`, no próprio processo: com
+    n_process > 1, o spaCy criaria um pool novo (por fork do servidor) em cada pedido.
+    """
+    config = current_app.config
+    intents = [None] * len(texts)
+    pending = {}
+    with _nlp_lock:
+        for position, text in enumerate(texts):
+            key = _intent_key(text)
+            if key in _intent_cache:
+                _intent_cache.move_to_end(key)
+                intents[position] = _intent_cache[key]
+            else:
+                pending.setdefault(key, []).append(position)
+    metrics.cache_access("intent", True, len(texts) - sum(len(positions) for positions in pending.values()))
+    metrics.cache_access("intent", False, len(pending))
+
+    if pending:
+        with metrics.span("nlu"):
+            docs = nlp.pipe([texts[positions[0]] for positions in pending.values()], batch_size=config['NLU_BATCH_SIZE'])
+            with _nlp_lock:
+                for (key, positions), doc in zip(pending.items(), docs):
+                    intent = max(doc.cats, key=doc.cats.get)
+                    for position in positions:
+                        intents[position] = intent
+                    _intent_cache[key] = intent
+                    while len(_intent_cache) > config['NLU_INTENT_CACHE_SIZE']:
+                        _intent_cache.popitem(last=False)
+    return intents
 
 def _format_property_name(uri):
     if '#' in uri:
@@ -24,63 +78,97 @@ def _format_property_name(uri):
         return re.sub(r'(?<!^)(?=[A-Z])', ' ', name)
     return uri.split('/')[-1]
 
+def _group_node(group_key, count):
+    """Super-nó que representa `count` elementos agregados; `group_key` permite o drill-down."""
+    type_name = _format_property_name(group_key['type']) if group_key['type'] else "Sem tipo"
+    return {
+        'id': f"group::{json.dumps(group_key, sort_keys=True)}",
+        'label': f"{type_name} ({count})",
+        'shape': 'ellipse', 'color': '#F6AD55', 'value': count,
+        'group_key': group_key, 'count': count,
+    }
+
 def _get_bidirectional_graph(node_uri, central_node_label):
-    sparql = SPARQLWrapper(current_app.config['FUSEKI_QUERY_ENDPOINT'])
-    sparql.setCredentials(current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
-    sparql.setReturnFormat(JSON)
 
     query = f"""
         PREFIX rdfs: <{RDFS}>
-        SELECT ?s ?p ?o ?s_label ?o_label
+        SELECT ?s ?p ?o ?s_label ?o_label ?s_type ?o_type
         WHERE {{
           {{ BIND(<{node_uri}> AS ?s) ?s ?p ?o . }}
           UNION
           {{ BIND(<{node_uri}> AS ?o) ?s ?p ?o . }}
           OPTIONAL {{ ?s rdfs:label ?s_label . }}
           OPTIONAL {{ ?o rdfs:label ?o_label . }}
+          OPTIONAL {{ ?s a ?s_type . }}
+          OPTIONAL {{ ?o a ?o_type . }}
           FILTER(?s != ?o)
         }}
     """
-    sparql.setQuery(query)
-    results = sparql.query().convert()["results"]["bindings"]
+    if local_store.is_enabled():
+        # Consulta de um salto respondida diretamente pelos índices em memória
+        results = local_store.neighbourhood(node_uri)
+    else:
+        results = sparql_client.query(query, label="vizinhanca")
 
     nodes = [{'id': node_uri, 'label': central_node_label, 'color': '#68D391', 'size': 25}]
     edges = []
-    added_nodes = {node_uri}
 
     if not results:
         return {"nodes": nodes, "edges": edges}
 
+    # Vizinhos: uri -> rótulo, classe e ligações (direção, predicado) ao nó central
+    neighbours = {}
     for res in results:
-        if res['p']['value'] == str(RDFS.label):
+        if res['p']['value'] == str(RDFS.label) or res['o']['type'] != 'uri':
             continue
 
         s_uri = res['s']['value']
         o_uri = res['o']['value']
+        outgoing = s_uri == node_uri
+        neighbour, side = (o_uri, 'o') if outgoing else (s_uri, 's')
+        if neighbour not in neighbours:
+            neighbours[neighbour] = {
+                'label': res.get(f'{side}_label', {}).get('value', _format_property_name(neighbour)),
+                'type': res.get(f'{side}_type', {}).get('value'),
+                'links': {},
+            }
+        neighbours[neighbour]['links'][('out' if outgoing else 'in', res['p']['value'])] = None
 
-        if s_uri not in added_nodes:
-            s_label = res.get('s_label', {}).get('value', _format_property_name(s_uri))
-            nodes.append({'id': s_uri, 'label': s_label})
-            added_nodes.add(s_uri)
+    # Nível de detalhe: com demasiados vizinhos, agrega-os por (direção, predicado, classe)
+    groups = {}
+    if len(neighbours) > current_app.config['GRAPH_LOD_THRESHOLD']:
+        for neighbour, info in neighbours.items():
+            for direction, predicate in info['links']:
+                groups.setdefault((direction, predicate, info['type']), []).append(neighbour)
+        groups = {key: members for key, members in groups.items() if len(members) > 1}
 
-        if res['o']['type'] == 'uri' and o_uri not in added_nodes:
-            o_label = res.get('o_label', {}).get('value', _format_property_name(o_uri))
-            nodes.append({'id': o_uri, 'label': o_label})
-            added_nodes.add(o_uri)
+    collapsed = {member for members in groups.values() for member in members}
+    for neighbour, info in neighbours.items():
+        if neighbour in collapsed:
+            continue
+        nodes.append({'id': neighbour, 'label': info['label']})
+        for direction, predicate in info['links']:
+            source, target = (node_uri, neighbour) if direction == 'out' else (neighbour, node_uri)
+            edges.append({'from': source, 'to': target, 'label': _format_property_name(predicate)})
+
+    for (direction, predicate, neighbour_type), members in groups.items():
+        group = _group_node({'anchor': node_uri, 'predicate': predicate, 'direction': direction, 'type': neighbour_type}, len(members))
+        nodes.append(group)
+        source, target = (node_uri, group['id']) if direction == 'out' else (group['id'], node_uri)
+        edges.append({'from': source, 'to': target, 'label': _format_property_name(predicate)})
 
-        if res['o']['type'] == 'uri':
-            edge_label = _format_property_name(res['p']['value'])
-            edges.append({'from': s_uri, 'to': o_uri, 'label': edge_label})
-            
     return {"nodes": nodes, "edges": edges}
 
 def process_user_question(user_text):
+    return process_user_questions([user_text])[0]
+
+def process_user_questions(user_texts):
+    """Responde a várias perguntas, classificando-as num único lote."""
     _load_nlp_model()
-    if not nlp: return {"answer": "O modelo de NLU não está carregado.", "graph_data": None}
-    
-    doc = nlp(user_text)
-    intent = max(doc.cats, key=doc.cats.get)
+    if not nlp: return [{"answer": "O modelo de NLU não está carregado.", "graph_data": None} for _ in user_texts]
+    return [_answer(user_text, intent) for user_text, intent in zip(user_texts, _classify(user_texts))]
 
+def _answer(user_text, intent):
     if intent == "saudacao": return {"answer": "Olá! Sou seu assistente BIM.", "graph_data": None}
     if intent == "despedida": return {"answer": "Até mais!", "graph_data": None}
     
@@ -101,61 +189,166 @@ def process_user_question(user_text):
             return {"answer": "Não consegui identificar um objeto na sua pergunta.", "graph_data": None}
         # --- FIM DA MODIFICAÇÃO ---
 
-        sparql = SPARQLWrapper(current_app.config['FUSEKI_QUERY_ENDPOINT'])
-        sparql.setCredentials(current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
-        sparql.setReturnFormat(JSON)
-        uri_query = f'PREFIX rdfs: <{RDFS}> SELECT ?s WHERE {{ ?s rdfs:label "{obj_name}" . }} LIMIT 1'
-        sparql.setQuery(uri_query)
-        uri_results = sparql.query().convert()["results"]["bindings"]
-        
-        if not uri_results:
+        # O índice em memória resolve o nome sem ida ao Fuseki, tolerando
+        # maiúsculas, acentos, prefixos e pequenos erros de escrita
+        match = label_index.lookup(obj_name)
+        if not match:
             return {"answer": f"Não encontrei '{obj_name}'.", "graph_data": None}
-            
-        subject_uri = uri_results[0]['s']['value']
-        
-        graph_data = _get_bidirectional_graph(subject_uri, obj_name)
+
+        subject_uri, matched_label = match
+        graph_data = _get_bidirectional_graph(subject_uri, matched_label)
 
         return {
-            "answer": f"Exibindo informações para '{obj_name}'.",
+            "answer": f"Exibindo informações para '{matched_label}'.",
             "graph_data": graph_data
         }
 
     return {"answer": "Não entendi a sua pergunta.", "graph_data": None}
 
 def get_graph_for_node(node_uri):
-    sparql = SPARQLWrapper(current_app.config['FUSEKI_QUERY_ENDPOINT'])
-    sparql.setCredentials(current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
-    sparql.setReturnFormat(JSON)
-    label_query = f'PREFIX rdfs: <{RDFS}> SELECT ?label WHERE {{ <{node_uri}> rdfs:label ?label . }} LIMIT 1'
-    sparql.setQuery(label_query)
-    label_results = sparql.query().convert()["results"]["bindings"]
-    node_label = label_results[0]['label']['value'] if label_results else _format_property_name(node_uri)
+    node_label = label_index.label_for(node_uri) or _format_property_name(node_uri)
     return _get_bidirectional_graph(node_uri, node_label)
 
-def get_full_graph():
-    sparql = SPARQLWrapper(current_app.config['FUSEKI_QUERY_ENDPOINT'])
-    sparql.setCredentials(current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
-    sparql.setReturnFormat(JSON)
-    
-    query = f"""
+def _graph_options(predicates, direction, max_nodes):
+    """Valida as opções das travessias e converte os nomes dos predicados em URIs."""
+    config = current_app.config
+    if direction not in adjacency_index.DIRECTIONS:
+        raise ValueError(f"Direção inválida: {direction}")
+    max_nodes = max_nodes or config['GRAPH_MAX_NODES']
+    if not 1 <= max_nodes <= config['GRAPH_MAX_NODES']:
+        raise ValueError(f"'max_nodes' tem de estar entre 1 e {config['GRAPH_MAX_NODES']}.")
+    if isinstance(predicates, str):
+        predicates = [predicates]
+    inst = Namespace(config['BASE_URI'])
+    return [_resolve_term(p, inst)[1:-1] for p in predicates or ()], max_nodes
+
+def _check_depth(depth):
+    if not 1 <= depth <= current_app.config['GRAPH_MAX_DEPTH']:
+        raise ValueError(f"A profundidade tem de estar entre 1 e {current_app.config['GRAPH_MAX_DEPTH']}.")
+
+def _index_node(index, code, center=False):
+    uri, label, _ = index.node(code)
+    node = {'id': uri, 'label': label or _format_property_name(uri)}
+    if center:
+        node.update({'color': '#68D391', 'size': 25})
+    return node
+
+def _index_edges(index, edges):
+    return [{'from': index.node(s)[0], 'to': index.node(o)[0], 'label': _format_property_name(index.predicate(p))}
+            for s, p, o in edges]
+
+def expand_graph(node_uri, depth, predicates=None, direction="both", max_nodes=None):
+    """
+    Vizinhança de até `depth` saltos à volta de `node_uri`, calculada no índice
+    de adjacência do modelo ativo (sem consultas SPARQL). `predicates` restringe
+    as arestas percorridas (nomes locais, ex: 'contains', ou URIs) e `max_nodes`
+    limita o número de nós devolvidos (`truncated` indica se o limite foi atingido).
+    Devolve None se o modelo ativo não tiver índice.
+    """
+    _check_depth(depth)
+    predicates, max_nodes = _graph_options(predicates, direction, max_nodes)
+    index = adjacency_index.get(sparql_client.get_active_graph())
+    if index is None:
+        return None
+    expansion = index.expand(node_uri, depth, predicates=predicates, direction=direction, max_nodes=max_nodes)
+    if expansion is None:
+        label = label_index.label_for(node_uri) or _format_property_name(node_uri)
+        return {"nodes": [{'id': node_uri, 'label': label, 'color': '#68D391', 'size': 25}], "edges": [], "truncated": False}
+    distances, edges, truncated = expansion
+    nodes = [dict(_index_node(index, code, center=distance == 0), level=distance)
+             for code, distance in sorted(distances.items(), key=lambda item: item[1])]
+    return {"nodes": nodes, "edges": _index_edges(index, sorted(edges)), "truncated": truncated}
+
+def find_path(source_uri, target_uri, predicates=None, direction="both", max_depth=None):
+    """
+    Caminho mais curto entre dois nós no índice de adjacência do modelo ativo,
+    com no máximo `max_depth` arestas. Devolve {"nodes", "edges", "length"},
+    com `length` None se não houver caminho, ou None se o modelo ativo não tiver índice.
+    """
+    max_depth = max_depth or current_app.config['GRAPH_MAX_DEPTH']
+    _check_depth(max_depth)
+    predicates, _ = _graph_options(predicates, direction, None)
+    index = adjacency_index.get(sparql_client.get_active_graph())
+    if index is None:
+        return None
+    path = index.shortest_path(source_uri, target_uri, predicates=predicates, direction=direction,
+                               max_depth=max_depth, max_visited=current_app.config['GRAPH_PATH_MAX_VISITED'])
+    if path is None:
+        return {"nodes": [], "edges": [], "length": None}
+    codes, edges = path
+    nodes = [_index_node(index, code, center=code in (codes[0], codes[-1])) for code in codes]
+    return {"nodes": nodes, "edges": _index_edges(index, edges), "length": len(edges)}
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+$')
+_URI_PATTERN = re.compile(r'^https?://[^<>"{}|\\^`\s]+$')
+
+def _resolve_term(name, namespace):
+    """Converte um nome local (ex: 'IfcWall', 'contains') ou um URI completo num termo SPARQL seguro."""
+    if name == 'type':
+        return f"<{RDF.type}>"
+    if _NAME_PATTERN.match(name):
+        return f"<{namespace[name]}>"
+    if _URI_PATTERN.match(name):
+        return f"<{name}>"
+    raise ValueError(f"Filtro inválido: {name}")
+
+def encode_cursor(triple):
+    return base64.urlsafe_b64encode(json.dumps(triple).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, size=3):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor inválido.") from e
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError("Cursor inválido.")
+    return values
+
+def _full_graph_query(types, predicates, cursor=None, limit=None):
+    """
+    Consulta das arestas do grafo completo, ordenadas por (s, p, o), sem
+    repetições (um sujeito com duas classes filtradas aparece uma só vez) e com
+    um rótulo por extremo, para que cada linha seja exatamente uma aresta.
+    """
+    inst = Namespace(current_app.config['BASE_URI'])
+    filters = []
+    if types:
+        filters.append(f"?s a ?type . VALUES ?type {{ {' '.join(_resolve_term(t, inst) for t in types)} }}")
+    if predicates:
+        filters.append(f"VALUES ?p {{ {' '.join(_resolve_term(p, inst) for p in predicates)} }}")
+    if cursor:
+        # Paginação por chave: continua estritamente depois do último triplo devolvido
+        s0, p0, o0 = (Literal(value).n3() for value in decode_cursor(cursor))
+        filters.append(
+            f"FILTER(STR(?s) > {s0} || (STR(?s) = {s0} && (STR(?p) > {p0} || (STR(?p) = {p0} && STR(?o) > {o0}))))")
+    filters = "\n              ".join(filters)
+
+    return f"""
         PREFIX rdfs: <{RDFS}>
-        SELECT ?s ?p ?o ?s_label ?o_label
+        SELECT ?s ?p ?o (SAMPLE(?sl) AS ?s_label) (SAMPLE(?ol) AS ?o_label)
         WHERE {{
-          ?s ?p ?o .
-          OPTIONAL {{ ?s rdfs:label ?s_label . }}
-          OPTIONAL {{ ?o rdfs:label ?o_label . }}
-          FILTER(isURI(?o))
+          {{
+            SELECT DISTINCT ?s ?p ?o WHERE {{
+              ?s ?p ?o .
+              FILTER(isURI(?o))
+              {filters}
+            }}
+            ORDER BY STR(?s) STR(?p) STR(?o)
+            {f"LIMIT {limit}" if limit else ""}
+          }}
+          OPTIONAL {{ ?s rdfs:label ?sl . }}
+          OPTIONAL {{ ?o rdfs:label ?ol . }}
         }}
-        LIMIT 500
+        GROUP BY ?s ?p ?o
+        ORDER BY STR(?s) STR(?p) STR(?o)
     """
-    sparql.setQuery(query)
-    results = sparql.query().convert()["results"]["bindings"]
 
+def _graph_page(rows):
+    """Nós e arestas de uma página a partir das linhas (uma por aresta) da consulta."""
     nodes = []
     edges = []
     added_nodes = set()
-
-    for res in results:
+    for res in rows:
         s_uri, o_uri, p_uri = res['s']['value'], res['o']['value'], res['p']['value']
 
         if s_uri not in added_nodes:
@@ -169,5 +362,167 @@ def get_full_graph():
             added_nodes.add(o_uri)
 
         edges.append({'from': s_uri, 'to': o_uri, 'label': _format_property_name(p_uri)})
+    return {"nodes": nodes, "edges": edges}
+
+def _row_cursor(row):
+    return encode_cursor([row['s']['value'], row['p']['value'], row['o']['value']])
+
+def _page_limit(limit):
+    config = current_app.config
+    return min(limit or config['FULL_GRAPH_PAGE_SIZE'], config['FULL_GRAPH_MAX_PAGE_SIZE'])
+
+def get_full_graph(cursor=None, limit=None, types=None, predicates=None, use_cache=True):
+    """
+    Devolve uma página do grafo completo, ordenada de forma estável por (s, p, o).
+    `cursor` é o valor `next_cursor` da página anterior; `types` e `predicates`
+    restringem os sujeitos por classe IFC e as arestas por predicado.
+    """
+    limit = _page_limit(limit)
+    query = _full_graph_query(types, predicates, cursor, limit)
+    results = sparql_client.query(query, label="grafo_completo", use_cache=use_cache)
+
+    page = _graph_page(results)
+    # Cada linha é uma aresta distinta: uma página cheia indica que pode haver mais
+    page["next_cursor"] = _row_cursor(results[-1]) if len(results) >= limit else None
+    return page
+
+def iter_full_graph_pages(types=None, predicates=None, limit=None):
+    """
+    Percorre todas as páginas do grafo completo. É feita uma única consulta
+    ordenada, lida em streaming e dividida em páginas aqui (uma consulta por
+    página voltaria a ordenar o grafo inteiro a cada página). Cada página tem o
+    mesmo `next_cursor` que teria em `get_full_graph`; só uma página de cada
+    vez fica em memória.
+    """
+    limit = _page_limit(limit)
+    query = _full_graph_query(types, predicates)
+    rows = []
+    for row in sparql_client.iter_query(query, label="grafo_completo_stream"):
+        if len(rows) == limit:
+            page = _graph_page(rows)
+            page["next_cursor"] = _row_cursor(rows[-1])
+            yield page
+            rows = []
+        rows.append(row)
+    page = _graph_page(rows)
+    page["next_cursor"] = None
+    yield page
+
+# Classes que formam a hierarquia espacial mostrada na vista resumida
+SPATIAL_CLASSES = ('IfcProject', 'IfcSite', 'IfcBuilding', 'IfcBuildingStorey')
+
+def get_graph_summary():
+    """
+    Vista resumida do modelo: a hierarquia espacial (projeto, terreno, edifício,
+    andares) e, para cada contentor, um super-nó por classe IFC com o número de
+    elementos. Os elementos sem contentor são agrupados apenas por classe.
+    O tamanho da resposta não depende do número de elementos do modelo.
+    """
+    inst = Namespace(current_app.config['BASE_URI'])
+    spatial_values = " ".join(f"<{inst[name]}>" for name in SPATIAL_CLASSES)
+
+    hierarchy_query = f"""
+        SELECT ?node ?type ?parent
+        WHERE {{
+          ?node a ?type .
+          VALUES ?type {{ {spatial_values} }}
+          OPTIONAL {{ ?parent <{inst.aggregates}> ?node . ?parent a ?parent_type . VALUES ?parent_type {{ {spatial_values} }} }}
+        }}
+    """
+    groups_query = f"""
+        SELECT ?container ?type (COUNT(DISTINCT ?e) AS ?count)
+        WHERE {{
+          ?e a ?type .
+          FILTER(STRSTARTS(STR(?type), STR(<{inst.Ifc}>)))
+          FILTER(?type NOT IN ({", ".join(f"<{inst[name]}>" for name in SPATIAL_CLASSES)}))
+          OPTIONAL {{ ?container <{inst.contains}> ?e . }}
+        }}
+        GROUP BY ?container ?type
+    """
+    hierarchy = sparql_client.query(hierarchy_query, label="resumo_hierarquia")
+    group_rows = sparql_client.query(groups_query, label="resumo_grupos")
+
+    nodes = []
+    edges = []
+    added_nodes = set()
+
+    def add_spatial_node(uri, type_uri=None):
+        if uri in added_nodes:
+            return
+        label = label_index.label_for(uri) or _format_property_name(uri)
+        if type_uri:
+            label = f"{label} [{_format_property_name(type_uri)}]"
+        nodes.append({'id': uri, 'label': label, 'color': '#68D391'})
+        added_nodes.add(uri)
+
+    for row in hierarchy:
+        add_spatial_node(row['node']['value'], row['type']['value'])
+    for row in hierarchy:
+        if 'parent' in row:
+            edges.append({'from': row['parent']['value'], 'to': row['node']['value'], 'label': _format_property_name(str(inst.aggregates))})
+
+    for row in group_rows:
+        container = row.get('container', {}).get('value')
+        count = int(row['count']['value'])
+        group = _group_node({'anchor': container, 'predicate': str(inst.contains), 'direction': 'out', 'type': row['type']['value']}, count)
+        nodes.append(group)
+        if container:
+            add_spatial_node(container)
+            edges.append({'from': container, 'to': group['id'], 'label': _format_property_name(str(inst.contains))})
+
+    return {"nodes": nodes, "edges": edges}
+
+def get_group_members(group_key, cursor=None, limit=None):
+    """
+    Drill-down de um super-nó: devolve uma página dos elementos que ele agrega,
+    ligados ao nó de ancoragem, e o `next_cursor` para a página seguinte.
+    """
+    config = current_app.config
+    limit = min(limit or config['FULL_GRAPH_PAGE_SIZE'], config['FULL_GRAPH_MAX_PAGE_SIZE'])
+    anchor = group_key.get('anchor')
+    predicate = group_key.get('predicate')
+    element_type = group_key.get('type')
+    direction = group_key.get('direction', 'out')
+    for uri in (anchor, predicate, element_type):
+        if uri and not _URI_PATTERN.match(uri):
+            raise ValueError(f"Filtro inválido: {uri}")
+    if not predicate or direction not in ('out', 'in') or not (anchor or element_type):
+        raise ValueError("Grupo inválido.")
+
+    patterns = []
+    if anchor:
+        patterns.append(f"<{anchor}> <{predicate}> ?e ." if direction == 'out' else f"?e <{predicate}> <{anchor}> .")
+    if element_type:
+        patterns.append(f"?e a <{element_type}> .")
+    else:
+        patterns.append("FILTER NOT EXISTS { ?e a ?some_type . }")
+    if not anchor:
+        # Elementos da classe que não estão em nenhum contentor
+        patterns.append(f"FILTER NOT EXISTS {{ ?container <{predicate}> ?e . }}")
+    if cursor:
+        (last,) = decode_cursor(cursor, size=1)
+        patterns.append(f"FILTER(STR(?e) > {Literal(last).n3()})")
+    patterns = "\n          ".join(patterns)
+
+    query = f"""
+        PREFIX rdfs: <{RDFS}>
+        SELECT DISTINCT ?e
+        WHERE {{
+          {patterns}
+        }}
+        ORDER BY STR(?e)
+        LIMIT {limit}
+    """
+    results = sparql_client.query(query, label="resumo_membros")
+
+    nodes = []
+    edges = []
+    for res in results:
+        uri = res['e']['value']
+        nodes.append({'id': uri, 'label': label_index.label_for(uri) or _format_property_name(uri)})
+        if anchor:
+            source, target = (anchor, uri) if direction == 'out' else (uri, anchor)
+            edges.append({'from': source, 'to': target, 'label': _format_property_name(predicate)})
 
-    return {"nodes": nodes, "edges": edges}
\ No newline at end of file
+    next_cursor = encode_cursor([nodes[-1]['id']]) if len(nodes) >= limit else None
+    return {"nodes": nodes, "edges": edges, "next_cursor": next_cursor}
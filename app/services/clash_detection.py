@@ -0,0 +1,274 @@
+"""
+Deteção de colisões geométricas entre elementos (ex: uma parede que atravessa
+um pilar, uma conduta que atravessa uma laje). As malhas são geradas pelo
+iterador de geometria do ifcopenshell, que triangula os elementos em várias
+threads, e guardadas como arrays NumPy de triângulos. Os pares de caixas
+envolventes que se intersetam são encontrados por varrimento ao longo de um
+eixo (sweep and prune) e só esses são verificados triângulo a triângulo, num
+pool de processos. Todos os testes são vetorizados com NumPy.
+
+Uma colisão exige interpenetração maior do que CLASH_TOLERANCE (em metros) em
+todas as direções testadas, pelo que os elementos que apenas se tocam (ex:
+paredes ligadas num canto, lajes apoiadas em paredes) não são reportados.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import ifcopenshell.geom
+import numpy
+from flask import current_app
+
+from .ifc_ingestion import _pool_context
+
+# Elementos sem geometria física própria (aberturas, saliências e elementos virtuais)
+_IGNORED_CLASSES = ('IfcFeatureElement', 'IfcVirtualElement')
+# Número máximo de pares de caixas comparados de uma vez no varrimento
+_PAIR_BLOCK = 1 << 20
+# Pares de triângulos testados de uma vez em cada par de elementos: o primeiro
+# bloco é pequeno, para terminar cedo quando as malhas se cruzam logo, e cresce até ao máximo
+_TRIANGLE_BLOCK_FIRST = 256
+_TRIANGLE_BLOCK = 8192
+
+def _elements(model):
+    return [element for element in model.by_type('IfcElement')
+            if not any(element.is_a(ifc_class) for ifc_class in _IGNORED_CLASSES)]
+
+def _expected_contacts(model):
+    """
+    Pares de elementos cujo contacto é intencional: uma porta ou janela e a
+    parede onde está a abertura que preenche, e as partes de um conjunto.
+    """
+    pairs = set()
+    for rel in model.by_type('IfcRelFillsElement'):
+        opening, filling = rel.RelatingOpeningElement, rel.RelatedBuildingElement
+        for voids in getattr(opening, 'VoidsElements', None) or ():
+            pairs.add(frozenset((voids.RelatingBuildingElement.id(), filling.id())))
+    for rel in model.by_type('IfcRelAggregates'):
+        parts = [part.id() for part in rel.RelatedObjects or ()] + [rel.RelatingObject.id()]
+        pairs.update(frozenset((a, b)) for a in parts for b in parts if a < b)
+    return pairs
+
+def iter_meshes(model, elements, threads):
+    """
+    Malhas triangulares (coordenadas globais, em metros) dos elementos, pela
+    ordem em que o iterador as termina: (id, triângulos numpy (n, 3, 3)).
+    """
+    settings = ifcopenshell.geom.settings()
+    settings.set(settings.USE_WORLD_COORDS, True)
+    iterator = ifcopenshell.geom.iterator(settings, model, threads, include=elements)
+    if not iterator.initialize():
+        return
+    while True:
+        shape = iterator.get()
+        faces = shape.geometry.faces
+        if faces:
+            verts = numpy.asarray(shape.geometry.verts, dtype=numpy.float64).reshape(-1, 3)
+            yield shape.id, verts[numpy.asarray(faces, dtype=numpy.int64).reshape(-1, 3)]
+        if not iterator.next():
+            break
+
+def bounding_box(triangles):
+    points = triangles.reshape(-1, 3)
+    return numpy.concatenate((points.min(axis=0), points.max(axis=0)))
+
+def _overlapping(a, b, tolerance):
+    """
+    As caixas (..., 6) intersetam-se com mais de `tolerance` de sobreposição
+    em cada eixo. Aceita caixas isoladas ou arrays de caixas (com broadcasting).
+    """
+    return ((a[..., :3] < b[..., 3:] - tolerance) & (b[..., :3] < a[..., 3:] - tolerance)).all(axis=-1)
+
+def candidate_pairs(boxes, tolerance):
+    """
+    Pares (i, j), i < j, cujas caixas se intersetam. As caixas são ordenadas
+    pelo mínimo em x; cada caixa só é comparada com as seguintes que começam
+    antes do seu fim em x, e essas comparações são feitas em blocos vetoriais.
+    """
+    boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape(-1, 6)
+    count = len(boxes)
+    order = numpy.argsort(boxes[:, 0], kind="stable")
+    ordered = boxes[order]
+    ends = numpy.searchsorted(ordered[:, 0], ordered[:, 3] - tolerance, side="left")
+    spans = numpy.maximum(ends - numpy.arange(count) - 1, 0)
+    cumulative = numpy.cumsum(spans)
+
+    found = []
+    start = 0
+    while start < count:
+        done = cumulative[start - 1] if start else 0
+        end = min(count, max(start + 1, int(numpy.searchsorted(cumulative, done + _PAIR_BLOCK, side="right"))))
+        block_spans = spans[start:end]
+        first = numpy.repeat(numpy.arange(start, end), block_spans)
+        offsets = numpy.arange(len(first)) - numpy.repeat(numpy.cumsum(block_spans) - block_spans, block_spans)
+        second = first + 1 + offsets
+        keep = _overlapping(ordered[first], ordered[second], tolerance)
+        i, j = order[first[keep]], order[second[keep]]
+        found.append(numpy.stack((numpy.minimum(i, j), numpy.maximum(i, j)), axis=1))
+        start = end
+    if not found:
+        return []
+    return sorted(map(tuple, numpy.concatenate(found).tolist()))
+
+def _dot(a, b):
+    return (a * b).sum(axis=-1)
+
+def _cross(a, b):
+    """Produto vetorial no último eixo (com menos custo fixo do que numpy.cross em arrays pequenos)."""
+    return numpy.stack((a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1],
+                        a[..., 2] * b[..., 0] - a[..., 0] * b[..., 2],
+                        a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]), axis=-1)
+
+def _overlap_on_axes(t1, t2, axes, tolerance):
+    """As projeções de t1[k] e t2[k] sobrepõem-se mais de `tolerance` em todos os eixos axes[k] (não nulos)."""
+    lengths = numpy.sqrt(_dot(axes, axes))
+    valid = lengths >= 1e-12
+    axes = axes / numpy.where(valid, lengths, 1.0)[..., None]
+    p1 = axes @ t1.transpose(0, 2, 1)
+    p2 = axes @ t2.transpose(0, 2, 1)
+    separated = (p1.max(axis=2) <= p2.min(axis=2) + tolerance) | (p2.max(axis=2) <= p1.min(axis=2) + tolerance)
+    return ~(separated & valid).any(axis=1)
+
+def triangles_intersect(t1, t2, tolerance):
+    """
+    Teste do eixo separador entre pares de triângulos t1[k] e t2[k], arrays
+    (k, 3, 3). Os triângulos só se intersetam se as projeções se sobrepuserem
+    mais de `tolerance` em todos os eixos: primeiro as duas normais e, para os
+    pares que restam, os 9 produtos das arestas. Os complanares (faces
+    encostadas) não contam como colisão. Devolve um array booleano (k,).
+    """
+    edges1 = numpy.roll(t1, -1, axis=1) - t1
+    edges2 = numpy.roll(t2, -1, axis=1) - t2
+    n1 = _cross(edges1[:, 0], edges1[:, 1])
+    n2 = _cross(edges2[:, 0], edges2[:, 1])
+    parallel = _cross(n1, n2)
+    result = _dot(parallel, parallel) > 1e-18 * _dot(n1, n1) * _dot(n2, n2)
+    result &= _overlap_on_axes(t1, t2, numpy.stack((n1, n2), axis=1), tolerance)
+    remaining = numpy.flatnonzero(result)
+    if len(remaining):
+        edge_axes = _cross(edges1[remaining, :, None], edges2[remaining, None, :]).reshape(-1, 9, 3)
+        result[remaining] = _overlap_on_axes(t1[remaining], t2[remaining], edge_axes, tolerance)
+    return result
+
+def _triangles_in(triangles, region, tolerance):
+    """Triângulos da malha (e a caixa de cada um) que intersetam a região."""
+    boxes = numpy.concatenate((triangles.min(axis=1), triangles.max(axis=1)), axis=1)
+    inside = _overlapping(boxes, region, -tolerance)
+    return triangles[inside], boxes[inside]
+
+# Direção dos raios do teste de inclusão, ligeiramente oblíqua para não passar por arestas alinhadas com os eixos
+_RAY = numpy.array((1.0, 1.41421356e-3, 1.73205081e-3))
+
+def _point_inside(point, triangles):
+    """O ponto está dentro da malha fechada (paridade das interseções de um raio, Möller–Trumbore)."""
+    v0 = triangles[:, 0]
+    edge1, edge2 = triangles[:, 1] - v0, triangles[:, 2] - v0
+    h = _cross(_RAY, edge2)
+    det = _dot(edge1, h)
+    valid = numpy.abs(det) >= 1e-12
+    det = numpy.where(valid, det, 1.0)
+    s = point - v0
+    u = _dot(s, h) / det
+    q = _cross(s, edge1)
+    v = (q @ _RAY) / det
+    distance = _dot(edge2, q) / det
+    crossings = valid & (u >= 0.0) & (u <= 1.0) & (v >= 0.0) & (u + v <= 1.0) & (distance > 0.0)
+    return int(crossings.sum()) % 2 == 1
+
+def _contains(outer, inner, tolerance):
+    return bool(((outer[:3] < inner[:3] - tolerance) & (inner[3:] < outer[3:] - tolerance)).all())
+
+def meshes_clash(mesh_a, mesh_b, box_a, box_b, tolerance):
+    """
+    Verificação exata de um par: só os triângulos dentro da sobreposição das
+    caixas são testados, e só os pares de triângulos cujas caixas se
+    intersetam. Sem faces que se cruzem, há ainda colisão se um elemento
+    estiver inteiramente dentro do outro (ex: um tubo embebido numa laje).
+    """
+    region = numpy.concatenate((numpy.maximum(box_a[:3], box_b[:3]), numpy.minimum(box_a[3:], box_b[3:])))
+    triangles_b, boxes_b = _triangles_in(mesh_b, region, tolerance)
+    if len(triangles_b):
+        triangles_a, boxes_a = _triangles_in(mesh_a, region, tolerance)
+        start, block = 0, _TRIANGLE_BLOCK_FIRST
+        while start < len(triangles_a):
+            step = max(1, block // len(triangles_b))
+            near_a, near_b = numpy.nonzero(_overlapping(boxes_a[start:start + step, None], boxes_b[None], -tolerance))
+            if len(near_a) and triangles_intersect(triangles_a[start + near_a], triangles_b[near_b], tolerance).any():
+                return True
+            start, block = start + step, min(2 * block, _TRIANGLE_BLOCK)
+    if _contains(box_b, box_a, tolerance):
+        return _point_inside(mesh_a[0, 0], mesh_b)
+    if _contains(box_a, box_b, tolerance):
+        return _point_inside(mesh_b[0, 0], mesh_a)
+    return False
+
+# Malhas e caixas do processo do pool (lidas dos ficheiros .npy no arranque)
+_worker_meshes = None
+_worker_boxes = None
+
+def _init_clash_worker(directory):
+    """
+    Abre, por memory-map, os arrays escritos por _check_all: os triângulos de
+    todas as malhas seguidos, o início de cada malha e as caixas envolventes.
+    """
+    global _worker_meshes, _worker_boxes
+    triangles = numpy.load(os.path.join(directory, "triangles.npy"), mmap_mode="r")
+    offsets = numpy.load(os.path.join(directory, "offsets.npy"))
+    _worker_meshes = [triangles[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    _worker_boxes = numpy.load(os.path.join(directory, "boxes.npy"), mmap_mode="r")
+
+def _check_pairs(pairs, tolerance, meshes=None, boxes=None):
+    """Verifica um bloco de pares candidatos (no processo do pool, por omissão); devolve os que colidem."""
+    meshes = _worker_meshes if meshes is None else meshes
+    boxes = _worker_boxes if boxes is None else boxes
+    return [(i, j) for i, j in pairs if meshes_clash(meshes[i], meshes[j], boxes[i], boxes[j], tolerance)]
+
+def _check_all(pairs, meshes, boxes, workers, tolerance):
+    if workers <= 1 or len(pairs) < 2:
+        return _check_pairs(pairs, tolerance, meshes, boxes)
+    # Os processos do pool não herdam a memória do servidor (forkserver ou
+    # spawn): as malhas são escritas uma vez em disco e lidas por memory-map
+    offsets = numpy.cumsum([0] + [len(mesh) for mesh in meshes])
+    chunk_size = max(1, -(-len(pairs) // (workers * 8)))
+    with tempfile.TemporaryDirectory(prefix="clash-") as directory:
+        numpy.save(os.path.join(directory, "triangles.npy"), numpy.concatenate(meshes))
+        numpy.save(os.path.join(directory, "offsets.npy"), offsets)
+        numpy.save(os.path.join(directory, "boxes.npy"), boxes)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(),
+                                 initializer=_init_clash_worker, initargs=(directory,)) as pool:
+            futures = [pool.submit(_check_pairs, pairs[i:i + chunk_size], tolerance)
+                       for i in range(0, len(pairs), chunk_size)]
+            return [pair for future in futures for pair in future.result()]
+
+def detect_clashes(model):
+    """
+    Colisões entre os elementos físicos do modelo. Devolve uma lista de
+    dicionários com o GlobalId, a classe e o nome de cada um dos dois elementos.
+    """
+    config = current_app.config
+    workers = config['CLASH_WORKERS']
+    tolerance = config['CLASH_TOLERANCE']
+
+    elements = _elements(model)
+    ids, meshes, boxes = [], [], []
+    for entity_id, triangles in iter_meshes(model, elements, workers):
+        ids.append(entity_id)
+        meshes.append(triangles)
+        boxes.append(bounding_box(triangles))
+    boxes = numpy.array(boxes).reshape(-1, 6)
+
+    expected = _expected_contacts(model)
+    pairs = [(i, j) for i, j in candidate_pairs(boxes, tolerance) if frozenset((ids[i], ids[j])) not in expected]
+    clashes = _check_all(pairs, meshes, boxes, workers, tolerance)
+    current_app.logger.info(
+        f"Deteção de colisões: {len(meshes)} elementos com geometria, {len(pairs)} pares candidatos, "
+        f"{len(clashes)} colisões.")
+
+    result = []
+    for i, j in sorted(clashes):
+        a, b = model.by_id(ids[i]), model.by_id(ids[j])
+        result.append({
+            "element": a.GlobalId, "class": a.is_a(), "name": a.Name,
+            "other": b.GlobalId, "other_class": b.is_a(), "other_name": b.Name,
+        })
+    return result
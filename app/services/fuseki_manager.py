@@ -1,11 +1,18 @@
-import ifcopenshell
-from rdflib import Graph, Namespace, Literal, RDF, RDFS
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import quote
+
+from rdflib import RDFS, URIRef
 import requests
 from flask import current_app
-from SPARQLWrapper import SPARQLWrapper, JSON
 
-BASE_URI = "http://exemplo.org/bim#"
-inst = Namespace(BASE_URI)
+from . import graph_store, local_store, metrics, ontology_summary, sparql_client
+from .ifc_ingestion import BASE_URI, inst, ingest_ifc, nt_line
 
 def convert_ifc_to_rdf(ifc_file_path):
     """
@@ -13,162 +20,318 @@ def convert_ifc_to_rdf(ifc_file_path):
     entidades e relacionamentos para criar um grafo de conhecimento conectado e detalhado.
     """
     try:
-        ifc_file = ifcopenshell.open(ifc_file_path)
+        graph = ingest_ifc(ifc_file_path)["knowledge_graph"]
     except Exception as e:
         current_app.logger.error(f"ERRO ao abrir IFC: {e}")
         return None
-        
-    graph = Graph()
-    graph.bind("inst", inst)
-    graph.bind("rdfs", RDFS)
-
-    # 1. Adiciona todos os objetos e suas classes como nós
-    for element in ifc_file.by_type('IfcObjectDefinition'):
-        if not getattr(element, 'GlobalId', None): continue
-        uri = inst[element.GlobalId]
-        if element.Name:
-            graph.add((uri, RDFS.label, Literal(element.Name)))
-        class_uri = inst[element.is_a()]
-        graph.add((uri, RDF.type, class_uri))
-        graph.add((class_uri, RDFS.label, Literal(element.is_a())))
-
-    # 2. Processa uma variedade de tipos de relacionamentos
-    for rel in ifc_file.by_type('IfcRelationship'):
-        if not getattr(rel, 'GlobalId', None): continue
-
-        # Relações de Agregação (ex: Projeto -> Edifício -> Andar)
-        if rel.is_a('IfcRelAggregates'):
-            if not getattr(rel, 'RelatingObject', None) or not getattr(rel, 'RelatedObjects', None): continue
-            relating_object_uri = inst[rel.RelatingObject.GlobalId]
-            for related_obj in rel.RelatedObjects:
-                if getattr(related_obj, 'GlobalId', None):
-                    related_object_uri = inst[related_obj.GlobalId]
-                    graph.add((relating_object_uri, inst.aggregates, related_object_uri))
-
-        # Relações de Conteúdo Espacial (ex: Andar -> Parede)
-        elif rel.is_a('IfcRelContainedInSpatialStructure'):
-            if not getattr(rel, 'RelatingStructure', None) or not getattr(rel, 'RelatedElements', None): continue
-            spatial_structure_uri = inst[rel.RelatingStructure.GlobalId]
-            for contained_elem in rel.RelatedElements:
-                if getattr(contained_elem, 'GlobalId', None):
-                    contained_elem_uri = inst[contained_elem.GlobalId]
-                    graph.add((spatial_structure_uri, inst.contains, contained_elem_uri))
-                    graph.add((contained_elem_uri, inst.isContainedIn, spatial_structure_uri))
-
-        # Relações de Material (lógica generalizada)
-        elif rel.is_a('IfcRelAssociatesMaterial'):
-            mat = None
-            # Tenta obter material de um LayerSet
-            if hasattr(rel.RelatingMaterial, 'ForLayerSet') and rel.RelatingMaterial.ForLayerSet:
-                if rel.RelatingMaterial.ForLayerSet.MaterialLayers:
-                    mat = rel.RelatingMaterial.ForLayerSet.MaterialLayers[0].Material
-            # Tenta obter material diretamente (caso mais simples)
-            elif hasattr(rel.RelatingMaterial, 'Name'):
-                mat = rel.RelatingMaterial
-            
-            if mat and getattr(mat, 'Name', None):
-                mat_uri = inst[f"Mat_{mat.Name.replace(' ', '_')}"]
-                graph.add((mat_uri, RDFS.label, Literal(mat.Name)))
-                graph.add((mat_uri, RDF.type, inst.Material))
-                for obj in rel.RelatedObjects:
-                    if getattr(obj, 'GlobalId', None):
-                        graph.add((inst[obj.GlobalId], inst.hasMaterial, mat_uri))
-
-        # Relações de Tipo (ex: IfcWall -> IfcWallType)
-        elif rel.is_a('IfcRelDefinesByType'):
-            if not getattr(rel, 'RelatingType', None) or not getattr(rel.RelatingType, 'GlobalId', None): continue
-            type_uri = inst[rel.RelatingType.GlobalId]
-            for obj in rel.RelatedObjects:
-                if getattr(obj, 'GlobalId', None):
-                    graph.add((inst[obj.GlobalId], inst.isDefinedBy, type_uri))
-
-        # Relações de Propriedades e Quantidades
-        elif rel.is_a('IfcRelDefinesByProperties'):
-            if not getattr(rel, 'RelatingPropertyDefinition', None): continue
-            prop_set = rel.RelatingPropertyDefinition
-            
-            # Extrai Quantidades (Volume, Área, etc.)
-            if prop_set.is_a('IfcElementQuantity'):
-                for quantity in prop_set.Quantities:
-                    if not getattr(quantity, 'Name', None) or not hasattr(quantity, 'Value'): continue
-                    prop_name = inst[str(quantity.Name).replace(' ', '_')]
-                    value_literal = Literal(quantity.Value)
-                    for obj in rel.RelatedObjects:
-                        if getattr(obj, 'GlobalId', None):
-                             graph.add((inst[obj.GlobalId], prop_name, value_literal))
-
-            # Extrai Propriedades de texto/numéricas
-            elif prop_set.is_a('IfcPropertySet'):
-                 if not hasattr(prop_set, 'HasProperties'): continue
-                 for prop in prop_set.HasProperties:
-                     if prop.is_a('IfcPropertySingleValue') and getattr(prop, 'NominalValue', None):
-                        prop_name = inst[str(prop.Name).replace(' ', '_')]
-                        value_literal = Literal(prop.NominalValue.wrappedValue)
-                        for obj in rel.RelatedObjects:
-                            if getattr(obj, 'GlobalId', None):
-                                 graph.add((inst[obj.GlobalId], prop_name, value_literal))
 
     current_app.logger.info(f"Conversão para RDF (Fuseki) concluída: {len(graph)} triplos.")
     return graph
 
-def upload_to_fuseki(graph):
+# Grafo nomeado onde se regista qual o modelo ativo
+META_GRAPH = URIRef(sparql_client.META_GRAPH)
+
+def model_graph_uri(model_name):
+    """URI do grafo nomeado onde fica guardado um modelo carregado."""
+    return URIRef(f"{BASE_URI}model/{quote(model_name, safe='')}")
+
+def _iter_ntriples_chunks(triples, chunk_size):
+    """Agrupa os triplos em blocos de `chunk_size` linhas N-Triples."""
+    chunk = []
+    for triple in triples:
+        chunk.append(nt_line(triple))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _run_update(session, update):
+    response = session.post(current_app.config['FUSEKI_UPDATE_ENDPOINT'], data={'update': update})
+    response.raise_for_status()
+
+def _activate_graph_update(target_graph):
+    """Operações SPARQL Update que marcam `target_graph` como o modelo ativo."""
+    return f"""
+        DELETE WHERE {{ GRAPH <{META_GRAPH}> {{ <{META_GRAPH}> <{inst.activeGraph}> ?g }} }} ;
+        INSERT DATA {{ GRAPH <{META_GRAPH}> {{ <{META_GRAPH}> <{inst.activeGraph}> <{target_graph}> }} }}
+    """
+
+def upload_to_fuseki(graph, model_name="default"):
+    """
+    Carrega os triplos (um Graph ou qualquer iterável de triplos) no Fuseki em
+    blocos N-Triples, primeiro para um grafo de staging e depois, numa única
+    atualização SPARQL, move-o para o grafo nomeado do modelo e marca-o como ativo.
+    Durante o carregamento, o modelo anterior continua disponível para consulta.
+    """
+    chunks = _iter_ntriples_chunks(graph, current_app.config['FUSEKI_UPLOAD_CHUNK_SIZE'])
+    return _upload_chunks(chunks, model_name)
+
+def spool_ntriples(triples, file):
+    """Escreve cada triplo em `file` (N-Triples) à medida que o devolve, sem o guardar em memória."""
+    for triple in triples:
+        file.write(nt_line(triple))
+        yield triple
+
+def upload_ntriples_file(path, model_name="default"):
+    """
+    Carrega no Fuseki um ficheiro N-Triples (ex: o da conversão em streaming),
+    lido em blocos de FUSEKI_UPLOAD_CHUNK_SIZE linhas. A impressão digital do
+    modelo é descartada, pelo que o próximo upload do projeto será completo.
+    """
+    chunk_size = current_app.config['FUSEKI_UPLOAD_CHUNK_SIZE']
+
+    def chunks():
+        with open(path, encoding='utf-8') as f:
+            chunk = []
+            for line in f:
+                chunk.append(line)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    fingerprint_path = _fingerprint_path(model_name)
+    if os.path.exists(fingerprint_path):
+        os.remove(fingerprint_path)
+    return _upload_chunks(chunks(), model_name)
+
+def _upload_chunks(chunks, model_name):
+    session = sparql_client.get_session()
     endpoint = current_app.config['FUSEKI_GSP_ENDPOINT']
-    auth = (current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
+    target_graph = model_graph_uri(model_name)
+    staging_graph = URIRef(f"{target_graph}/staging-{uuid.uuid4()}")
+
+    start = time.perf_counter()
+    total = 0
     try:
-        requests.delete(endpoint, params={'default': ''}, auth=auth).raise_for_status()
+        for chunk in chunks:
+            response = session.post(
+                endpoint, params={'graph': str(staging_graph)}, data=(line.encode('utf-8') for line in chunk),
+                headers={'Content-Type': 'application/n-triples'}
+            )
+            response.raise_for_status()
+            total += len(chunk)
+
+        _run_update(session, f"""
+            MOVE SILENT GRAPH <{staging_graph}> TO GRAPH <{target_graph}> ;
+            {_activate_graph_update(target_graph)}
+        """)
     except requests.exceptions.RequestException as e:
-        current_app.logger.warning(f"Não foi possível limpar o grafo no Fuseki: {e}")
+        current_app.logger.error(f"ERRO ao carregar para o Fuseki: {e}")
+        try:
+            _run_update(session, f"DROP SILENT GRAPH <{staging_graph}>")
+        except requests.exceptions.RequestException:
+            current_app.logger.warning(f"Não foi possível remover o grafo de staging {staging_graph}.")
+        return False
+
+    sparql_client.set_active_graph(target_graph)
+    elapsed = time.perf_counter() - start
+    metrics.record_stage("upload", elapsed)
+    current_app.logger.info(
+        f"Novos dados carregados no Fuseki: {total} triplos em <{target_graph}> "
+        f"({elapsed:.2f}s, {total / max(elapsed, 1e-9):.0f} triplos/s).")
+    return True
+
+def _fingerprint_path(model_name):
+    return os.path.join(current_app.config['FINGERPRINT_FOLDER'], f"{quote(model_name, safe='')}.json")
+
+def _load_fingerprint(model_name):
+    path = _fingerprint_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        fingerprint = json.load(f)
+    # As impressões digitais antigas não têm o número de triplos: o upload seguinte é completo
+    return fingerprint if "subjects" in fingerprint else None
+
+def _save_fingerprint(model_name, fingerprint):
+    path = _fingerprint_path(model_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f)
+    os.replace(tmp_path, path)
+
+def _fingerprint_graph(graph):
+    """
+    Agrupa as linhas N-Triples por sujeito (cada GlobalId, classe ou material)
+    e calcula um hash por sujeito que cobre os seus atributos e relações. A
+    impressão digital guarda também o número total de triplos do grafo.
+    """
+    rows = defaultdict(list)
+    for triple in graph:
+        rows[str(triple[0])].append(nt_line(triple))
+    subjects = {subject: hashlib.sha1("".join(sorted(lines)).encode('utf-8')).hexdigest()
+                for subject, lines in rows.items()}
+    return rows, {"triples": sum(len(lines) for lines in rows.values()), "subjects": subjects}
+
+def _graph_matches(target_graph, fingerprint):
+    """
+    Confirma que o grafo do modelo ainda está no Fuseki tal como ficou no
+    último upload (ex: um dataset em memória perde-o ao reiniciar), comparando
+    o número de triplos com o da impressão digital.
+    """
     try:
-        response = requests.post(
-            endpoint, params={'default': ''}, data=graph.serialize(format='turtle'),
-            headers={'Content-Type': 'text/turtle'}, auth=auth
-        )
-        response.raise_for_status()
-        current_app.logger.info("Novos dados carregados no Fuseki.")
-        return True
+        count = sparql_client.count_graph_triples(target_graph)
     except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"ERRO ao carregar para o Fuseki: {e}")
+        current_app.logger.warning(f"Não foi possível contar os triplos de <{target_graph}>: {e}")
+        return False
+    if count != fingerprint["triples"]:
+        current_app.logger.warning(
+            f"O grafo <{target_graph}> tem {count} triplos em vez de {fingerprint['triples']}, "
+            f"a recarregar o modelo completo.")
+        return False
+    return True
+
+def _apply_delta(target_graph, rows, stale_subjects, new_subjects):
+    """Aplica a diferença num único pedido SPARQL Update (atómico no Fuseki)."""
+    operations = []
+    if stale_subjects:
+        values = " ".join(f"<{subject}>" for subject in stale_subjects)
+        operations.append(f"""
+            DELETE {{ GRAPH <{target_graph}> {{ ?s ?p ?o }} }}
+            WHERE {{ GRAPH <{target_graph}> {{ VALUES ?s {{ {values} }} ?s ?p ?o }} }} ;""")
+    if new_subjects:
+        data = "".join(line for subject in new_subjects for line in rows[subject])
+        operations.append(f"INSERT DATA {{ GRAPH <{target_graph}> {{\n{data}}} }} ;")
+    operations.append(_activate_graph_update(target_graph))
+    _run_update(sparql_client.get_session(), "\n".join(operations))
+
+def sync_model_to_fuseki(graph, model_name="default"):
+    """
+    Carrega o modelo no Fuseki enviando apenas o que mudou desde o último upload
+    do mesmo projeto. Compara a impressão digital de cada sujeito com a guardada
+    em disco e envia um SPARQL Update com os sujeitos adicionados, removidos e
+    alterados. Se não houver impressão digital anterior, se o grafo no Fuseki
+    já não corresponder a ela, se a diferença exceder FUSEKI_UPLOAD_CHUNK_SIZE
+    triplos ou se a atualização falhar, recorre ao carregamento completo de
+    `upload_to_fuseki`.
+    """
+    start = time.perf_counter()
+    rows, fingerprint = _fingerprint_graph(graph)
+    previous = _load_fingerprint(model_name)
+
+    if previous is not None:
+        current, stored = fingerprint["subjects"], previous["subjects"]
+        added = current.keys() - stored.keys()
+        removed = stored.keys() - current.keys()
+        changed = {subject for subject in current.keys() & stored.keys() if current[subject] != stored[subject]}
+        delta_size = sum(len(rows[subject]) for subject in added | changed) + len(removed | changed)
+        target_graph = model_graph_uri(model_name)
+
+        if delta_size <= current_app.config['FUSEKI_UPLOAD_CHUNK_SIZE'] and _graph_matches(target_graph, previous):
+            try:
+                _apply_delta(target_graph, rows, removed | changed, added | changed)
+            except requests.exceptions.RequestException as e:
+                current_app.logger.warning(f"Atualização incremental falhou, a recarregar o modelo completo: {e}")
+            else:
+                sparql_client.set_active_graph(target_graph)
+                _save_fingerprint(model_name, fingerprint)
+                metrics.record_stage("upload", time.perf_counter() - start)
+                current_app.logger.info(
+                    f"Atualização incremental de <{target_graph}>: {len(added)} adicionados, "
+                    f"{len(removed)} removidos, {len(changed)} alterados "
+                    f"({delta_size} operações, {time.perf_counter() - start:.2f}s).")
+                return True
+
+    if not upload_to_fuseki(graph, model_name):
         return False
+    _save_fingerprint(model_name, fingerprint)
+    return True
+
+def model_store_path(model_name):
+    """Ficheiro compacto com o último grafo carregado de um modelo."""
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{quote(model_name, safe='')}.bkg")
+
+def _model_store_hash_path(model_name):
+    return f"{model_store_path(model_name)}.sha256"
+
+def save_model_store(graph, model_name, content_hash=None):
+    """
+    Guarda o grafo do modelo no formato compacto de `graph_store`, para que possa
+    ser recarregado no Fuseki sem voltar a converter o IFC, e ao lado o hash do
+    ficheiro IFC de onde veio (se conhecido).
+    """
+    path = model_store_path(model_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        if isinstance(graph, graph_store.CompactGraph):
+            if os.path.abspath(graph.path) != os.path.abspath(path):
+                shutil.copyfile(graph.path, f"{path}.tmp")
+                os.replace(f"{path}.tmp", path)
+        else:
+            with metrics.span("serialize"):
+                graph_store.write_graph(graph, path)
+        hash_path = _model_store_hash_path(model_name)
+        if content_hash:
+            tmp_path = f"{hash_path}.tmp-{uuid.uuid4()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content_hash)
+            os.replace(tmp_path, hash_path)
+        elif os.path.exists(hash_path):
+            os.remove(hash_path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o modelo '{model_name}' em disco: {e}")
+
+def model_store_hash(model_name):
+    """Hash do ficheiro IFC do grafo guardado de um modelo, ou None se não for conhecido."""
+    try:
+        with open(_model_store_hash_path(model_name), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def remove_model_store(model_name):
+    """Apaga o grafo guardado de um modelo (e o seu hash), quando deixou de corresponder ao carregado."""
+    for path in (model_store_path(model_name), _model_store_hash_path(model_name)):
+        if os.path.exists(path):
+            os.remove(path)
 
 def get_ontology_summary():
-    sparql = SPARQLWrapper(current_app.config['FUSEKI_QUERY_ENDPOINT'])
-    sparql.setCredentials(current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
-    sparql.setReturnFormat(JSON)
+    """
+    Resumo da ontologia do modelo ativo. Normalmente já foi calculado no
+    carregamento (`ontology_summary`); só os modelos carregados antes disso são
+    resumidos com consultas de agregação, uma vez, ficando o resultado em memória.
+    """
+    graph_uri = sparql_client.get_active_graph()
+    summary = ontology_summary.get(graph_uri)
+    if summary is not None:
+        return summary
+    if local_store.is_enabled():
+        summary = ontology_summary.compute(local_store.get_graph() or ())
+        ontology_summary.remember(graph_uri, summary)
+        return summary
 
+    max_examples = current_app.config['ONTOLOGY_SUMMARY_MAX_EXAMPLES']
     # Consulta 1: Busca os tipos de objetos e exemplos de nomes
     types_query = f"""
         PREFIX rdfs: <{RDFS}>
         PREFIX inst: <{BASE_URI}>
-        SELECT ?type_label (GROUP_CONCAT(DISTINCT ?ex; SEPARATOR=", ") AS ?examples)
+        SELECT ?type_label (COUNT(DISTINCT ?s) AS ?count) (GROUP_CONCAT(DISTINCT ?ex; SEPARATOR=", ") AS ?examples)
         WHERE {{
             ?s a ?type ; rdfs:label ?ex .
             ?type rdfs:label ?type_label .
             FILTER(STRSTARTS(STR(?type), STR(inst:)))
         }} GROUP BY ?type_label ORDER BY ?type_label
     """
-    sparql.setQuery(types_query)
-    types_res = sparql.query().convert().get("results", {}).get("bindings", [])
-    types = [{"type": r['type_label']['value'], "examples": r['examples']['value'].split(', ')} for r in types_res]
+    types_res = sparql_client.query(types_query, label="resumo_tipos")
+    types = [{"type": r['type_label']['value'], "count": int(r['count']['value']),
+              "examples": sorted(r['examples']['value'].split(', '))[:max_examples]} for r in types_res]
 
-    # Consulta 2: Busca dinamicamente todos os tipos de relações (predicados)
-    relations_query = f"""
+    # Consulta 2: Busca todos os tipos de relações (predicados)
+    relations_query = """
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX inst: <{BASE_URI}>
-        SELECT DISTINCT ?p_name
-        WHERE {{
+        SELECT DISTINCT ?p
+        WHERE {
             ?s ?p ?o .
             FILTER(?p != rdfs:label)
-            BIND(
-                IF(STRSTARTS(STR(?p), STR(inst:)),
-                  REPLACE(STR(?p), STR(inst:), ""),
-                  REPLACE(STR(?p), "http://www.w3.org/1999/02/22-rdf-syntax-ns#", "rdf:")
-                )
-             AS ?p_name)
-        }} ORDER BY ?p_name
-    """
-    sparql.setQuery(relations_query)
-    relations_res = sparql.query().convert().get("results", {}).get("bindings", [])
-    relations = sorted([r['p_name']['value'].replace('rdf:type', 'type') for r in relations_res])
-    
-    return {"types": types, "relations": relations}
\ No newline at end of file
+        }
+    """
+    relations_res = sparql_client.query(relations_query, label="resumo_relacoes")
+    relations = sorted({ontology_summary.relation_name(r['p']['value']) for r in relations_res})
+
+    summary = {"types": types, "relations": relations}
+    ontology_summary.remember(graph_uri, summary)
+    return summary
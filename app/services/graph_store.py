@@ -0,0 +1,231 @@
+"""
+Formato binário compacto para os grafos convertidos, inspirado no HDT: um
+dicionário de termos (cada termo RDF guardado uma única vez) e os triplos como
+um vetor de inteiros (s, p, o) ordenado. O ficheiro é lido por memory-mapping,
+por isso reabrir um modelo não obriga a ler o IFC nem a criar objetos Python
+por triplo.
+
+Estrutura do ficheiro:
+    cabeçalho   MAGIC, n.º de termos, n.º de triplos, posição dos offsets, posição dos triplos
+    termos      termos codificados em UTF-8, ordenados pelos seus bytes (o
+                identificador de um termo é a sua posição nesta ordem)
+    offsets     (n.º de termos + 1) inteiros de 64 bits com o início de cada termo
+    triplos     3 × n.º de triplos inteiros de 32 bits, ordenados por (s, p, o)
+"""
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import numpy
+from rdflib import BNode, Literal, URIRef
+
+MAGIC = b"BIMKG02\x00"
+_HEADER = struct.Struct("<8sQQQQ")
+
+def _encode_term(term):
+    if isinstance(term, URIRef):
+        return b"U" + str(term).encode("utf-8")
+    if isinstance(term, BNode):
+        return b"B" + str(term).encode("utf-8")
+    language = (term.language or "").encode("utf-8")
+    datatype = str(term.datatype or "").encode("utf-8")
+    return b"L" + language + b"\x00" + datatype + b"\x00" + str(term).encode("utf-8")
+
+def _decode_term(data):
+    kind, value = data[:1], data[1:]
+    if kind == b"U":
+        return URIRef(value.decode("utf-8"))
+    if kind == b"B":
+        return BNode(value.decode("utf-8"))
+    language, datatype, text = value.split(b"\x00", 2)
+    return Literal(text.decode("utf-8"), lang=language.decode("utf-8") or None,
+                   datatype=URIRef(datatype.decode("utf-8")) if datatype else None)
+
+def _native_order(values):
+    """Os ficheiros são sempre little-endian, independentemente da máquina."""
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+def write_graph(triples, path):
+    """
+    Escreve os triplos (um Graph ou qualquer iterável) no formato compacto.
+    A escrita é atómica: o ficheiro só aparece quando está completo.
+    Devolve o número de triplos escritos.
+    """
+    term_ids = {}
+    terms = []
+    ids = array("I")
+    for triple in triples:
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(terms)
+                terms.append(term)
+            ids.append(term_id)
+
+    # Dicionário ordenado pelos bytes dos termos (para a pesquisa binária de
+    # `CompactGraph.term_id`) e numeração provisória -> posição nessa ordem
+    encoded_terms = [_encode_term(term) for term in terms]
+    dictionary = sorted(set(encoded_terms))
+    position = {encoded: index for index, encoded in enumerate(dictionary)}
+    renumber = numpy.fromiter((position[encoded] for encoded in encoded_terms), dtype=numpy.uint32, count=len(terms))
+    blob = b"".join(dictionary)
+    offsets = numpy.zeros(len(dictionary) + 1, dtype="<u8")
+    numpy.cumsum([len(encoded) for encoded in dictionary], out=offsets[1:])
+
+    # Triplos como linhas de 3 inteiros: ordenados por (s, p, o) e sem repetições
+    rows = renumber[numpy.frombuffer(ids, dtype=numpy.uint32)].reshape(-1, 3)
+    rows = rows[numpy.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))]
+    if len(rows):
+        distinct = numpy.ones(len(rows), dtype=bool)
+        distinct[1:] = (rows[1:] != rows[:-1]).any(axis=1)
+        rows = rows[distinct]
+
+    offsets_pos = _HEADER.size + len(blob)
+    offsets_pos += -offsets_pos % 8
+    triples_pos = offsets_pos + offsets.itemsize * len(offsets)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(dictionary), len(rows), offsets_pos, triples_pos))
+        f.write(blob)
+        f.write(b"\x00" * (offsets_pos - _HEADER.size - len(blob)))
+        f.write(offsets.tobytes())
+        f.write(rows.astype("<u4").tobytes())
+    os.replace(tmp_path, path)
+    return len(rows)
+
+class CompactGraph:
+    """Grafo só de leitura sobre um ficheiro no formato compacto, aberto por memory-mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.term_count, self.triple_count, offsets_pos, triples_pos = _HEADER.unpack_from(self._mmap, 0)
+        self._offsets = self._triples = None
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Ficheiro de grafo inválido: {path}")
+        self._terms_pos = _HEADER.size
+        self._view = view = memoryview(self._mmap)
+        if sys.byteorder == "little":
+            self._offsets = view[offsets_pos:triples_pos].cast("Q")
+            self._triples = view[triples_pos:triples_pos + 12 * self.triple_count].cast("I")
+        else:
+            self._offsets = _native_order(array("Q", view[offsets_pos:triples_pos]))
+            self._triples = _native_order(array("I", view[triples_pos:triples_pos + 12 * self.triple_count]))
+        self._term_cache = {}
+
+    def __len__(self):
+        return self.triple_count
+
+    def term_bytes(self, term_id):
+        """Termo codificado, tal como está no dicionário."""
+        start = self._terms_pos + self._offsets[term_id]
+        end = self._terms_pos + self._offsets[term_id + 1]
+        return self._mmap[start:end]
+
+    def term(self, term_id):
+        """Termo RDF correspondente a um identificador inteiro."""
+        term = self._term_cache.get(term_id)
+        if term is None:
+            term = self._term_cache[term_id] = _decode_term(self.term_bytes(term_id))
+        return term
+
+    def term_id(self, term):
+        """Identificador de um termo, ou None se não existir no grafo (pesquisa binária no dicionário)."""
+        encoded = _encode_term(term)
+        index = bisect.bisect_left(_TermColumn(self), encoded)
+        if index < self.term_count and self.term_bytes(index) == encoded:
+            return index
+        return None
+
+    def iter_ids(self):
+        """Triplos como tuplos de identificadores inteiros (sem criar termos RDF)."""
+        triples = self._triples
+        for index in range(0, 3 * self.triple_count, 3):
+            yield triples[index], triples[index + 1], triples[index + 2]
+
+    def __iter__(self):
+        term = self.term
+        for s, p, o in self.iter_ids():
+            yield term(s), term(p), term(o)
+
+    def subject_triples(self, subject_id):
+        """Triplos de um sujeito, por pesquisa binária na ordem (s, p, o)."""
+        triples = self._triples
+        low = bisect.bisect_left(_SubjectColumn(triples), subject_id)
+        for index in range(3 * low, 3 * self.triple_count, 3):
+            if triples[index] != subject_id:
+                break
+            yield triples[index], triples[index + 1], triples[index + 2]
+
+    def triples(self, pattern):
+        """Triplos que respeitam o padrão (s, p, o), com None como variável (como no rdflib)."""
+        ids = []
+        for term in pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self.term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+        s, p, o = ids
+        candidates = self.subject_triples(s) if s is not None else self.iter_ids()
+        term = self.term
+        for triple in candidates:
+            if (p is None or triple[1] == p) and (o is None or triple[2] == o):
+                yield term(triple[0]), term(triple[1]), term(triple[2])
+
+    def subject_objects(self, predicate):
+        for s, _, o in self.triples((None, predicate, None)):
+            yield s, o
+
+    def close(self):
+        for view in (self._offsets, self._triples, getattr(self, "_view", None)):
+            if isinstance(view, memoryview):
+                view.release()
+        self._offsets = self._triples = self._view = None
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _TermColumn:
+    """Vista do dicionário de termos, para usar com `bisect`."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return self._graph.term_count
+
+    def __getitem__(self, index):
+        return self._graph.term_bytes(index)
+
+class _SubjectColumn:
+    """Vista da coluna dos sujeitos, para usar com `bisect`."""
+
+    def __init__(self, triples):
+        self._triples = triples
+
+    def __len__(self):
+        return len(self._triples) // 3
+
+    def __getitem__(self, index):
+        return self._triples[3 * index]
+
+def open_graph(path):
+    return CompactGraph(path)
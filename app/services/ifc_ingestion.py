@@ -0,0 +1,394 @@
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ifcopenshell
+from flask import current_app
+from rdflib import RDF, RDFS, Graph, Literal, Namespace
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+
+from . import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_URI = "http://exemplo.org/bim#"
+inst = Namespace(BASE_URI)
+
+IFC_NS = Namespace("http://exemplo.org/ifc/")
+PROP_NS = Namespace("http://exemplo.org/ifc/property#")
+
+# Destino de cada triplo produzido durante a travessia do modelo
+VALIDATION = "validation"
+KNOWLEDGE = "knowledge"
+
+def _iter_object_triples(element):
+    """Triplos de um IfcObjectDefinition para os dois grafos."""
+    uri = inst[element.GlobalId]
+    if element.Name:
+        yield KNOWLEDGE, (uri, RDFS.label, Literal(element.Name))
+    class_uri = inst[element.is_a()]
+    yield KNOWLEDGE, (uri, RDF.type, class_uri)
+    yield KNOWLEDGE, (class_uri, RDFS.label, Literal(element.is_a()))
+
+    # O grafo de validação só considera produtos (IfcProduct)
+    if element.is_a('IfcProduct'):
+        val_uri = IFC_NS[element.GlobalId]
+        yield VALIDATION, (val_uri, RDF.type, IFC_NS[element.is_a()])
+        if element.Name:
+            yield VALIDATION, (val_uri, IFC_NS["name"], Literal(element.Name))
+
+def _quantity_value(quantity):
+    """
+    Valor de uma quantidade simples (IfcQuantityLength, Area, Volume, Count,
+    Weight ou Time). O atributo tem um nome diferente em cada classe
+    (LengthValue, AreaValue, ...), mas é sempre o quarto.
+    """
+    if not quantity.is_a('IfcPhysicalSimpleQuantity'):
+        return None
+    return quantity[3]
+
+def _iter_relationship_triples(rel):
+    """Triplos de um IfcRelationship para os dois grafos."""
+    # Relações de Agregação (ex: Projeto -> Edifício -> Andar)
+    if rel.is_a('IfcRelAggregates'):
+        if not getattr(rel, 'RelatingObject', None) or not getattr(rel, 'RelatedObjects', None): return
+        relating_object_uri = inst[rel.RelatingObject.GlobalId]
+        for related_obj in rel.RelatedObjects:
+            if getattr(related_obj, 'GlobalId', None):
+                yield KNOWLEDGE, (relating_object_uri, inst.aggregates, inst[related_obj.GlobalId])
+
+    # Relações de Conteúdo Espacial (ex: Andar -> Parede)
+    elif rel.is_a('IfcRelContainedInSpatialStructure'):
+        structure = getattr(rel, 'RelatingStructure', None)
+        if not structure or not getattr(rel, 'RelatedElements', None): return
+        spatial_structure_uri = inst[structure.GlobalId]
+        for contained_elem in rel.RelatedElements:
+            if getattr(contained_elem, 'GlobalId', None):
+                contained_elem_uri = inst[contained_elem.GlobalId]
+                yield KNOWLEDGE, (spatial_structure_uri, inst.contains, contained_elem_uri)
+                yield KNOWLEDGE, (contained_elem_uri, inst.isContainedIn, spatial_structure_uri)
+                yield VALIDATION, (IFC_NS[contained_elem.GlobalId], PROP_NS["ContainedInStructure"], IFC_NS[structure.GlobalId])
+
+    # Portas/janelas que preenchem aberturas (apenas para validação)
+    elif rel.is_a('IfcRelFillsElement'):
+        element = getattr(rel, 'RelatedBuildingElement', None)
+        opening = getattr(rel, 'RelatingOpeningElement', None)
+        if element and opening and getattr(element, 'GlobalId', None):
+            yield VALIDATION, (IFC_NS[element.GlobalId], PROP_NS["FillsVoids"], IFC_NS[opening.GlobalId])
+
+    # Relações de Material (lógica generalizada)
+    elif rel.is_a('IfcRelAssociatesMaterial'):
+        mat = None
+        # Tenta obter material de um LayerSet
+        if hasattr(rel.RelatingMaterial, 'ForLayerSet') and rel.RelatingMaterial.ForLayerSet:
+            if rel.RelatingMaterial.ForLayerSet.MaterialLayers:
+                mat = rel.RelatingMaterial.ForLayerSet.MaterialLayers[0].Material
+        # Tenta obter material diretamente (caso mais simples)
+        elif hasattr(rel.RelatingMaterial, 'Name'):
+            mat = rel.RelatingMaterial
+
+        if mat and getattr(mat, 'Name', None):
+            mat_uri = inst[f"Mat_{mat.Name.replace(' ', '_')}"]
+            yield KNOWLEDGE, (mat_uri, RDFS.label, Literal(mat.Name))
+            yield KNOWLEDGE, (mat_uri, RDF.type, inst.Material)
+            for obj in rel.RelatedObjects:
+                if getattr(obj, 'GlobalId', None):
+                    yield KNOWLEDGE, (inst[obj.GlobalId], inst.hasMaterial, mat_uri)
+
+    # Relações de Tipo (ex: IfcWall -> IfcWallType)
+    elif rel.is_a('IfcRelDefinesByType'):
+        if not getattr(rel, 'RelatingType', None) or not getattr(rel.RelatingType, 'GlobalId', None): return
+        type_uri = inst[rel.RelatingType.GlobalId]
+        for obj in rel.RelatedObjects:
+            if getattr(obj, 'GlobalId', None):
+                yield KNOWLEDGE, (inst[obj.GlobalId], inst.isDefinedBy, type_uri)
+
+    # Relações de Propriedades e Quantidades
+    elif rel.is_a('IfcRelDefinesByProperties'):
+        if not getattr(rel, 'RelatingPropertyDefinition', None): return
+        prop_set = rel.RelatingPropertyDefinition
+
+        # Extrai Quantidades (Volume, Área, etc.)
+        if prop_set.is_a('IfcElementQuantity'):
+            for quantity in prop_set.Quantities:
+                value = _quantity_value(quantity)
+                if not getattr(quantity, 'Name', None) or value is None: continue
+                prop_name = inst[str(quantity.Name).replace(' ', '_')]
+                value_literal = Literal(value)
+                for obj in rel.RelatedObjects:
+                    if getattr(obj, 'GlobalId', None):
+                        yield KNOWLEDGE, (inst[obj.GlobalId], prop_name, value_literal)
+
+        # Extrai Propriedades de texto/numéricas
+        elif prop_set.is_a('IfcPropertySet'):
+            if not hasattr(prop_set, 'HasProperties'): return
+            for prop in prop_set.HasProperties:
+                if prop.is_a('IfcPropertySingleValue') and getattr(prop, 'NominalValue', None):
+                    prop_name = inst[str(prop.Name).replace(' ', '_')]
+                    value_literal = Literal(prop.NominalValue.wrappedValue)
+                    for obj in rel.RelatedObjects:
+                        if getattr(obj, 'GlobalId', None):
+                            yield KNOWLEDGE, (inst[obj.GlobalId], prop_name, value_literal)
+
+def iter_model_triples(model):
+    """
+    Percorre o modelo uma única vez (objetos e depois relações) e produz pares
+    (destino, triplo), onde destino é VALIDATION ou KNOWLEDGE.
+    """
+    for element in model.by_type('IfcObjectDefinition'):
+        if not getattr(element, 'GlobalId', None): continue
+        yield from _iter_object_triples(element)
+
+    for rel in model.by_type('IfcRelationship'):
+        if not getattr(rel, 'GlobalId', None): continue
+        yield from _iter_relationship_triples(rel)
+
+def nt_term(term):
+    """Termo em N-Triples (os literais com as mesmas regras de escape do serializador 'nt' do rdflib)."""
+    if not isinstance(term, Literal):
+        return term.n3()
+    quoted = '"%s"' % str(term).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"').replace("\r", "\\r")
+    if term.language:
+        return f"{quoted}@{term.language}"
+    if term.datatype:
+        return f"{quoted}^^<{term.datatype}>"
+    return quoted
+
+def nt_line(triple):
+    return f"{nt_term(triple[0])} {nt_term(triple[1])} {nt_term(triple[2])} .\n"
+
+# Conversão em paralelo: modelo aberto em cada processo do pool
+_worker_model = None
+
+def _pool_context():
+    """
+    Contexto do pool de conversão. O processo do servidor tem várias threads
+    (pedidos, tarefas, renovação dos registos), e um fork feito a partir dele
+    pode herdar locks presos; os processos são por isso criados por um
+    forkserver (um processo sem threads que já importou este módulo) ou, onde
+    não existe, por spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def _init_conversion_worker(ifc_file_path):
+    global _worker_model
+    _worker_model = ifcopenshell.open(ifc_file_path)
+
+def _convert_chunk(kind, entity_ids, include_validation):
+    """
+    Converte um bloco de entidades (por id) no processo do pool. Devolve, por
+    destino, os triplos do bloco em texto N-Triples, que o processo principal
+    lê de uma só vez (em vez de receber e reconstruir cada termo).
+    """
+    iter_triples = _iter_object_triples if kind == "object" else _iter_relationship_triples
+    lines = {VALIDATION: [], KNOWLEDGE: []}
+    for entity_id in entity_ids:
+        entity = _worker_model.by_id(entity_id)
+        if not getattr(entity, 'GlobalId', None): continue
+        for target, triple in iter_triples(entity):
+            if target == VALIDATION and not include_validation:
+                continue
+            lines[target].append(nt_line(triple))
+    return {target: "".join(chunk) for target, chunk in lines.items() if chunk}
+
+def _iter_model_chunks_parallel(model, ifc_file_path, workers, include_validation):
+    """
+    Os triplos de `iter_model_triples`, com as entidades divididas em blocos
+    contíguos por um pool de processos. Produz pares (destino, texto N-Triples),
+    um por destino e por bloco, pela ordem dos blocos.
+    """
+    chunks = []
+    for kind, ifc_class in (("object", 'IfcObjectDefinition'), ("relationship", 'IfcRelationship')):
+        entity_ids = [entity.id() for entity in model.by_type(ifc_class)]
+        chunk_size = max(1, -(-len(entity_ids) // (workers * 4)))
+        chunks.extend((kind, entity_ids[i:i + chunk_size]) for i in range(0, len(entity_ids), chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(),
+                             initializer=_init_conversion_worker, initargs=(ifc_file_path,)) as pool:
+        futures = [pool.submit(_convert_chunk, kind, entity_ids, include_validation) for kind, entity_ids in chunks]
+        for future in futures:
+            yield from future.result().items()
+
+class _TripleList(list):
+    """Destino do leitor de N-Triples: guarda os triplos pela ordem do texto, com repetições."""
+
+    def triple(self, s, p, o):
+        self.append((s, p, o))
+
+def _parse_ntriples(text):
+    triples = _TripleList()
+    W3CNTriplesParser(triples).parsestring(text)
+    return triples
+
+def _parallel_workers(model):
+    """Número de processos para converter o modelo, ou 0 para a travessia em série."""
+    config = current_app.config
+    workers = config['CONVERSION_WORKERS']
+    if workers > 1 and len(model.by_type('IfcRoot')) >= config['CONVERSION_PARALLEL_MIN_ENTITIES']:
+        current_app.logger.info(f"Conversão IFC em paralelo com {workers} processos.")
+        return workers
+    return 0
+
+def _iter_ingestion_triples(model, ifc_file_path, include_validation):
+    """Pares (destino, triplo) da travessia em série ou, conforme o tamanho do modelo, em paralelo."""
+    workers = _parallel_workers(model)
+    if workers:
+        return ((target, triple)
+                for target, text in _iter_model_chunks_parallel(model, ifc_file_path, workers, include_validation)
+                for triple in _parse_ntriples(text))
+    return (item for item in iter_model_triples(model) if include_validation or item[0] != VALIDATION)
+
+def ingest_ifc(ifc_file_path, validation_graph=True):
+    """
+    Lê o ficheiro IFC uma única vez e constrói, a partir da mesma travessia,
+    o grafo de dados para a validação SHACL e o grafo da base de conhecimento.
+    Com `validation_graph=False` (motor de validação nativo) o primeiro é omitido.
+    Devolve um dicionário com os dois grafos e os tempos de cada fase (em segundos).
+    """
+    build_validation = validation_graph
+    timings = {}
+
+    start = time.perf_counter()
+    model = ifcopenshell.open(ifc_file_path)
+    timings['parse'] = time.perf_counter() - start
+
+    validation_graph = None
+    if build_validation:
+        validation_graph = Graph()
+        validation_graph.bind("ifc", IFC_NS)
+        validation_graph.bind("prop", PROP_NS)
+    knowledge_graph = Graph()
+    knowledge_graph.bind("inst", inst)
+    knowledge_graph.bind("rdfs", RDFS)
+    graphs = {VALIDATION: validation_graph, KNOWLEDGE: knowledge_graph}
+    produced = {VALIDATION: 0, KNOWLEDGE: 0}
+
+    # Cada triplo vai diretamente para o seu grafo (sem listas intermédias, que
+    # duplicariam o pico de memória); em paralelo, cada bloco N-Triples devolvido
+    # pelo pool é lido de uma só vez para o grafo. O tempo da travessia e o da
+    # construção dos grafos são acumulados separadamente
+    workers = _parallel_workers(model)
+    if workers:
+        items = _iter_model_chunks_parallel(model, ifc_file_path, workers, build_validation)
+
+        def add(target, text):
+            graphs[target].parse(data=text, format="nt")
+            return text.count("\n")
+    else:
+        items = (item for item in iter_model_triples(model) if build_validation or item[0] != VALIDATION)
+
+        def add(target, triple):
+            graphs[target].add(triple)
+            return 1
+
+    clock = time.perf_counter
+    walk_time = build_time = 0.0
+    mark = clock()
+    for target, item in items:
+        produced_at = clock()
+        walk_time += produced_at - mark
+        produced[target] += add(target, item)
+        mark = clock()
+        build_time += mark - produced_at
+    timings['walk'] = walk_time + (clock() - mark)
+    timings['graph_build'] = build_time
+
+    metrics.record_stage("parse", timings['parse'])
+    metrics.record_stage("convert", timings['walk'])
+    metrics.record_stage("graph_build", timings['graph_build'])
+    metrics.inc(metrics.TRIPLES_PRODUCED, produced[VALIDATION], graph="validation")
+    metrics.inc(metrics.TRIPLES_PRODUCED, produced[KNOWLEDGE], graph="knowledge")
+
+    current_app.logger.info(
+        f"Ingestão IFC concluída: {len(validation_graph) if build_validation else 0} triplos de validação, "
+        f"{len(knowledge_graph)} triplos de conhecimento "
+        f"(parse {timings['parse']:.2f}s, travessia {timings['walk']:.2f}s, grafos {timings['graph_build']:.2f}s).")
+
+    return {
+        "model": model,
+        "validation_graph": validation_graph,
+        "knowledge_graph": knowledge_graph,
+        "timings": timings,
+    }
+
+def peak_memory_mb():
+    """Pico de memória residente do processo (MB), ou None se não for possível medi-lo."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Em Linux o valor vem em KB, em macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _check_memory(limit_mb):
+    peak = peak_memory_mb()
+    if limit_mb and peak is not None and peak > limit_mb:
+        raise MemoryError(f"Conversão interrompida: {peak:.0f} MB de memória excede o limite de {limit_mb} MB.")
+
+def stream_ifc(ifc_file_path, consume_knowledge, validation_graph=True):
+    """
+    Conversão em streaming para modelos grandes: os triplos da base de
+    conhecimento não são guardados num Graph, são entregues à medida que a
+    travessia avança a `consume_knowledge(triplos)`, que os deve escrever
+    (ex: num ficheiro N-Triples) em vez de os acumular. Só o grafo de validação,
+    muito menor, fica em memória. O pico de memória é verificado durante a
+    travessia contra CONVERSION_MEMORY_LIMIT_MB (MemoryError se excedido).
+    Devolve o modelo, o grafo de validação, o resultado de `consume_knowledge`,
+    o número de triplos de conhecimento, o pico de memória (MB) e os tempos.
+    """
+    limit_mb = current_app.config['CONVERSION_MEMORY_LIMIT_MB']
+    timings = {}
+
+    start = time.perf_counter()
+    model = ifcopenshell.open(ifc_file_path)
+    timings['parse'] = time.perf_counter() - start
+    _check_memory(limit_mb)
+
+    validation = None
+    if validation_graph:
+        validation = Graph()
+        validation.bind("ifc", IFC_NS)
+        validation.bind("prop", PROP_NS)
+    knowledge_count = 0
+
+    def knowledge_triples():
+        nonlocal knowledge_count
+        for position, (target, triple) in enumerate(_iter_ingestion_triples(model, ifc_file_path, validation_graph)):
+            if position % 10000 == 0:
+                _check_memory(limit_mb)
+            if target == VALIDATION:
+                validation.add(triple)
+                continue
+            knowledge_count += 1
+            yield triple
+
+    start = time.perf_counter()
+    consumed = consume_knowledge(knowledge_triples())
+    timings['walk'] = time.perf_counter() - start
+    peak = peak_memory_mb()
+
+    metrics.record_stage("parse", timings['parse'])
+    metrics.record_stage("convert", timings['walk'])
+    metrics.inc(metrics.TRIPLES_PRODUCED, len(validation) if validation is not None else 0, graph="validation")
+    metrics.inc(metrics.TRIPLES_PRODUCED, knowledge_count, graph="knowledge")
+
+    current_app.logger.info(
+        f"Ingestão IFC em streaming concluída: {len(validation) if validation is not None else 0} triplos de validação, "
+        f"{knowledge_count} triplos de conhecimento (parse {timings['parse']:.2f}s, travessia {timings['walk']:.2f}s, "
+        f"pico de memória {f'{peak:.0f} MB' if peak is not None else 'n/d'}).")
+
+    return {
+        "model": model,
+        "validation_graph": validation,
+        "knowledge": consumed,
+        "knowledge_triples": knowledge_count,
+        "peak_memory_mb": peak,
+        "timings": timings,
+    }
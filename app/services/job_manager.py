@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+# Estados possíveis de uma tarefa
+QUEUED = "em_fila"
+RUNNING = "em_execucao"
+DONE = "concluido"
+FAILED = "erro"
+
+# Uma tarefa por terminar cujo registo não é renovado durante este número de
+# intervalos de JOB_HEARTBEAT_INTERVAL pertencia a um processo que terminou
+_STALE_HEARTBEATS = 3
+
+_jobs = {}
+_lock = threading.Lock()
+_executor = None
+_heartbeat = None
+
+def _get_executor(app):
+    global _executor, _heartbeat
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix="bim-job")
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(
+                target=_renew_records, name="bim-job-heartbeat", daemon=True,
+                args=(app.config['JOB_STATE_FOLDER'], app.config['JOB_HEARTBEAT_INTERVAL']))
+            _heartbeat.start()
+        return _executor
+
+def reset():
+    """
+    Esquece o pool de workers e a thread de heartbeat herdados do processo
+    mestre (as threads não sobrevivem ao fork); são criados de novo na primeira
+    tarefa do worker.
+    """
+    global _executor, _heartbeat
+    with _lock:
+        _executor = None
+        _heartbeat = None
+
+def _renew_records(folder, interval):
+    """
+    Heartbeat: renova a data dos registos em disco das tarefas por terminar
+    deste processo. Se o processo morrer, os registos deixam de ser renovados e
+    os outros processos passam a tratá-los como falhados (ver `_expire`).
+    """
+    while True:
+        time.sleep(interval)
+        with _lock:
+            pending = [job_id for job_id, job in _jobs.items() if job['status'] in (QUEUED, RUNNING)]
+        for job_id in pending:
+            try:
+                os.utime(_path(folder, job_id))
+            except OSError:
+                continue
+
+def _is_stale(job, mtime, interval):
+    return job.get('status') in (QUEUED, RUNNING) and time.time() - mtime > _STALE_HEARTBEATS * interval
+
+def _expire(folder, job):
+    """Marca como falhada uma tarefa cujo processo terminou sem a concluir."""
+    job.update(status=FAILED, error="O processo que executava a tarefa terminou.", finished_at=time.time())
+    _save(folder, job)
+    return job
+
+def _path(folder, job_id):
+    return os.path.join(folder, f"{job_id}.json")
+
+def _save(folder, job):
+    """
+    Guarda o registo da tarefa em JOB_STATE_FOLDER, para que o estado e o
+    resultado possam ser consultados a partir de qualquer processo do servidor.
+    """
+    path = _path(folder, job["id"])
+    try:
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o estado da tarefa {job['id']}: {e}")
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f), os.fstat(f.fileno()).st_mtime
+
+def _load(job_id):
+    """
+    Registo de uma tarefa submetida noutro processo, ou None. Uma tarefa por
+    terminar sem heartbeat recente é devolvida (e guardada) como falhada.
+    """
+    config = current_app.config
+    folder = config['JOB_STATE_FOLDER']
+    try:
+        uuid.UUID(job_id)
+        job, mtime = _read(_path(folder, job_id))
+    except (ValueError, OSError):
+        return None
+    if _is_stale(job, mtime, config['JOB_HEARTBEAT_INTERVAL']):
+        return _expire(folder, job)
+    return job
+
+def _update(job_id, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        snapshot = dict(job)
+    _save(current_app.config['JOB_STATE_FOLDER'], snapshot)
+
+def _prune_finished(ttl):
+    """Descarta tarefas terminadas há mais de `ttl` segundos (chamar com o lock)."""
+    now = time.time()
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['finished_at'] and now - job['finished_at'] > ttl]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def _prune_saved(folder, ttl, interval):
+    """
+    Apaga os registos em disco (de todos os processos) de tarefas terminadas
+    há mais de `ttl` segundos, e marca como falhadas as que ficaram por
+    terminar sem heartbeat (são apagadas quando o seu `ttl` expirar).
+    """
+    now = time.time()
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            if now - os.path.getmtime(path) <= min(ttl, _STALE_HEARTBEATS * interval):
+                continue
+            job, mtime = _read(path)
+            if _is_stale(job, mtime, interval):
+                _expire(folder, job)
+            elif job.get('finished_at') and now - mtime > ttl:
+                os.remove(path)
+        except (OSError, ValueError):
+            continue
+
+def _run(app, job_id, func, args):
+    with app.app_context():
+        _update(job_id, status=RUNNING, started_at=time.time())
+        report_progress = lambda stage, percent: _update(job_id, stage=stage, progress=percent)
+        try:
+            result = func(*args, report_progress=report_progress)
+            _update(job_id, status=DONE, stage="concluido", progress=100, result=result, finished_at=time.time())
+        except Exception as e:
+            app.logger.error(f"ERRO na tarefa {job_id}: {e}", exc_info=True)
+            _update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+
+def submit_job(func, *args):
+    """
+    Coloca `func(*args, report_progress=...)` na fila do pool de workers.
+    Devolve o ID da tarefa, ou None se a fila já estiver cheia.
+    """
+    app = current_app._get_current_object()
+    folder = app.config['JOB_STATE_FOLDER']
+    _prune_saved(folder, app.config['JOB_RESULT_TTL'], app.config['JOB_HEARTBEAT_INTERVAL'])
+    with _lock:
+        _prune_finished(app.config['JOB_RESULT_TTL'])
+        pending = sum(1 for job in _jobs.values() if job['status'] in (QUEUED, RUNNING))
+        if pending >= app.config['JOB_QUEUE_MAX']:
+            return None
+        job_id = str(uuid.uuid4())
+        _jobs[job_id] = {
+            "id": job_id, "status": QUEUED, "stage": "em_fila", "progress": 0,
+            "result": None, "error": None,
+            "created_at": time.time(), "started_at": None, "finished_at": None,
+        }
+        snapshot = dict(_jobs[job_id])
+    _save(folder, snapshot)
+    _get_executor(app).submit(_run, app, job_id, func, args)
+    return job_id
+
+def get_job_status(job_id):
+    """Estado público de uma tarefa (sem o resultado), ou None se não existir."""
+    job = get_job_result(job_id)
+    if job is None:
+        return None
+    return {key: value for key, value in job.items() if key != "result"}
+
+def get_job_result(job_id):
+    """
+    Devolve o registo completo da tarefa (incluindo o resultado), ou None. As
+    tarefas deste processo vêm da memória; as dos outros, do seu registo em disco.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            return dict(job)
+    return _load(job_id)
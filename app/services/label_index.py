@@ -0,0 +1,142 @@
+import bisect
+import difflib
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+from flask import current_app
+from rdflib import RDFS
+
+from . import local_store, sparql_client
+
+# Procura aproximada: entradas das listas de trigramas percorridas por pergunta
+# (das mais raras para as mais comuns) e rótulos candidatos comparados com o difflib
+_FUZZY_MAX_POSTINGS = 20000
+_FUZZY_CANDIDATES = 32
+
+_lock = threading.Lock()
+_index = None
+
+def _normalize(label):
+    """Minúsculas, sem acentos e sem espaços nas pontas, para comparações tolerantes."""
+    decomposed = unicodedata.normalize("NFKD", str(label).strip().casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _build(pairs, graph_uri, version):
+    by_label = {}
+    by_uri = {}
+    for uri, label in pairs:
+        by_label.setdefault(_normalize(label), []).append((uri, label))
+        by_uri.setdefault(uri, label)
+    sorted_labels = sorted(by_label)
+    # Lista de posições (em sorted_labels) dos rótulos que contêm cada trigrama
+    trigrams = {}
+    for position, label in enumerate(sorted_labels):
+        for trigram in _trigrams(label):
+            trigrams.setdefault(trigram, array('I')).append(position)
+    return {
+        "graph": graph_uri,
+        "version": version,
+        "by_label": by_label,
+        "by_uri": by_uri,
+        "sorted_labels": sorted_labels,
+        "trigrams": trigrams,
+    }
+
+def build_from_graph(graph, graph_uri):
+    """Constrói o índice rótulo→URI a partir do grafo produzido na ingestão."""
+    pairs = ((str(s), str(o)) for s, o in graph.subject_objects(RDFS.label))
+    return _build(pairs, str(graph_uri), sparql_client.get_active_graph_version())
+
+def set_index(index):
+    global _index
+    with _lock:
+        _index = index
+    current_app.logger.info(f"Índice de rótulos atualizado: {len(index['by_uri'])} nós.")
+
+def reset():
+    """Descarta o índice; é reconstruído no próximo uso (ex: modelo carregado sem grafo em memória)."""
+    global _index
+    with _lock:
+        _index = None
+
+def _get_index():
+    """
+    Índice do modelo ativo. Se ainda não existir neste processo (por exemplo
+    após um reinício) ou se o modelo foi carregado de novo noutro processo (a
+    data do ficheiro do grafo ativo mudou), é reconstruído com uma única
+    leitura dos rótulos no Fuseki (ou no motor local).
+    """
+    version = sparql_client.get_active_graph_version()
+    active_graph = sparql_client.get_active_graph() or ""
+    with _lock:
+        if _index is not None and _index["graph"] == active_graph and _index["version"] == version:
+            return _index
+    if local_store.is_enabled():
+        pairs = local_store.label_pairs()
+    else:
+        bindings = sparql_client.query(
+            f"PREFIX rdfs: <{RDFS}> SELECT ?s ?label WHERE {{ ?s rdfs:label ?label . FILTER(isURI(?s)) }}",
+            label="indice_rotulos", use_cache=False)
+        pairs = ((b['s']['value'], b['label']['value']) for b in bindings)
+    index = _build(pairs, active_graph, version)
+    set_index(index)
+    return index
+
+def _fuzzy_candidates(index, key):
+    """
+    Rótulos com mais trigramas em comum com `key`. Só estes são comparados
+    com o difflib, em vez de todos os rótulos do modelo; as listas de
+    trigramas muito comuns são ignoradas depois de esgotado o orçamento.
+    """
+    trigrams = index["trigrams"]
+    postings = sorted((trigrams[t] for t in _trigrams(key) if t in trigrams), key=len)
+    counts = Counter()
+    budget = _FUZZY_MAX_POSTINGS
+    for positions in postings:
+        if budget <= 0:
+            break
+        counts.update(positions)
+        budget -= len(positions)
+    sorted_labels = index["sorted_labels"]
+    return [sorted_labels[position] for position, _ in counts.most_common(_FUZZY_CANDIDATES)]
+
+def lookup(name):
+    """
+    Procura o nó com o rótulo `name`: primeiro por igualdade (sem distinguir
+    maiúsculas nem acentos), depois pelo rótulo mais curto que comece por `name`
+    e por fim por semelhança aproximada entre os rótulos com mais trigramas em
+    comum. Devolve (uri, rótulo) ou None.
+    """
+    index = _get_index()
+    key = _normalize(name)
+    if not key:
+        return None
+
+    matches = index["by_label"].get(key)
+    if matches:
+        return matches[0]
+
+    sorted_labels = index["sorted_labels"]
+    position = bisect.bisect_left(sorted_labels, key)
+    prefixed = []
+    while position < len(sorted_labels) and sorted_labels[position].startswith(key):
+        prefixed.append(sorted_labels[position])
+        position += 1
+    if prefixed:
+        return index["by_label"][min(prefixed, key=len)][0]
+
+    close = difflib.get_close_matches(key, _fuzzy_candidates(index, key), n=1,
+                                      cutoff=current_app.config['LABEL_FUZZY_CUTOFF'])
+    if close:
+        return index["by_label"][close[0]][0]
+    return None
+
+def label_for(uri):
+    """Rótulo conhecido de um URI, ou None."""
+    return _get_index()["by_uri"].get(uri)
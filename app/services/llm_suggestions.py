@@ -0,0 +1,125 @@
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+FALLBACK_SUGGESTION = "Não foi possível obter uma sugestão da IA."
+
+_session = None
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+def _get_session(pool_size):
+    """Sessão HTTP partilhada (keep-alive) para as chamadas ao Ollama."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def reset_session():
+    """Fecha as ligações da sessão (em cada worker, depois do fork)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def build_prompt(conflict_description):
+    return f"Você é um especialista em BIM. Forneça uma sugestão de correção clara e concisa (menos de 2 linhas) para o seguinte conflito: {conflict_description}"
+
+def _cache_key(prompt, model):
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+def _open_cache(cache_path):
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS suggestions (key TEXT PRIMARY KEY, model TEXT, suggestion TEXT)")
+    return conn
+
+def _read_cache(cache_path, keys):
+    with _cache_lock:
+        conn = _open_cache(cache_path)
+        try:
+            placeholders = ",".join("?" * len(keys))
+            rows = conn.execute(f"SELECT key, suggestion FROM suggestions WHERE key IN ({placeholders})", keys).fetchall()
+            return dict(rows)
+        finally:
+            conn.close()
+
+def _write_cache(cache_path, model, entries):
+    with _cache_lock:
+        conn = _open_cache(cache_path)
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO suggestions (key, model, suggestion) VALUES (?, ?, ?)",
+                                 [(key, model, suggestion) for key, suggestion in entries.items()])
+        finally:
+            conn.close()
+
+def _request_suggestion(session, api_url, model, prompt, timeout):
+    """
+    Pede uma sugestão ao LLM. Lança RequestException se o pedido falhar e
+    ValueError se a resposta não tiver o formato da API de chat do Ollama.
+    """
+    payload = {"model": model, "messages": [{"role": "user", "content": prompt}], "stream": False}
+    response = session.post(api_url, json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    message = data.get("message") if isinstance(data, dict) else None
+    content = message.get("content") if isinstance(message, dict) else None
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError(f"Resposta inesperada do LLM: {str(data)[:200]}")
+    return content.strip()
+
+def get_suggestions(conflicts):
+    """
+    Obtém sugestões de correção para uma lista de conflitos (pares (forma, mensagem)).
+    Os conflitos repetidos são agrupados, as respostas são procuradas primeiro na
+    cache em disco e as restantes são pedidas ao Ollama em paralelo.
+    Devolve um dicionário {(forma, mensagem): sugestão}.
+    """
+    config = current_app.config
+    model = config['OLLAMA_MODEL']
+    cache_path = config['LLM_CACHE_PATH']
+
+    prompts = {conflict: build_prompt(conflict[1]) for conflict in set(conflicts)}
+    keys = {prompt: _cache_key(prompt, model) for prompt in set(prompts.values())}
+    if not keys:
+        return {}
+
+    cached = _read_cache(cache_path, list(keys.values()))
+    suggestions = {prompt: cached[key] for prompt, key in keys.items() if key in cached}
+    missing = [prompt for prompt in keys if prompt not in suggestions]
+    metrics.cache_access("llm", True, len(suggestions))
+    metrics.cache_access("llm", False, len(missing))
+    current_app.logger.info(
+        f"Sugestões LLM: {len(conflicts)} conflitos, {len(keys)} pedidos distintos, "
+        f"{len(suggestions)} em cache, {len(missing)} a pedir.")
+
+    if missing:
+        concurrency = config['LLM_MAX_CONCURRENCY']
+        session = _get_session(concurrency)
+        fetch = lambda prompt: _request_suggestion(session, config['OLLAMA_API_URL'], model, prompt, config['LLM_TIMEOUT'])
+        fetched = {}
+        with metrics.span("llm"), ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {prompt: executor.submit(fetch, prompt) for prompt in missing}
+            for prompt, future in futures.items():
+                try:
+                    fetched[prompt] = future.result()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # As falhas não são guardadas em cache: o pedido é repetido na próxima validação
+                    current_app.logger.error(f"Erro ao comunicar com o LLM: {e}")
+        if fetched:
+            _write_cache(cache_path, model, {keys[prompt]: suggestion for prompt, suggestion in fetched.items()})
+        suggestions.update(fetched)
+
+    return {conflict: suggestions.get(prompt, FALLBACK_SUGGESTION) for conflict, prompt in prompts.items()}
@@ -0,0 +1,120 @@
+"""
+Motor de consultas em processo, alternativo ao Fuseki (QUERY_BACKEND = 'local').
+O grafo do modelo ativo fica num Graph do rdflib (armazenamento Memory, com os
+índices SPO, POS e OSP), carregado na ingestão ou a partir do ficheiro compacto
+de `graph_store`. As consultas mais frequentes (vizinhança de um nó e rótulos) são
+respondidas diretamente pelos índices; as restantes são avaliadas pelo motor
+SPARQL do rdflib.
+"""
+import json
+import os
+import threading
+
+from flask import current_app
+from rdflib import RDF, RDFS, BNode, Graph, URIRef
+
+from . import graph_store
+
+_lock = threading.Lock()
+_graph = None
+_graph_uri = None
+
+def is_enabled():
+    return current_app.config['QUERY_BACKEND'] == 'local'
+
+def _active_path():
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], "active_local.json")
+
+def load(graph, graph_uri, store_path=None):
+    """
+    Torna `graph` (um Graph ou um grafo compacto de `graph_store`) o modelo
+    ativo. Se `store_path` for dado, o modelo volta a ser carregado a partir
+    desse ficheiro após um reinício.
+    """
+    global _graph, _graph_uri
+    if not isinstance(graph, Graph):
+        materialized = Graph()
+        materialized.addN((s, p, o, materialized) for s, p, o in graph)
+        graph = materialized
+    with _lock:
+        _graph, _graph_uri = graph, str(graph_uri)
+    if store_path:
+        path = _active_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"graph": str(graph_uri), "path": store_path}, f)
+    current_app.logger.info(f"Modelo <{graph_uri}> carregado no motor local: {len(graph)} triplos.")
+
+def get_graph():
+    """Grafo do modelo ativo; após um reinício é lido do ficheiro compacto guardado."""
+    with _lock:
+        if _graph is not None:
+            return _graph
+    path = _active_path()
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        active = json.load(f)
+    if not os.path.exists(active["path"]):
+        return None
+    with graph_store.open_graph(active["path"]) as compact:
+        load(compact, active["graph"])
+    return _graph
+
+def get_graph_uri():
+    return _graph_uri if get_graph() is not None else None
+
+def _binding(term):
+    """Termo RDF no formato JSON de resultados SPARQL."""
+    if isinstance(term, URIRef):
+        return {'type': 'uri', 'value': str(term)}
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    binding = {'type': 'literal', 'value': str(term)}
+    if term.language:
+        binding['xml:lang'] = term.language
+    elif term.datatype:
+        binding['datatype'] = str(term.datatype)
+    return binding
+
+def query(sparql_query):
+    """Executa uma consulta SELECT com o motor SPARQL do rdflib e devolve os bindings."""
+    graph = get_graph()
+    if graph is None:
+        return []
+    result = graph.query(sparql_query)
+    return [
+        {str(var): _binding(row[var]) for var in result.vars if row[var] is not None}
+        for row in result
+    ]
+
+def neighbourhood(node_uri):
+    """
+    Triplos em que `node_uri` é sujeito ou objeto, com o rótulo e a classe de
+    cada extremo, no mesmo formato da consulta "vizinhanca" de `chatbot_logic`.
+    """
+    graph = get_graph()
+    if graph is None:
+        return []
+    node = URIRef(node_uri)
+    rows = []
+    for s, p, o in (*graph.triples((node, None, None)), *graph.triples((None, None, node))):
+        if s == o:
+            continue
+        row = {'s': _binding(s), 'p': _binding(p), 'o': _binding(o)}
+        for side, term in (('s', s), ('o', o)):
+            label = graph.value(term, RDFS.label)
+            if label is not None:
+                row[f'{side}_label'] = _binding(label)
+            term_type = graph.value(term, RDF.type)
+            if term_type is not None:
+                row[f'{side}_type'] = _binding(term_type)
+        rows.append(row)
+    return rows
+
+def label_pairs():
+    """Pares (URI, rótulo) de todos os nós com rótulo."""
+    graph = get_graph()
+    if graph is None:
+        return []
+    return [(str(s), str(o)) for s, o in graph.subject_objects(RDFS.label) if isinstance(s, URIRef)]
@@ -0,0 +1,205 @@
+"""
+Instrumentação da aplicação: histogramas de latência por rota e por etapa do
+pipeline (parse, SHACL, LLM, conversão, serialização, carregamento, SPARQL),
+contadores (triplos produzidos, violações, acessos às caches) e um profiler
+por amostragem que pode ser ativado pedido a pedido. As métricas são mantidas
+em memória por processo e expostas em /metrics no formato de texto do Prometheus.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+
+# Limites (s) dos histogramas de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_DURATION = "bim_http_request_duration_seconds"
+STAGE_DURATION = "bim_stage_duration_seconds"
+TRIPLES_PRODUCED = "bim_triples_produced_total"
+VIOLATIONS = "bim_violations_total"
+CACHE_REQUESTS = "bim_cache_requests_total"
+
+_DEFINITIONS = {
+    REQUEST_DURATION: ("histogram", "Latência dos pedidos HTTP por rota, método e estado."),
+    STAGE_DURATION: ("histogram", "Duração de cada etapa do pipeline."),
+    TRIPLES_PRODUCED: ("counter", "Triplos RDF produzidos na conversão IFC, por grafo."),
+    VIOLATIONS: ("counter", "Violações encontradas na validação, por motor."),
+    CACHE_REQUESTS: ("counter", "Acessos às caches, por cache e resultado (hit/miss)."),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_profiles = collections.OrderedDict()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    """Regista `value` (segundos) no histograma `name` com as etiquetas dadas."""
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                entry["buckets"][i] += 1
+        entry["sum"] += value
+        entry["count"] += 1
+
+def inc(name, amount=1, **labels):
+    """Incrementa o contador `name` com as etiquetas dadas."""
+    if not amount:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def record_stage(stage, seconds):
+    """
+    Regista a duração de uma etapa já medida. Dentro de um pedido, a etapa é
+    também acumulada para o cabeçalho Server-Timing da resposta.
+    """
+    observe(STAGE_DURATION, seconds, stage=stage)
+    if has_request_context():
+        spans = g.setdefault("metrics_spans", {})
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+@contextmanager
+def span(stage):
+    """Mede a duração do bloco como a etapa `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def cache_access(cache, hit, amount=1):
+    inc(CACHE_REQUESTS, amount, cache=cache, result="hit" if hit else "miss")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    """Todas as métricas no formato de texto do Prometheus (versão 0.0.4)."""
+    with _lock:
+        histograms = {key: dict(entry, buckets=list(entry["buckets"])) for key, entry in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (kind, help_text) in _DEFINITIONS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), entry in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(BUCKETS, entry["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(entry['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+class _Sampler(threading.Thread):
+    """
+    Profiler por amostragem: a cada `interval` segundos lê a pilha da thread
+    do pedido (sys._current_frames) e conta as pilhas no formato "collapsed"
+    (funções separadas por ';'), compatível com o flamegraph.pl e o speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="metrics-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+def _profiling_requested():
+    config = current_app.config
+    if not config['PROFILER_ENABLED']:
+        return False
+    return request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+
+def _store_profile(samples):
+    profile_id = uuid.uuid4().hex
+    with _lock:
+        _profiles[profile_id] = samples
+        while len(_profiles) > current_app.config['PROFILER_KEEP']:
+            _profiles.popitem(last=False)
+    return profile_id
+
+def get_profile(profile_id):
+    """Pilhas amostradas de um pedido no formato "collapsed", ou None se não existir."""
+    with _lock:
+        samples = _profiles.get(profile_id)
+    if samples is None:
+        return None
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+def init_app(app):
+    """Regista a medição da latência de cada pedido e o profiler opcional."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        if _profiling_requested():
+            g.metrics_sampler = _Sampler(threading.get_ident(), current_app.config['PROFILER_INTERVAL'])
+            g.metrics_sampler.start()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        # A etiqueta é a regra da rota (ex: /api/jobs/<job_id>) para não criar uma série por URL
+        route = request.url_rule.rule if request.url_rule is not None else "<sem rota>"
+        observe(REQUEST_DURATION, time.perf_counter() - start,
+                route=route, method=request.method, status=str(response.status_code))
+
+        spans = g.pop("metrics_spans", None)
+        if spans:
+            response.headers["Server-Timing"] = ", ".join(
+                f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans.items())
+
+        sampler = g.pop("metrics_sampler", None)
+        if sampler is not None:
+            profile_id = _store_profile(sampler.stop())
+            response.headers["X-Profile-Id"] = profile_id
+            current_app.logger.info(f"Perfil do pedido {request.method} {route} guardado com o ID {profile_id}.")
+        return response
@@ -0,0 +1,115 @@
+import ifcopenshell
+from rdflib import RDF, RDFS, BNode, Literal
+from rdflib.namespace import SH
+
+from .ifc_ingestion import IFC_NS, PROP_NS
+
+# Predicados aceites em cada tipo de forma; qualquer outro torna a forma não suportada
+_NODE_SHAPE_PREDICATES = {RDF.type, SH.targetClass, SH.property, RDFS.label, RDFS.comment}
+_PROPERTY_SHAPE_PREDICATES = {SH.path, SH['class'], SH.minCount, SH.maxCount, SH.message, RDFS.label, RDFS.comment}
+
+# Caminhos (prop:X) com equivalente direto no modelo IFC, tal como são emitidos
+# para o grafo de validação por `ifc_ingestion`: o atributo inverso do elemento,
+# a classe da relação e o atributo da relação que dá o valor. As regras com
+# outros caminhos são validadas pelo pyshacl.
+_PATHS = {
+    "ContainedInStructure": ("ContainedInStructure", "IfcRelContainedInSpatialStructure", "RelatingStructure"),
+    "FillsVoids": ("FillsVoids", "IfcRelFillsElement", "RelatingOpeningElement"),
+}
+
+def _local_name(uri, namespace):
+    uri = str(uri)
+    return uri[len(str(namespace)):] if uri.startswith(str(namespace)) else None
+
+def _compile_property(shapes_graph, prop):
+    """Converte uma forma de propriedade numa regra, ou None se usar algo não suportado."""
+    if not isinstance(prop, BNode):
+        return None
+    if any(predicate not in _PROPERTY_SHAPE_PREDICATES for predicate in shapes_graph.predicates(prop, None)):
+        return None
+
+    attribute = _local_name(shapes_graph.value(prop, SH.path), PROP_NS)
+    class_uri = shapes_graph.value(prop, SH['class'])
+    value_class = _local_name(class_uri, IFC_NS) if class_uri is not None else None
+    if attribute not in _PATHS or (class_uri is not None and not value_class):
+        return None
+
+    min_count = shapes_graph.value(prop, SH.minCount)
+    max_count = shapes_graph.value(prop, SH.maxCount)
+    message = shapes_graph.value(prop, SH.message)
+    if isinstance(message, Literal) or message is None:
+        return {
+            "attribute": attribute,
+            "class": value_class,
+            "min_count": int(min_count) if min_count is not None else None,
+            "max_count": int(max_count) if max_count is not None else None,
+            "message": str(message) if message is not None else None,
+        }
+    return None
+
+def compile_shapes(shapes_graph):
+    """
+    Compila o subconjunto de SHACL usado pelas regras do projeto (NodeShapes com
+    sh:targetClass e propriedades com sh:path, sh:class, sh:minCount, sh:maxCount
+    e sh:message) em verificações diretas sobre o modelo ifcopenshell.
+    As formas que usam outras construções, ou caminhos sem correspondência em
+    `_PATHS`, ficam de fora e são validadas com pyshacl.
+    """
+    rules = []
+    for shape in sorted(set(shapes_graph.subjects(RDF.type, SH.NodeShape)), key=str):
+        if isinstance(shape, BNode):
+            continue
+        target_classes = [_local_name(target, IFC_NS) for target in shapes_graph.objects(shape, SH.targetClass)]
+        properties = [_compile_property(shapes_graph, prop) for prop in shapes_graph.objects(shape, SH.property)]
+        supported = (
+            target_classes and all(target_classes) and properties and all(properties)
+            and all(predicate in _NODE_SHAPE_PREDICATES for predicate in shapes_graph.predicates(shape, None))
+        )
+        if supported:
+            rules.append({"shape": str(shape), "target_classes": target_classes, "properties": properties})
+
+    return rules
+
+def _values(element, path):
+    """Valores do caminho `path` (um de `_PATHS`) para o elemento: o lado "Relating" das suas relações."""
+    attribute, rel_class, relating = _PATHS[path]
+    values = []
+    for rel in getattr(element, attribute, None) or ():
+        if isinstance(rel, ifcopenshell.entity_instance) and rel.is_a(rel_class):
+            value = getattr(rel, relating, None)
+            if value is not None:
+                values.append(value)
+    return values
+
+def validate(model, rules):
+    """
+    Aplica as regras compiladas ao modelo, usando a herança do esquema IFC
+    (`is_a`) no lugar da inferência RDFS. Devolve (conforma, violações) no mesmo
+    formato de `validation_engine._run_shacl`: [(nó em foco, forma, mensagem)].
+    """
+    violations = []
+    for rule in rules:
+        seen = set()
+        for target_class in rule["target_classes"]:
+            try:
+                elements = model.by_type(target_class)
+            except RuntimeError:
+                # Classe inexistente no esquema IFC deste modelo
+                continue
+            for element in elements:
+                if element.id() in seen or not getattr(element, 'GlobalId', None):
+                    continue
+                seen.add(element.id())
+                focus_node = str(IFC_NS[element.GlobalId])
+                for prop in rule["properties"]:
+                    message = prop["message"] or "Mensagem não definida."
+                    values = _values(element, prop["attribute"])
+                    if prop["class"]:
+                        for value in values:
+                            if not isinstance(value, ifcopenshell.entity_instance) or not value.is_a(prop["class"]):
+                                violations.append((focus_node, rule["shape"], message))
+                    if prop["min_count"] is not None and len(values) < prop["min_count"]:
+                        violations.append((focus_node, rule["shape"], message))
+                    if prop["max_count"] is not None and len(values) > prop["max_count"]:
+                        violations.append((focus_node, rule["shape"], message))
+    return not violations, violations
@@ -0,0 +1,117 @@
+"""
+Resumo da ontologia (classes com número de elementos e exemplos, e inventário
+de relações) calculado uma única vez quando um modelo é carregado e guardado
+junto do grafo compacto do modelo. O endpoint `/ontology-summary` serve-o
+diretamente, sem consultas de agregação sobre o grafo completo.
+"""
+import json
+import os
+import threading
+from urllib.parse import quote
+
+from flask import current_app
+from rdflib import RDF, RDFS
+
+from .ifc_ingestion import BASE_URI
+
+_lock = threading.Lock()
+_summaries = {}
+
+def relation_name(predicate):
+    """Nome apresentado de um predicado (ex: 'contains', 'type')."""
+    name = str(predicate)
+    if name.startswith(BASE_URI):
+        name = name[len(BASE_URI):]
+    else:
+        name = name.replace(str(RDF), "rdf:")
+    return name.replace('rdf:type', 'type')
+
+def compute(triples):
+    """
+    Calcula o resumo numa única passagem pelos triplos (um Graph, um grafo
+    compacto ou qualquer iterável). Os exemplos de cada classe ficam limitados
+    a ONTOLOGY_SUMMARY_MAX_EXAMPLES, por ordem alfabética.
+    """
+    max_examples = current_app.config['ONTOLOGY_SUMMARY_MAX_EXAMPLES']
+    subject_types = {}
+    subject_labels = {}
+    predicates = set()
+    for s, p, o in triples:
+        if p == RDFS.label:
+            # Dicionário como conjunto ordenado: na conversão em streaming há triplos repetidos
+            subject_labels.setdefault(s, {})[str(o)] = None
+            continue
+        predicates.add(p)
+        if p == RDF.type and str(o).startswith(BASE_URI):
+            subject_types.setdefault(s, set()).add(o)
+
+    # Classes agrupadas pelo rótulo, como na consulta GROUP BY ?type_label
+    instances = {}
+    for subject, types in subject_types.items():
+        for type_uri in types:
+            for type_label in subject_labels.get(type_uri, ()):
+                instances.setdefault(type_label, set()).add(subject)
+
+    types = []
+    for type_label in sorted(instances):
+        examples = sorted({label for subject in instances[type_label] for label in subject_labels.get(subject, ())})
+        if examples:
+            types.append({"type": type_label, "count": len(instances[type_label]), "examples": examples[:max_examples]})
+
+    relations = sorted({relation_name(predicate) for predicate in predicates})
+    return {"types": types, "relations": relations}
+
+def _path(model_name):
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{quote(model_name, safe='')}.summary.json")
+
+def _path_for_graph(graph_uri):
+    # O nome do ficheiro é o último segmento do URI do grafo (o nome do modelo já codificado)
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{graph_uri.rsplit('/', 1)[-1]}.summary.json")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def store(model_name, graph_uri, summary):
+    """Guarda o resumo de um modelo em disco e em memória."""
+    path = _path(model_name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o resumo da ontologia: {e}")
+    with _lock:
+        _summaries[str(graph_uri)] = (_mtime(path), summary)
+
+def get(graph_uri):
+    """
+    Resumo guardado do grafo `graph_uri`, ou None se ainda não tiver sido
+    calculado. A cópia em memória é validada pela data do ficheiro, para que
+    todos os processos vejam o resumo do último carregamento.
+    """
+    if not graph_uri:
+        return None
+    path = _path_for_graph(graph_uri)
+    mtime = _mtime(path)
+    with _lock:
+        entry = _summaries.get(graph_uri)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    if mtime is None:
+        return None
+    with open(path, encoding='utf-8') as f:
+        summary = json.load(f)
+    with _lock:
+        _summaries[graph_uri] = (mtime, summary)
+    return summary
+
+def remember(graph_uri, summary):
+    """Guarda em memória um resumo obtido por outra via (ex: consultas ao Fuseki)."""
+    if graph_uri:
+        with _lock:
+            _summaries[graph_uri] = (None, summary)
@@ -0,0 +1,332 @@
+"""
+Mapa de quantidades (quantity takeoff) e análise das propriedades numéricas
+dos elementos. Os valores numéricos do grafo de conhecimento (quantidades de
+IfcElementQuantity e propriedades de IfcPropertySingleValue) são recolhidos
+quando o modelo é carregado e guardados em colunas NumPy junto do grafo
+compacto, com cada elemento codificado pela classe IFC, o contentor espacial
+(normalmente o andar) e o material.
+
+As linhas estão ordenadas por medida; os totais agrupados, os histogramas e
+os N maiores valores são operações vetoriais sobre o intervalo de linhas da
+medida (numpy.bincount, numpy.histogram e numpy.argpartition).
+"""
+import json
+import os
+import struct
+import threading
+from urllib.parse import quote
+
+import numpy
+from flask import current_app
+from rdflib import RDF, RDFS, Literal
+from rdflib.namespace import XSD
+
+from .ifc_ingestion import BASE_URI, inst
+
+MAGIC = b"BIMQTO02"
+_HEADER = struct.Struct("<8sI")
+
+# Dimensões pelas quais os valores podem ser filtrados e agrupados
+DIMENSIONS = ("class", "container", "material")
+
+# Tipos das colunas no ficheiro (little-endian): linhas e, por elemento, o código de cada dimensão (-1 = sem valor)
+_ROW_COLUMNS = (("row_measure", "<i4"), ("row_element", "<u4"), ("row_value", "<f8"))
+_ELEMENT_DTYPE = "<i4"
+
+_NUMERIC_DATATYPES = {XSD.double, XSD.float, XSD.decimal, XSD.integer, XSD.int, XSD.long,
+                      XSD.short, XSD.nonNegativeInteger, XSD.positiveInteger}
+
+# Predicados que dão as dimensões de cada elemento (procurados por hash, sem comparar termo a termo)
+_LABEL, _TYPE, _CONTAINER, _MATERIAL = range(4)
+_DIMENSION_PREDICATES = {RDFS.label: _LABEL, RDF.type: _TYPE, inst.isContainedIn: _CONTAINER, inst.hasMaterial: _MATERIAL}
+
+_lock = threading.Lock()
+_takeoffs = {}
+
+def _local_name(uri):
+    uri = str(uri)
+    return uri[len(BASE_URI):] if uri.startswith(BASE_URI) else None
+
+class Collector:
+    """
+    Recolhe os valores numéricos e as dimensões de cada elemento a partir dos
+    triplos do grafo de conhecimento, numa única passagem. `watch(triplos)`
+    devolve os mesmos triplos, para ser encadeado na conversão em streaming.
+    """
+
+    def __init__(self):
+        self._classes = {}
+        self._labels = {}
+        self._containers = {}
+        self._materials = {}
+        # Dicionário como conjunto ordenado: os triplos repetidos contam uma só vez, como no Graph
+        self._values = {}
+
+    def add(self, triple):
+        s, p, o = triple
+        kind = _DIMENSION_PREDICATES.get(p)
+        if kind == _LABEL:
+            self._labels.setdefault(s, str(o))
+        elif kind == _TYPE:
+            class_name = _local_name(o)
+            if class_name and class_name.startswith("Ifc"):
+                self._classes.setdefault(s, class_name)
+        elif kind == _CONTAINER:
+            self._containers.setdefault(s, o)
+        elif kind == _MATERIAL:
+            self._materials.setdefault(s, o)
+        elif isinstance(o, Literal) and o.datatype in _NUMERIC_DATATYPES:
+            measure = _local_name(p)
+            try:
+                value = float(o.toPython())
+            except (TypeError, ValueError):
+                return
+            if measure:
+                self._values[(s, measure, value)] = None
+
+    def watch(self, triples):
+        for triple in triples:
+            self.add(triple)
+            yield triple
+
+    def build(self):
+        """Constrói o `Takeoff`, com as linhas ordenadas por medida e elemento."""
+        elements = sorted({s for s, _, _ in self._values}, key=str)
+        element_index = {s: i for i, s in enumerate(elements)}
+
+        def label(node):
+            return self._labels.get(node) or _local_name(node) or str(node)
+
+        element_dims = {
+            "class": [self._classes.get(s) for s in elements],
+            "container": [label(self._containers[s]) if s in self._containers else None for s in elements],
+            "material": [label(self._materials[s]) if s in self._materials else None for s in elements],
+        }
+        dictionaries = {dim: sorted({value for value in values if value is not None})
+                        for dim, values in element_dims.items()}
+        codes = {dim: {value: i for i, value in enumerate(dictionaries[dim])} for dim in DIMENSIONS}
+        element_columns = {dim: numpy.fromiter((codes[dim].get(value, -1) for value in element_dims[dim]),
+                                               dtype=numpy.int32, count=len(elements))
+                           for dim in DIMENSIONS}
+
+        measures = sorted({measure for _, measure, _ in self._values})
+        measure_codes = {measure: i for i, measure in enumerate(measures)}
+        count = len(self._values)
+        row_measure = numpy.fromiter((measure_codes[measure] for _, measure, _ in self._values), dtype=numpy.int32, count=count)
+        row_element = numpy.fromiter((element_index[s] for s, _, _ in self._values), dtype=numpy.uint32, count=count)
+        row_value = numpy.fromiter((value for _, _, value in self._values), dtype=numpy.float64, count=count)
+        order = numpy.lexsort((row_element, row_measure))
+
+        meta = {
+            "measures": measures,
+            "dimensions": dictionaries,
+            "elements": [_local_name(s) or str(s) for s in elements],
+            "names": [self._labels.get(s) for s in elements],
+            "rows": count,
+        }
+        return Takeoff(meta, row_measure[order], row_element[order], row_value[order], element_columns)
+
+def compute(triples):
+    """Mapa de quantidades de um Graph, grafo compacto ou qualquer iterável de triplos."""
+    collector = Collector()
+    for triple in triples:
+        collector.add(triple)
+    return collector.build()
+
+class Takeoff:
+    """Colunas de um modelo carregado e as análises sobre elas."""
+
+    def __init__(self, meta, row_measure, row_element, row_value, element_columns):
+        self.meta = meta
+        self.row_measure = row_measure
+        self.row_element = row_element
+        self.row_value = row_value
+        self.element_columns = element_columns
+        self._measure_codes = {measure: i for i, measure in enumerate(meta["measures"])}
+        self._dimension_codes = {dim: {value: i for i, value in enumerate(values)}
+                                 for dim, values in meta["dimensions"].items()}
+        # Início das linhas de cada medida (as linhas estão ordenadas por medida)
+        self._measure_starts = numpy.searchsorted(row_measure, numpy.arange(len(meta["measures"]) + 1))
+
+    def __len__(self):
+        return len(self.row_value)
+
+    def _measure(self, measure):
+        if measure not in self._measure_codes:
+            raise ValueError(f"Medida desconhecida: {measure}")
+        return self._measure_codes[measure]
+
+    def _filters(self, filters):
+        """Converte {dimensão: valor} em {dimensão: código}; um valor desconhecido não corresponde a nada."""
+        coded = {}
+        for dim, value in (filters or {}).items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Dimensão desconhecida: {dim}")
+            if value is not None:
+                coded[dim] = self._dimension_codes[dim].get(value, -2)
+        return coded
+
+    def _dimension_value(self, dim, code):
+        return self.meta["dimensions"][dim][code] if code >= 0 else None
+
+    def _rows(self, measure, filters):
+        """Elementos e valores das linhas de `measure` que respeitam os filtros."""
+        code = self._measure(measure)
+        coded = self._filters(filters)
+        start, end = self._measure_starts[code], self._measure_starts[code + 1]
+        elements = self.row_element[start:end]
+        values = self.row_value[start:end]
+        if coded:
+            mask = numpy.ones(len(elements), dtype=bool)
+            for dim, dim_code in coded.items():
+                mask &= self.element_columns[dim][elements] == dim_code
+            elements, values = elements[mask], values[mask]
+        return elements, values
+
+    @staticmethod
+    def _group_stats(groups, values, size):
+        """Número, soma, mínimo e máximo de `values` por grupo (0 .. size-1)."""
+        counts = numpy.bincount(groups, minlength=size)
+        sums = numpy.bincount(groups, weights=values, minlength=size)
+        lows = numpy.full(size, numpy.inf)
+        highs = numpy.full(size, -numpy.inf)
+        numpy.minimum.at(lows, groups, values)
+        numpy.maximum.at(highs, groups, values)
+        return counts, sums, lows, highs
+
+    def measures(self):
+        """Medidas disponíveis com número de valores, soma, mínimo e máximo."""
+        size = len(self.meta["measures"])
+        counts, sums, lows, highs = self._group_stats(self.row_measure, self.row_value, size)
+        return [{"measure": measure, "count": int(counts[code]), "sum": float(sums[code]),
+                 "min": float(lows[code]), "max": float(highs[code])}
+                for code, measure in enumerate(self.meta["measures"]) if counts[code]]
+
+    def totals(self, measure, group_by=(), filters=None):
+        """Soma, número, mínimo e máximo dos valores de `measure` agrupados pelas dimensões `group_by`."""
+        for dim in group_by:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Dimensão desconhecida: {dim}")
+        elements, values = self._rows(measure, filters)
+        if not len(values):
+            return []
+        # Chave de grupo: códigos das dimensões combinados num único inteiro (código + 1, para o -1)
+        key = numpy.zeros(len(values), dtype=numpy.int64)
+        for dim in group_by:
+            key = key * (len(self.meta["dimensions"][dim]) + 1) + (self.element_columns[dim][elements] + 1)
+        keys, groups = numpy.unique(key, return_inverse=True)
+        counts, sums, lows, highs = self._group_stats(groups.ravel(), values, len(keys))
+
+        rows = []
+        for index, combined in enumerate(keys.tolist()):
+            row = {}
+            for dim in reversed(group_by):
+                combined, code = divmod(combined, len(self.meta["dimensions"][dim]) + 1)
+                row[dim] = self._dimension_value(dim, code - 1)
+            row = {dim: row[dim] for dim in group_by}
+            row.update({"count": int(counts[index]), "sum": float(sums[index]),
+                        "min": float(lows[index]), "max": float(highs[index])})
+            rows.append(row)
+        rows.sort(key=lambda row: -row["sum"])
+        return rows
+
+    def histogram(self, measure, bins=10, filters=None):
+        """Histograma de `measure` com `bins` intervalos iguais entre o mínimo e o máximo."""
+        if bins < 1:
+            raise ValueError("O número de intervalos tem de ser positivo.")
+        _, values = self._rows(measure, filters)
+        if not len(values):
+            return {"measure": measure, "edges": [], "counts": []}
+        counts, edges = numpy.histogram(values, bins=bins)
+        return {"measure": measure, "edges": edges.tolist(), "counts": counts.tolist()}
+
+    def top(self, measure, n=10, filters=None, ascending=False):
+        """Os `n` elementos com os maiores (ou, com `ascending`, os menores) valores de `measure`."""
+        elements, values = self._rows(measure, filters)
+        n = min(n, len(values))
+        if not n:
+            return []
+        keys = values if ascending else -values
+        chosen = numpy.argpartition(keys, n - 1)[:n]
+        chosen = chosen[numpy.argsort(keys[chosen], kind="stable")]
+        result = []
+        for element, value in zip(elements[chosen].tolist(), values[chosen].tolist()):
+            item = {"global_id": self.meta["elements"][element], "name": self.meta["names"][element]}
+            item.update({dim: self._dimension_value(dim, int(self.element_columns[dim][element])) for dim in DIMENSIONS})
+            item["value"] = value
+            result.append(item)
+        return result
+
+def _path(model_name):
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{quote(model_name, safe='')}.takeoff")
+
+def _path_for_graph(graph_uri):
+    # O nome do ficheiro é o último segmento do URI do grafo (o nome do modelo já codificado)
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], f"{graph_uri.rsplit('/', 1)[-1]}.takeoff")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _write(takeoff, path):
+    header = json.dumps(takeoff.meta, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(header)))
+        f.write(header)
+        for name, dtype in _ROW_COLUMNS:
+            f.write(getattr(takeoff, name).astype(dtype).tobytes())
+        for dim in DIMENSIONS:
+            f.write(takeoff.element_columns[dim].astype(_ELEMENT_DTYPE).tobytes())
+    os.replace(tmp_path, path)
+
+def _read(path):
+    with open(path, 'rb') as f:
+        magic, header_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} não é um mapa de quantidades.")
+        meta = json.loads(f.read(header_size).decode("utf-8"))
+
+        def column(dtype, count):
+            dtype = numpy.dtype(dtype)
+            return numpy.frombuffer(f.read(dtype.itemsize * count), dtype=dtype).astype(dtype.newbyteorder("="))
+
+        rows = [column(dtype, meta["rows"]) for _, dtype in _ROW_COLUMNS]
+        element_columns = {dim: column(_ELEMENT_DTYPE, len(meta["elements"])) for dim in DIMENSIONS}
+    return Takeoff(meta, *rows, element_columns)
+
+def store(model_name, graph_uri, takeoff):
+    """Guarda o mapa de quantidades de um modelo em disco e em memória."""
+    path = _path(model_name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(takeoff, path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o mapa de quantidades: {e}")
+    with _lock:
+        _takeoffs[str(graph_uri)] = (_mtime(path), takeoff)
+    current_app.logger.info(
+        f"Mapa de quantidades de '{model_name}': {len(takeoff)} valores, {len(takeoff.meta['measures'])} medidas, "
+        f"{len(takeoff.meta['elements'])} elementos.")
+
+def get(graph_uri):
+    """
+    Mapa de quantidades do grafo `graph_uri`, ou None se não existir. Tal como
+    o resumo da ontologia, a cópia em memória é validada pela data do ficheiro.
+    """
+    if not graph_uri:
+        return None
+    path = _path_for_graph(graph_uri)
+    mtime = _mtime(path)
+    with _lock:
+        entry = _takeoffs.get(graph_uri)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    if mtime is None:
+        return None
+    takeoff = _read(path)
+    with _lock:
+        _takeoffs[graph_uri] = (mtime, takeoff)
+    return takeoff
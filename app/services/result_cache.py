@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from flask import current_app
+
+from . import graph_store, llm_suggestions, metrics
+
+_lock = threading.Lock()
+_LOADED_FILE = "loaded_models.json"
+
+def _entry_dir(content_hash, rules_version):
+    return os.path.join(current_app.config['RESULT_CACHE_FOLDER'], f"{content_hash}-{rules_version}")
+
+def _fill_suggestions(report):
+    """
+    Acrescenta as sugestões do LLM aos conflitos de um relatório guardado. Vêm
+    da cache do LLM; as que tinham falhado são pedidas de novo.
+    """
+    conflicts = [(None, item["message"]) for item in report if item.get("type") == "CONFLITO"]
+    suggestions = llm_suggestions.get_suggestions(conflicts) if conflicts else {}
+    for item in report:
+        if item.get("type") == "CONFLITO":
+            item["suggestion_llm"] = suggestions[(None, item["message"])]
+    return report
+
+def load(content_hash, rules_version):
+    """Relatório guardado para este ficheiro e versão das regras, ou None."""
+    entry_dir = _entry_dir(content_hash, rules_version)
+    report_path = os.path.join(entry_dir, "report.json")
+    if not os.path.exists(report_path):
+        metrics.cache_access("result", False)
+        return None
+    metrics.cache_access("result", True)
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    # A data da entrada marca o último uso, para a remoção das menos usadas
+    try:
+        os.utime(entry_dir)
+    except OSError:
+        pass
+    return _fill_suggestions(report)
+
+def load_graph(content_hash, rules_version):
+    """
+    Grafo de conhecimento guardado para este ficheiro (evita voltar a ler o IFC),
+    aberto por memory-mapping. Deve ser fechado depois de usado.
+    """
+    return graph_store.open_graph(os.path.join(_entry_dir(content_hash, rules_version), "graph.bkg"))
+
+def store(content_hash, rules_version, results, graph):
+    """
+    Guarda o relatório e o grafo gerados. A entrada só fica visível quando está
+    completa. O relatório é guardado sem as sugestões do LLM (ver
+    `_fill_suggestions`), para que uma sugestão que falhou não fique em cache.
+    """
+    entry_dir = _entry_dir(content_hash, rules_version)
+    if os.path.exists(entry_dir):
+        return
+    report = [{key: value for key, value in item.items() if key != "suggestion_llm"} for item in results]
+    tmp_dir = f"{entry_dir}.tmp-{uuid.uuid4()}"
+    os.makedirs(tmp_dir)
+    try:
+        with metrics.span("serialize"):
+            graph_store.write_graph(graph, os.path.join(tmp_dir, "graph.bkg"))
+        with open(os.path.join(tmp_dir, "report.json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_dir, entry_dir)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o resultado em cache: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    _evict(current_app.config['RESULT_CACHE_MAX_MB'], keep=entry_dir)
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+def _evict(max_mb, keep):
+    """Remove as entradas usadas há mais tempo até a cache ocupar no máximo `max_mb` MB (0 = sem limite)."""
+    if not max_mb:
+        return
+    folder = current_app.config['RESULT_CACHE_FOLDER']
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name == _LOADED_FILE or ".tmp-" in name or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), path, _dir_size(path)))
+        except OSError:
+            continue
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        current_app.logger.info(f"Entrada removida da cache de resultados: {os.path.basename(path)}")
+
+def _loaded_path():
+    return os.path.join(current_app.config['RESULT_CACHE_FOLDER'], _LOADED_FILE)
+
+def _read_loaded():
+    path = _loaded_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def get_loaded_hash(model_name):
+    """Hash do conteúdo atualmente carregado no Fuseki para este modelo, ou None."""
+    with _lock:
+        return _read_loaded().get(model_name)
+
+def set_loaded_hash(model_name, content_hash):
+    with _lock:
+        loaded = _read_loaded()
+        loaded[model_name] = content_hash
+        path = _loaded_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Nome único: outros workers e tarefas podem estar a escrever o mesmo ficheiro
+        tmp_path = f"{path}.tmp-{uuid.uuid4()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(loaded, f)
+        os.replace(tmp_path, path)
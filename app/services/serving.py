@@ -0,0 +1,83 @@
+"""
+Modo de produção (gunicorn com preload_app): o processo mestre importa a
+aplicação e carrega uma única vez o modelo de NLU, as regras SHACL
+pré-processadas e os clientes HTTP; os workers são criados por fork e partilham
+essa memória em copy-on-write. Inclui as verificações de vida (/health) e de
+prontidão (/ready) usadas pelo orquestrador ou pelo balanceador de carga.
+"""
+import gc
+import os
+import time
+
+import requests
+from flask import current_app
+
+from . import chatbot_logic, job_manager, llm_suggestions, local_store, sparql_client, validation_engine
+
+_started_at = time.time()
+
+def preload(app):
+    """
+    Carrega no processo mestre tudo o que os workers usariam no primeiro
+    pedido. No fim, os objetos já criados são congelados (gc.freeze) para que a
+    recolha de lixo nos workers não lhes toque, o que copiaria as suas páginas
+    de memória em cada processo.
+    """
+    start = time.perf_counter()
+    with app.app_context():
+        validation_engine.get_shapes()
+        chatbot_logic.warm_up_nlp()
+        if not local_store.is_enabled():
+            sparql_client.get_session()
+    gc.collect()
+    gc.freeze()
+    app.logger.info(f"Aplicação pré-carregada no processo mestre em {time.perf_counter() - start:.2f}s.")
+
+def after_fork(app):
+    """
+    Reinicia, num worker acabado de criar, o estado que não pode ser herdado do
+    mestre: ligações HTTP abertas, o pool de threads das tarefas e o pool de
+    processos da validação SHACL.
+    """
+    global _started_at
+    _started_at = time.time()
+    sparql_client.reset_session()
+    llm_suggestions.reset_session()
+    job_manager.reset()
+    validation_engine.reset_pool()
+    app.logger.info(f"Worker {os.getpid()} pronto.")
+
+def health():
+    """Estado de vida do processo: responde sempre, sem verificar dependências."""
+    return {"status": "ok", "pid": os.getpid(), "uptime_s": round(time.time() - _started_at, 1)}
+
+def readiness():
+    """
+    Prontidão para receber pedidos: regras SHACL carregadas, modelo de NLU
+    disponível (se já foi carregado) e Fuseki acessível (com QUERY_BACKEND =
+    'fuseki'). Devolve (pronto, {verificação: resultado}).
+    """
+    checks = {}
+    try:
+        validation_engine.get_shapes()
+        checks["shapes"] = "ok"
+    except Exception as e:
+        checks["shapes"] = f"erro: {e}"
+
+    # None: ainda não carregado (NLU_WARMUP=0 sem pré-carregamento); False: modelo em falta
+    if chatbot_logic.nlp is None:
+        checks["nlu"] = "não carregado"
+    else:
+        checks["nlu"] = "ok" if chatbot_logic.nlp else "erro: modelo de NLU não encontrado"
+
+    if local_store.is_enabled():
+        checks["query_backend"] = "local"
+    else:
+        try:
+            sparql_client.ping(current_app.config['READINESS_TIMEOUT'])
+            checks["fuseki"] = "ok"
+        except requests.exceptions.RequestException as e:
+            checks["fuseki"] = f"erro: {e}"
+
+    ready = not any(str(result).startswith("erro") for result in checks.values())
+    return ready, checks
@@ -0,0 +1,256 @@
+import codecs
+import csv
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from . import local_store, metrics
+from .ifc_ingestion import inst, BASE_URI
+
+# Grafo nomeado onde se regista qual o modelo ativo
+META_GRAPH = f"{BASE_URI}meta"
+
+_session = None
+_lock = threading.Lock()
+_cache = OrderedDict()
+# (data do ficheiro do grafo ativo, URI) lidos por este processo
+_active_graph = None
+_stats = defaultdict(lambda: {"count": 0, "cache_hits": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+def get_session():
+    """Sessão HTTP partilhada (keep-alive) com o Fuseki, para consultas, GSP e SPARQL Update."""
+    global _session
+    with _lock:
+        if _session is None:
+            pool_size = current_app.config['SPARQL_POOL_SIZE']
+            _session = requests.Session()
+            _session.auth = (current_app.config['FUSEKI_USER'], current_app.config['FUSEKI_PASSWORD'])
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def reset_session():
+    """
+    Fecha as ligações da sessão. Chamado em cada worker depois do fork, para
+    que não partilhe com o processo mestre os sockets abertos antes do fork.
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def _post_query(query, default_graph=None):
+    data = {'query': query}
+    if default_graph:
+        data['default-graph-uri'] = default_graph
+    response = get_session().post(
+        current_app.config['FUSEKI_QUERY_ENDPOINT'], data=data,
+        headers={'Accept': 'application/sparql-results+json'}
+    )
+    response.raise_for_status()
+    return response.json().get("results", {}).get("bindings", [])
+
+def ping(timeout):
+    """Verifica se o Fuseki responde a uma consulta trivial; lança RequestException se não."""
+    response = get_session().post(
+        current_app.config['FUSEKI_QUERY_ENDPOINT'], data={'query': 'ASK {}'},
+        headers={'Accept': 'application/sparql-results+json'}, timeout=timeout
+    )
+    response.raise_for_status()
+
+def count_graph_triples(graph_uri):
+    """Número de triplos do grafo nomeado `graph_uri` no Fuseki (0 se o grafo não existir)."""
+    bindings = _post_query(f"SELECT (COUNT(*) AS ?n) WHERE {{ GRAPH <{graph_uri}> {{ ?s ?p ?o }} }}")
+    return int(bindings[0]["n"]["value"]) if bindings else 0
+
+def _active_graph_path():
+    return os.path.join(current_app.config['MODEL_STORE_FOLDER'], "active_graph")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def get_active_graph():
+    """
+    URI do grafo do modelo ativo, ou None se os dados estiverem no grafo por
+    omissão. O modelo ativo fica também num ficheiro em MODEL_STORE_FOLDER, para
+    que todos os processos do servidor vejam o mesmo modelo: quando a data do
+    ficheiro muda, o URI é relido e a cache de resultados deste processo é
+    descartada. Sem o ficheiro, o URI é lido do Fuseki apenas na primeira chamada.
+    """
+    global _active_graph
+    if local_store.is_enabled():
+        return local_store.get_graph_uri()
+    path = _active_graph_path()
+    mtime = _mtime(path)
+    with _lock:
+        entry = _active_graph
+    if entry is not None and entry[0] == mtime:
+        return entry[1] or None
+
+    if mtime is not None:
+        with open(path, encoding='utf-8') as f:
+            graph_uri = f.read().strip()
+    else:
+        try:
+            bindings = _post_query(
+                f"SELECT ?g WHERE {{ GRAPH <{META_GRAPH}> {{ <{META_GRAPH}> <{inst.activeGraph}> ?g }} }} LIMIT 1")
+        except requests.exceptions.RequestException as e:
+            current_app.logger.warning(f"Não foi possível obter o grafo ativo do Fuseki: {e}")
+            return None
+        graph_uri = bindings[0]['g']['value'] if bindings else ""
+    with _lock:
+        if entry is not None:
+            _cache.clear()
+        _active_graph = (mtime, graph_uri)
+    return graph_uri or None
+
+def get_active_graph_version():
+    """
+    Data do ficheiro do grafo ativo, que muda sempre que um modelo é carregado
+    (em qualquer processo), ou None. Permite às caches de cada processo
+    detetar um novo carregamento do mesmo grafo.
+    """
+    if local_store.is_enabled():
+        return None
+    return _mtime(_active_graph_path())
+
+def set_active_graph(graph_uri):
+    """Regista o novo modelo ativo (para todos os processos) e invalida a cache de resultados."""
+    global _active_graph
+    path = _active_graph_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(graph_uri))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        current_app.logger.warning(f"Não foi possível guardar o grafo ativo: {e}")
+    with _lock:
+        _active_graph = (_mtime(path), str(graph_uri))
+        _cache.clear()
+
+def invalidate_cache():
+    with _lock:
+        _cache.clear()
+
+def query(sparql_query, label="consulta", use_cache=True):
+    """
+    Executa uma consulta SELECT sobre o modelo ativo e devolve a lista de
+    bindings (no mesmo formato JSON do SPARQLWrapper). Os resultados ficam numa
+    cache LRU com TTL até ao próximo carregamento de dados. `label` agrupa as
+    métricas de latência por tipo de consulta. Com QUERY_BACKEND = 'local', a
+    consulta é avaliada em processo por `local_store`, sem cache.
+    """
+    config = current_app.config
+    local = local_store.is_enabled()
+    use_cache = use_cache and not local
+    active_graph = get_active_graph()
+    key = (active_graph, sparql_query)
+    now = time.monotonic()
+
+    if use_cache:
+        with _lock:
+            entry = _cache.get(key)
+            if entry and now - entry[0] < config['SPARQL_CACHE_TTL']:
+                _cache.move_to_end(key)
+                _stats[label]["cache_hits"] += 1
+                metrics.cache_access("sparql", True)
+                return entry[1]
+        metrics.cache_access("sparql", False)
+
+    start = time.perf_counter()
+    bindings = local_store.query(sparql_query) if local else _post_query(sparql_query, active_graph)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.record_stage("sparql", elapsed_ms / 1000)
+
+    with _lock:
+        stats = _stats[label]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if use_cache:
+            _cache[key] = (now, bindings)
+            _cache.move_to_end(key)
+            while len(_cache) > config['SPARQL_CACHE_SIZE']:
+                _cache.popitem(last=False)
+    current_app.logger.debug(f"SPARQL [{label}] {elapsed_ms:.1f} ms, {len(bindings)} resultados.")
+    return bindings
+
+def _iter_lines(response):
+    """Linhas do corpo da resposta, cada uma com a sua quebra de linha, descodificadas à medida que chegam."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ""
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+def _iter_csv_rows(query, default_graph):
+    """
+    Linhas do resultado no formato CSV do SPARQL, lidas do socket à medida que
+    chegam (sem carregar a resposta inteira). Cada linha é {variável: valor};
+    as variáveis sem valor são omitidas.
+    """
+    data = {'query': query}
+    if default_graph:
+        data['default-graph-uri'] = default_graph
+    with get_session().post(current_app.config['FUSEKI_QUERY_ENDPOINT'], data=data,
+                            headers={'Accept': 'text/csv'}, stream=True) as response:
+        response.raise_for_status()
+        reader = csv.reader(_iter_lines(response))
+        header = next(reader, None)
+        for row in reader:
+            if row:
+                yield {var: value for var, value in zip(header, row) if value != ""}
+
+def iter_query(sparql_query, label="consulta"):
+    """
+    Executa uma consulta SELECT sobre o modelo ativo e devolve as linhas uma a
+    uma, sem cache, para resultados demasiado grandes para a memória (ex: o
+    grafo completo em streaming). Cada linha é {variável: {'value': valor}},
+    como os bindings de `query`, mas sem o tipo de cada termo.
+    """
+    local = local_store.is_enabled()
+    active_graph = get_active_graph()
+    start = time.perf_counter()
+    count = 0
+    try:
+        if local:
+            for binding in local_store.query(sparql_query):
+                count += 1
+                yield {var: {'value': term['value']} for var, term in binding.items()}
+        else:
+            for row in _iter_csv_rows(sparql_query, active_graph):
+                count += 1
+                yield {var: {'value': value} for var, value in row.items()}
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.record_stage("sparql", elapsed_ms / 1000)
+        with _lock:
+            stats = _stats[label]
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        current_app.logger.debug(f"SPARQL [{label}] {elapsed_ms:.1f} ms, {count} resultados (streaming).")
+
+def get_metrics():
+    """Métricas por tipo de consulta: execuções, acertos na cache e latência (ms)."""
+    with _lock:
+        return {
+            label: dict(stats, avg_ms=stats["total_ms"] / stats["count"] if stats["count"] else 0.0)
+            for label, stats in _stats.items()
+        }
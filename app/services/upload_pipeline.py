@@ -0,0 +1,163 @@
+import os
+
+from flask import current_app
+
+from . import adjacency_index, fuseki_manager, graph_store, ifc_ingestion, label_index, local_store, ontology_summary, quantity_takeoff, result_cache, sparql_client, validation_engine
+
+def _noop_progress(stage, percent):
+    pass
+
+def _load_into_fuseki(rdf_graph, model_name, content_hash):
+    """
+    Carrega o grafo no motor de consultas configurado (Fuseki ou `local_store`)
+    e atualiza o que é derivado do modelo ativo: índice de nomes, resumo da
+    ontologia, mapa de quantidades, índice de adjacência e hash carregado.
+    """
+    graph_uri = fuseki_manager.model_graph_uri(model_name)
+    fuseki_manager.save_model_store(rdf_graph, model_name, content_hash)
+    if local_store.is_enabled():
+        local_store.load(rdf_graph, graph_uri, fuseki_manager.model_store_path(model_name))
+    elif not fuseki_manager.sync_model_to_fuseki(rdf_graph, model_name):
+        return False
+    label_index.set_index(label_index.build_from_graph(rdf_graph, graph_uri))
+    ontology_summary.store(model_name, graph_uri, ontology_summary.compute(rdf_graph))
+    quantity_takeoff.store(model_name, graph_uri, quantity_takeoff.compute(rdf_graph))
+    adjacency_index.store(model_name, graph_uri, adjacency_index.compute(rdf_graph))
+    result_cache.set_loaded_hash(model_name, content_hash)
+    return True
+
+def _process_cached(cached_results, model_name, content_hash, rules_version, report_progress):
+    """Repetição de um ficheiro já processado: reutiliza o relatório e, se preciso, o grafo guardado."""
+    target_graph = str(fuseki_manager.model_graph_uri(model_name))
+    if sparql_client.get_active_graph() == target_graph and result_cache.get_loaded_hash(model_name) == content_hash:
+        current_app.logger.info(f"Ficheiro {content_hash[:12]} já carregado em <{target_graph}>: resultado em cache.")
+        report_progress("concluido", 100)
+        return {"success": True, "results": cached_results}
+
+    report_progress("carregamento", 70)
+    with result_cache.load_graph(content_hash, rules_version) as rdf_graph:
+        loaded = _load_into_fuseki(rdf_graph, model_name, content_hash)
+    if not loaded:
+        return {"success": False, "results": cached_results + [{"type": "ERRO", "message": "Falha ao carregar modelo no motor de consulta."}]}
+    report_progress("concluido", 100)
+    return {"success": True, "results": cached_results}
+
+def _use_streaming(ifc_file_path):
+    threshold = current_app.config['CONVERSION_STREAMING_MIN_BYTES']
+    return bool(threshold) and os.path.getsize(ifc_file_path) >= threshold and not local_store.is_enabled()
+
+def _process_streaming(ifc_file_path, model_name, content_hash, report_progress):
+    """
+    Processamento de modelos grandes sem Graph em memória: os triplos são
+    escritos num ficheiro N-Triples durante a travessia (calculando ao mesmo
+    tempo o resumo da ontologia, o mapa de quantidades e o índice de adjacência) e carregados no Fuseki em blocos a partir dele.
+    Estes modelos não ficam na cache de resultados nem no armazenamento compacto.
+    """
+    graph_uri = fuseki_manager.model_graph_uri(model_name)
+    spool_path = f"{ifc_file_path}.nt"
+    takeoff = quantity_takeoff.Collector()
+    adjacency = adjacency_index.Collector()
+    try:
+        report_progress("ingestao", 5)
+        try:
+            with open(spool_path, 'w', encoding='utf-8') as spool:
+                ingestion = ifc_ingestion.stream_ifc(
+                    ifc_file_path,
+                    lambda triples: ontology_summary.compute(
+                        adjacency.watch(takeoff.watch(fuseki_manager.spool_ntriples(triples, spool)))),
+                    validation_graph=validation_engine.needs_data_graph(),
+                )
+        except MemoryError as e:
+            current_app.logger.error(str(e))
+            return {"success": False, "results": [{"type": "ERRO", "message": str(e)}]}
+
+        report_progress("validacao", 30)
+        validation_results = validation_engine.validate_model(
+            ifc_file_path,
+            data_graph=ingestion["validation_graph"],
+            model=ingestion["model"],
+            report_progress=lambda done, total: report_progress("validacao", 30 + int(40 * done / max(total, 1))),
+        )
+
+        report_progress("carregamento", 70)
+        if not fuseki_manager.upload_ntriples_file(spool_path, model_name):
+            validation_results.append({"type": "ERRO", "message": "Falha ao carregar modelo no motor de consulta."})
+            return {"success": False, "results": validation_results}
+
+        # O grafo compacto anterior deste modelo já não corresponde ao que está no Fuseki
+        fuseki_manager.remove_model_store(model_name)
+        ontology_summary.store(model_name, graph_uri, ingestion["knowledge"])
+        quantity_takeoff.store(model_name, graph_uri, takeoff.build())
+        adjacency_index.store(model_name, graph_uri, adjacency.build())
+        label_index.reset()
+        result_cache.set_loaded_hash(model_name, content_hash)
+
+        report_progress("concluido", 100)
+        return {"success": True, "results": validation_results}
+    finally:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+def process_ifc_upload(ifc_file_path, model_name="default", content_hash=None, report_progress=None):
+    """
+    Executa o processamento completo de um ficheiro IFC já guardado em disco:
+    ingestão, validação SHACL (com sugestões do LLM) e carregamento no Fuseki,
+    no grafo nomeado de `model_name` (incremental quando o projeto já foi carregado).
+    Se `content_hash` (SHA-256 do ficheiro) já tiver sido processado com as mesmas
+    regras, o relatório e o grafo guardados são reutilizados sem ler o IFC.
+    Ficheiros a partir de CONVERSION_STREAMING_MIN_BYTES são convertidos em streaming.
+    `report_progress(etapa, percentagem)` é chamado à entrada de cada etapa.
+    Devolve um dicionário com o relatório e se o carregamento foi bem-sucedido.
+    O ficheiro é sempre removido no fim.
+    """
+    report_progress = report_progress or _noop_progress
+    try:
+        rules_version = validation_engine.get_rules_version()
+        if content_hash:
+            cached_results = result_cache.load(content_hash, rules_version)
+            if cached_results is not None:
+                return _process_cached(cached_results, model_name, content_hash, rules_version, report_progress)
+
+        if _use_streaming(ifc_file_path):
+            return _process_streaming(ifc_file_path, model_name, content_hash, report_progress)
+
+        report_progress("ingestao", 5)
+        ingestion = ifc_ingestion.ingest_ifc(ifc_file_path, validation_graph=validation_engine.needs_data_graph())
+
+        report_progress("validacao", 30)
+        validation_results = validation_engine.validate_model(
+            ifc_file_path,
+            data_graph=ingestion["validation_graph"],
+            model=ingestion["model"],
+            report_progress=lambda done, total: report_progress("validacao", 30 + int(40 * done / max(total, 1))),
+        )
+
+        rdf_graph = ingestion["knowledge_graph"]
+        if content_hash and rdf_graph:
+            result_cache.store(content_hash, rules_version, validation_results, rdf_graph)
+
+        report_progress("carregamento", 70)
+        if not rdf_graph or not _load_into_fuseki(rdf_graph, model_name, content_hash):
+            validation_results.append({"type": "ERRO", "message": "Falha ao carregar modelo no motor de consulta."})
+            return {"success": False, "results": validation_results}
+
+        report_progress("concluido", 100)
+        return {"success": True, "results": validation_results}
+    finally:
+        if os.path.exists(ifc_file_path):
+            os.remove(ifc_file_path)
+            current_app.logger.info(f"Ficheiro temporário removido: {ifc_file_path}")
+
+def reload_model(model_name):
+    """
+    Volta a carregar no Fuseki um modelo já convertido, a partir do ficheiro
+    compacto guardado em disco (sem ler o IFC), por exemplo depois de o Fuseki
+    ter sido reiniciado sem persistência. Passa pelo mesmo carregamento que os
+    uploads, pelo que os dados derivados passam a descrever este modelo.
+    Devolve None se o modelo não existir.
+    """
+    path = fuseki_manager.model_store_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with graph_store.open_graph(path) as rdf_graph:
+        return _load_into_fuseki(rdf_graph, model_name, fuseki_manager.model_store_hash(model_name))
@@ -1,85 +1,251 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path  # Importa a classe Path
 
 import ifcopenshell
-import requests
 from flask import current_app
 from pyshacl import validate
-from rdflib import RDF, Graph, Literal, Namespace
+from rdflib import RDF, RDFS, BNode, Graph, URIRef
 from rdflib.namespace import SH
 
-IFC_NS = Namespace("http://exemplo.org/ifc/")
-PROP_NS = Namespace("http://exemplo.org/ifc/property#")
+from . import clash_detection, llm_suggestions, metrics, native_validator
+from .ifc_ingestion import IFC_NS, _pool_context, ingest_ifc
 
 def _populate_rdf_graph_for_validation(ifc_file_path):
-    model = ifcopenshell.open(ifc_file_path)
-    products = model.by_type("IfcProduct")
-    rdf_graph = Graph()
-    rdf_graph.bind("ifc", IFC_NS)
-    rdf_graph.bind("prop", PROP_NS)
-
-    for element in products:
-        if not element.GlobalId: continue
-        uri = IFC_NS[element.GlobalId]
-        rdf_graph.add((uri, RDF.type, IFC_NS[element.is_a()]))
-        if element.Name:
-            rdf_graph.add((uri, IFC_NS["name"], Literal(element.Name)))
-        
-        if hasattr(element, 'ContainedInStructure') and element.ContainedInStructure:
-            for rel in element.ContainedInStructure:
-                if hasattr(rel, 'RelatingStructure') and rel.RelatingStructure:
-                    container = rel.RelatingStructure
-                    rdf_graph.add((uri, PROP_NS["ContainedInStructure"], IFC_NS[container.GlobalId]))
-            
-        if hasattr(element, 'FillsVoids'):
-            for rel in element.FillsVoids:
-                if hasattr(rel, 'RelatingOpeningElement'):
-                    opening = rel.RelatingOpeningElement
-                    rdf_graph.add((uri, PROP_NS["FillsVoids"], IFC_NS[opening.GlobalId]))
-    return rdf_graph
-
-def _get_llm_suggestion(conflict_description):
-    prompt = f"Você é um especialista em BIM. Forneça uma sugestão de correção clara e concisa (menos de 2 linhas) para o seguinte conflito: {conflict_description}"
-    try:
-        payload = {"model": "gemma3:4b", "messages": [{"role": "user", "content": prompt}], "stream": False}
-        response = requests.post(current_app.config['OLLAMA_API_URL'], json=payload, timeout=60)
-        response.raise_for_status()
-        response_data = response.json()
-        return response_data.get("message", {}).get("content", "Nenhuma sugestão disponível.").strip()
-    except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"Erro ao comunicar com o LLM: {e}")
-        return "Não foi possível obter uma sugestão da IA."
-
-def validate_model(ifc_file_path):
-    current_app.logger.info("A iniciar validação...")
-    data_graph = _populate_rdf_graph_for_validation(ifc_file_path)
-    
-    shacl_rules_path_str = current_app.config['SHACL_RULES_PATH']
-    shacl_rules_uri = Path(shacl_rules_path_str).as_uri()
-    current_app.logger.info(f"A carregar regras SHACL de: {shacl_rules_uri}")
-    
-    shacl_graph = Graph().parse(shacl_rules_uri, format="turtle")
+    return ingest_ifc(ifc_file_path)["validation_graph"]
+
+_shapes_lock = threading.Lock()
+_shapes = None
+_pool = None
+
+# Tipos de alvo que impedem a partição por classe
+_OTHER_TARGETS = (SH.targetNode, SH.targetSubjectsOf, SH.targetObjectsOf, SH.target)
+
+def _load_shapes(path):
+    """
+    Lê as regras SHACL e prepara uma partição por NodeShape: as formas que só
+    têm sh:targetClass e caminhos simples podem ser validadas apenas sobre os
+    nós da sua classe; as restantes são validadas sobre o grafo completo.
+    """
+    shapes_graph = Graph().parse(Path(path).as_uri(), format="turtle")
+    partitions = []
+    remainder = Graph()
+    for prefix, namespace in shapes_graph.namespaces():
+        remainder.bind(prefix, namespace)
+
+    shape_nodes = set(shapes_graph.subjects(RDF.type, SH.NodeShape)) | set(shapes_graph.subjects(RDF.type, SH.PropertyShape))
+    for shape in sorted(shape_nodes, key=str):
+        if isinstance(shape, BNode) or (None, SH.property, shape) in shapes_graph:
+            continue
+        shape_graph = shapes_graph.cbd(shape)
+        target_classes = list(shapes_graph.objects(shape, SH.targetClass))
+        other_targets = any((shape, predicate, None) in shapes_graph for predicate in _OTHER_TARGETS)
+        simple_paths = all(isinstance(path, URIRef) for path in shape_graph.objects(None, SH.path))
+        implicit_target = (shape, RDF.type, RDFS.Class) in shapes_graph
+        if not target_classes and not other_targets and not implicit_target:
+            # Sem alvos, a forma nunca produz resultados (ex: ValidRelationRule)
+            continue
+        if target_classes and not other_targets and not implicit_target and simple_paths:
+            partitions.append({
+                "shape": shape,
+                "target_classes": target_classes,
+                "shapes_ttl": shape_graph.serialize(format="turtle"),
+            })
+        else:
+            remainder += shape_graph
+
+    with open(path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:16]
+
+    return {
+        "path": path,
+        "mtime": os.path.getmtime(path),
+        "version": version,
+        "graph": shapes_graph,
+        "native_rules": native_validator.compile_shapes(shapes_graph),
+        "partitions": partitions,
+        "remainder_ttl": remainder.serialize(format="turtle") if len(remainder) else None,
+    }
+
+def get_shapes():
+    """Regras SHACL pré-processadas, relidas apenas quando o ficheiro muda."""
+    global _shapes
+    path = current_app.config['SHACL_RULES_PATH']
+    with _shapes_lock:
+        if _shapes is None or _shapes["path"] != path or _shapes["mtime"] != os.path.getmtime(path):
+            current_app.logger.info(f"A carregar regras SHACL de: {Path(path).as_uri()}")
+            _shapes = _load_shapes(path)
+        return _shapes
 
+def _partition_data(data_graph, target_classes):
+    """Triplos dos nós das classes-alvo e os tipos dos nós a que estes apontam."""
+    partition = Graph()
+    for target_class in target_classes:
+        for focus in data_graph.subjects(RDF.type, target_class):
+            for _, predicate, obj in data_graph.triples((focus, None, None)):
+                partition.add((focus, predicate, obj))
+                if isinstance(obj, URIRef):
+                    for obj_type in data_graph.objects(obj, RDF.type):
+                        partition.add((obj, RDF.type, obj_type))
+    return partition
+
+def _validate_partition(data_nt, shapes_ttl, shape_key):
+    """
+    Valida uma partição (executado num processo do pool). Recebe os grafos
+    serializados e devolve (conforma, [(nó em foco, forma, mensagem), ...]).
+    """
+    data_graph = Graph().parse(data=data_nt, format="nt")
+    shacl_graph = Graph().parse(data=shapes_ttl, format="turtle")
     conforms, results_graph, _ = validate(
-        data_graph, 
-        shacl_graph=shacl_graph, 
-        inference='rdfs', 
+        data_graph,
+        shacl_graph=shacl_graph,
+        inference='rdfs',
         ont_graph=None,
         advanced=True,
         debug=False,
         meta_shacl=False,
         abort_on_first=False,
         )
-    
-    print(f"Conformidade: {_}")
+    violations = []
+    for s in results_graph.subjects(SH.resultSeverity, SH.Violation):
+        message = str(results_graph.value(s, SH.resultMessage) or "Mensagem não definida.")
+        focus_node = str(results_graph.value(s, SH.focusNode) or "N/A")
+        source_shape = results_graph.value(s, SH.sourceShape)
+        # As formas de propriedade são nós anónimos: identifica-as pela NodeShape da partição
+        shape = shape_key if source_shape is None or isinstance(source_shape, BNode) else str(source_shape)
+        violations.append((focus_node, shape, message))
+    return conforms, violations
+
+def _get_pool():
+    global _pool
+    with _shapes_lock:
+        if _pool is None:
+            # Como na conversão: processos criados por forkserver (ou spawn), nunca por fork do servidor
+            _pool = ProcessPoolExecutor(max_workers=current_app.config['SHACL_WORKERS'], mp_context=_pool_context())
+        return _pool
+
+def reset_pool():
+    """
+    Esquece o pool de validação herdado do processo mestre (os seus processos
+    e threads de gestão pertencem ao mestre); é criado de novo na primeira
+    validação em paralelo do worker.
+    """
+    global _pool
+    _pool = None
+
+def get_rules_version():
+    """Identifica as regras em uso (conteúdo do ficheiro SHACL e motor de validação)."""
+    version = f"{get_shapes()['version']}-{current_app.config['VALIDATION_ENGINE']}"
+    return f"{version}-clash" if current_app.config['CLASH_DETECTION'] else version
+
+def _native_shapes(shapes):
+    """Formas validadas pelo motor nativo, de acordo com VALIDATION_ENGINE."""
+    if current_app.config['VALIDATION_ENGINE'] != 'native':
+        return set()
+    return {rule["shape"] for rule in shapes["native_rules"]}
+
+def needs_data_graph():
+    """Indica se a validação ainda precisa do grafo RDF (pyshacl) ou se o motor nativo cobre todas as regras."""
+    shapes = get_shapes()
+    native = _native_shapes(shapes)
+    return bool(shapes["remainder_ttl"]) or any(str(partition["shape"]) not in native for partition in shapes["partitions"])
+
+def _run_shacl(data_graph, skip_shapes=()):
+    """
+    Valida o grafo de dados partição a partição e junta os resultados. Com
+    mais de um worker e grafos grandes, as partições correm num pool de processos.
+    As formas em `skip_shapes` já foram validadas pelo motor nativo.
+    """
+    shapes = get_shapes()
+    tasks = []
+    for partition in shapes["partitions"]:
+        if str(partition["shape"]) in skip_shapes:
+            continue
+        partition_data = _partition_data(data_graph, partition["target_classes"])
+        if len(partition_data):
+            tasks.append((partition_data.serialize(format="nt"), partition["shapes_ttl"], str(partition["shape"])))
+    if shapes["remainder_ttl"]:
+        tasks.append((data_graph.serialize(format="nt"), shapes["remainder_ttl"], ""))
+
+    if not tasks:
+        return True, []
+
+    workers = current_app.config['SHACL_WORKERS']
+    if workers > 1 and len(tasks) > 1 and len(data_graph) >= current_app.config['SHACL_PARALLEL_MIN_TRIPLES']:
+        outcomes = list(_get_pool().map(_validate_partition, *zip(*tasks)))
+    else:
+        outcomes = [_validate_partition(*task) for task in tasks]
+
+    conforms = all(outcome[0] for outcome in outcomes)
+    violations = [violation for outcome in outcomes for violation in outcome[1]]
+    current_app.logger.info(f"Validação SHACL: {len(tasks)} partições, {len(violations)} violações.")
+    return conforms, violations
+
+def validate_model(ifc_file_path, data_graph=None, report_progress=None, model=None):
+    """
+    Valida o modelo contra as regras SHACL. Se o grafo de dados já tiver sido
+    construído pela ingestão, é reutilizado em vez de voltar a ler o IFC.
+    Com VALIDATION_ENGINE='native', as regras suportadas são verificadas
+    diretamente sobre `model` (ifcopenshell) e só as restantes passam pelo pyshacl.
+    Com CLASH_DETECTION, as colisões geométricas entre elementos são reportadas
+    como conflitos, com o segundo elemento em `clash_with`.
+    `report_progress(feitos, total)` é chamado antes e depois de pedir as sugestões ao LLM.
+    """
+    current_app.logger.info("A iniciar validação...")
+    shapes = get_shapes()
+    native_shapes = _native_shapes(shapes)
+
+    conforms, shacl_violations = True, []
+    if native_shapes:
+        if model is None:
+            model = ifcopenshell.open(ifc_file_path)
+        rules = [rule for rule in shapes["native_rules"] if rule["shape"] in native_shapes]
+        with metrics.span("native_validation"):
+            conforms, shacl_violations = native_validator.validate(model, rules)
+        metrics.inc(metrics.VIOLATIONS, len(shacl_violations), engine="native")
+        current_app.logger.info(f"Validação nativa: {len(rules)} regras, {len(shacl_violations)} violações.")
+
+    if needs_data_graph():
+        if data_graph is None:
+            data_graph = _populate_rdf_graph_for_validation(ifc_file_path)
+        with metrics.span("shacl"):
+            fallback_conforms, fallback_violations = _run_shacl(data_graph, skip_shapes=native_shapes)
+        metrics.inc(metrics.VIOLATIONS, len(fallback_violations), engine="pyshacl")
+        conforms = conforms and fallback_conforms
+        shacl_violations += fallback_violations
+
+    clashes = []
+    if current_app.config['CLASH_DETECTION']:
+        if model is None:
+            model = ifcopenshell.open(ifc_file_path)
+        with metrics.span("clash"):
+            clashes = clash_detection.detect_clashes(model)
+        metrics.inc(metrics.VIOLATIONS, len(clashes), engine="clash")
+        conforms = conforms and not clashes
 
     validation_report = []
     if conforms:
         validation_report.append({"type": "SUCESSO", "message": "O modelo está em conformidade."})
         return validation_report
 
-    for s in results_graph.subjects(SH.resultSeverity, SH.Violation):
-        message = str(results_graph.value(s, SH.resultMessage) or "Mensagem não definida.")
-        focus_node = str(results_graph.value(s, SH.focusNode) or "N/A").replace(str(IFC_NS), "ifc:")
-        suggestion = _get_llm_suggestion(message)
-        validation_report.append({"type": "CONFLITO", "element": focus_node, "message": message, "suggestion_llm": suggestion})
-    return validation_report
\ No newline at end of file
+    violations = [(focus_node.replace(str(IFC_NS), "ifc:"), (shape, message), {})
+                  for focus_node, shape, message in shacl_violations]
+    # As colisões entre as mesmas classes partilham a mensagem (e a sugestão do LLM)
+    violations += [(f"ifc:{clash['element']}",
+                    ("clash", f"Colisão geométrica entre {clash['class']} e {clash['other_class']}"),
+                    {"clash_with": f"ifc:{clash['other']}"})
+                   for clash in clashes]
+
+    # Conflitos repetidos (mesma forma e mensagem) partilham um único pedido ao LLM
+    if report_progress:
+        report_progress(0, len(violations))
+    suggestions = llm_suggestions.get_suggestions([conflict for _, conflict, _ in violations])
+    if report_progress:
+        report_progress(len(violations), len(violations))
+
+    for focus_node, conflict, details in violations:
+        validation_report.append({"type": "CONFLITO", "element": focus_node, "message": conflict[1],
+                                  "suggestion_llm": suggestions[conflict], **details})
+    return validation_report
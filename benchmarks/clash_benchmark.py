@@ -0,0 +1,151 @@
+"""
+Benchmark da deteção de colisões sobre malhas sintéticas (ou sobre um ficheiro
+IFC com geometria, dado com --ifc). Cada andar tem uma laje, paredes
+transversais apoiadas na laje, pilares encostados às paredes, tubos que
+atravessam as paredes (colisões por faces que se cruzam) e tubos embebidos na
+laje (colisões por inclusão). Mede o varrimento das caixas, a verificação
+exata num só processo e no pool de processos, e escreve os resultados em JSON.
+
+Exemplo:
+    python -m benchmarks.clash_benchmark --storeys 10 --walls 40 --pipes 20 --output colisoes.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+from datetime import datetime, timezone
+
+import numpy
+
+# Tal como run_benchmarks: motor de consultas local e sem aquecimento do NLU
+os.environ.setdefault("QUERY_BACKEND", "local")
+os.environ.setdefault("NLU_WARMUP", "0")
+
+from app import app
+from app.services import clash_detection
+from benchmarks.run_benchmarks import _git_revision, _Stages
+
+_STOREY_HEIGHT = 3.0
+_SLAB_THICKNESS = 0.25
+
+def box_mesh(low, high):
+    """Paralelepípedo alinhado com os eixos: 12 triângulos (12, 3, 3)."""
+    x0, y0, z0 = low
+    x1, y1, z1 = high
+    corners = numpy.array([(x, y, z) for x in (x0, x1) for y in (y0, y1) for z in (z0, z1)], dtype=numpy.float64)
+    faces = [(0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+             (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3)]
+    return corners[numpy.array(faces)]
+
+def pipe_mesh(x0, x1, y, z, radius, segments):
+    """Cilindro fechado ao longo do eixo x, com `segments` lados: 4 × segments triângulos."""
+    angles = numpy.linspace(0.0, 2.0 * numpy.pi, segments, endpoint=False)
+    ring = numpy.stack((numpy.zeros(segments), y + radius * numpy.cos(angles), z + radius * numpy.sin(angles)), axis=1)
+    start, end = ring + (x0, 0.0, 0.0), ring + (x1, 0.0, 0.0)
+    following = numpy.roll(numpy.arange(segments), -1)
+    sides = numpy.concatenate((
+        numpy.stack((start, end, end[following]), axis=1),
+        numpy.stack((start, end[following], start[following]), axis=1),
+    ))
+    centre_start = numpy.broadcast_to((x0, y, z), (segments, 3))
+    centre_end = numpy.broadcast_to((x1, y, z), (segments, 3))
+    caps = numpy.concatenate((
+        numpy.stack((centre_start, start[following], start), axis=1),
+        numpy.stack((centre_end, end, end[following]), axis=1),
+    ))
+    return numpy.concatenate((sides, caps))
+
+def generate_scene(storeys=5, walls=20, pipes=10, segments=24, seed=42):
+    """Malhas do cenário sintético e número de colisões esperado."""
+    rng = random.Random(seed)
+    spacing, depth = 4.0, 12.0
+    length = walls * spacing
+    meshes = []
+    expected = 0
+    for storey in range(storeys):
+        floor = storey * _STOREY_HEIGHT
+        meshes.append(box_mesh((-1.0, -1.0, floor - _SLAB_THICKNESS), (length + 1.0, depth + 1.0, floor)))
+        for wall in range(walls):
+            x = (wall + 0.5) * spacing
+            meshes.append(box_mesh((x, 0.0, floor), (x + 0.2, depth, floor + _STOREY_HEIGHT - _SLAB_THICKNESS)))
+            # Pilar encostado à parede: toca-lhe, mas não colide
+            meshes.append(box_mesh((x + 0.2, depth / 2, floor), (x + 0.6, depth / 2 + 0.4, floor + 2.5)))
+        for _ in range(pipes):
+            first, last = sorted(rng.sample(range(walls + 1), 2))
+            y = rng.uniform(0.5, depth / 2 - 0.5)
+            z = floor + rng.uniform(0.5, 2.0)
+            meshes.append(pipe_mesh(first * spacing, last * spacing, y, z, 0.05, segments))
+            expected += last - first
+            # Tubo embebido na laje (colisão por inclusão)
+            meshes.append(pipe_mesh(0.0, length, rng.uniform(0.5, depth - 0.5), floor - _SLAB_THICKNESS / 2,
+                                    0.04, segments))
+            expected += 1
+    return meshes, expected
+
+def _run_ifc(stages, path, workers):
+    import ifcopenshell
+    model = stages.run("ifcopenshell_open", lambda: ifcopenshell.open(path),
+                       items=lambda m: len(m.by_type("IfcElement")), unit="elementos")
+    with app.app_context():
+        app.config.update(CLASH_WORKERS=workers)
+        return stages.run("detect_clashes", lambda: clash_detection.detect_clashes(model), items=len, unit="colisões")
+
+def run(args):
+    stages = _Stages()
+    summary = {}
+    if args.ifc:
+        clashes = _run_ifc(stages, args.ifc, args.workers)
+        summary["clashes"] = len(clashes)
+    else:
+        meshes, expected = stages.run("generate", lambda: generate_scene(
+            args.storeys, args.walls, args.pipes, args.segments, args.seed), items=lambda scene: len(scene[0]),
+            unit="elementos")
+        boxes = numpy.array([clash_detection.bounding_box(mesh) for mesh in meshes])
+        pairs = stages.run("candidate_pairs", lambda: clash_detection.candidate_pairs(boxes, args.tolerance),
+                           items=len(meshes), unit="elementos")
+        serial = stages.run("check_pairs_serial", lambda: clash_detection._check_all(
+            pairs, meshes, boxes, 1, args.tolerance), items=len(pairs), unit="pares")
+        parallel = stages.run("check_pairs_parallel", lambda: clash_detection._check_all(
+            pairs, meshes, boxes, args.workers, args.tolerance), items=len(pairs), unit="pares")
+        if sorted(serial) != sorted(parallel) or len(serial) != expected:
+            print(f"-> Resultado inesperado: {len(serial)} em série, {len(parallel)} em paralelo, "
+                  f"{expected} esperadas", file=sys.stderr)
+        summary.update(elements=len(meshes), triangles=int(sum(len(mesh) for mesh in meshes)),
+                       candidate_pairs=len(pairs), clashes=len(serial), expected_clashes=expected)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "summary": summary,
+        "stages": stages.results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da deteção de colisões geométricas.")
+    parser.add_argument("--ifc", help="usar este ficheiro IFC (com geometria) em vez do cenário sintético")
+    parser.add_argument("--storeys", type=int, default=5)
+    parser.add_argument("--walls", type=int, default=20, help="paredes por andar")
+    parser.add_argument("--pipes", type=int, default=10, help="tubos por andar (mais outros tantos na laje)")
+    parser.add_argument("--segments", type=int, default=24, help="lados de cada tubo")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="ficheiro JSON de resultados (por omissão, a saída padrão)")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"-> Resultados escritos em {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark do pipeline completo sobre um modelo IFC sintético (ou um ficheiro
+dado com --ifc). Mede cada etapa (leitura do IFC, grafo de validação, pyshacl,
+conversão RDF, serialização, carregamento num endpoint Fuseki simulado e
+consultas do chatbot) com tempo, débito e pico de memória, e escreve os
+resultados em JSON para comparação entre versões.
+
+Exemplo:
+    python -m benchmarks.run_benchmarks --storeys 10 --walls 200 --output resultados.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# O benchmark usa o motor de consultas local e dispensa o aquecimento do NLU
+os.environ.setdefault("QUERY_BACKEND", "local")
+os.environ.setdefault("NLU_WARMUP", "0")
+
+import ifcopenshell
+from pyshacl import validate
+
+from app import app
+from app.services import (adjacency_index, chatbot_logic, fuseki_manager, graph_store, label_index, local_store,
+                          native_validator, ontology_summary, quantity_takeoff, validation_engine)
+from app.services.ifc_ingestion import inst, peak_memory_mb
+from benchmarks import synthetic_ifc
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Endpoint Fuseki simulado: aceita os pedidos GSP, de atualização e de consulta e descarta-os."""
+
+    def do_POST(self):
+        if 'Content-Length' in self.headers:
+            self.rfile.read(int(self.headers['Content-Length']))
+        else:
+            self._read_chunked()
+        body = b'{"head": {"vars": []}, "results": {"bindings": []}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/sparql-results+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_chunked(self):
+        while True:
+            size = int(self.rfile.readline().strip() or b"0", 16)
+            self.rfile.read(size + 2)
+            if size == 0:
+                break
+
+    def log_message(self, *args):
+        pass
+
+def _start_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class _Stages:
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, func, items=None, unit="itens"):
+        """Executa uma etapa e regista o tempo, o débito e o pico de memória do processo."""
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        count = items(value) if callable(items) else items
+        self.results[name] = {
+            "seconds": round(elapsed, 6),
+            "items": count,
+            "unit": unit,
+            "items_per_second": round(count / elapsed, 2) if count and elapsed > 0 else None,
+            "peak_rss_mb": round(peak_memory_mb(), 1) if peak_memory_mb() is not None else None,
+        }
+        rate = f", {count / elapsed:,.0f} {unit}/s" if count and elapsed > 0 else ""
+        print(f"-> {name}: {elapsed:.3f}s{rate}", file=sys.stderr)
+        return value
+
+def run(args):
+    stages = _Stages()
+    work_dir = tempfile.mkdtemp(prefix="bim-benchmark-")
+    server, stand_in_url = _start_stand_in()
+    app.config.update(
+        FUSEKI_QUERY_ENDPOINT=f"{stand_in_url}/query",
+        FUSEKI_GSP_ENDPOINT=f"{stand_in_url}/data",
+        FUSEKI_UPDATE_ENDPOINT=f"{stand_in_url}/update",
+        MODEL_STORE_FOLDER=os.path.join(work_dir, "models"),
+        FINGERPRINT_FOLDER=os.path.join(work_dir, "fingerprints"),
+        RESULT_CACHE_FOLDER=os.path.join(work_dir, "result_cache"),
+    )
+
+    ifc_path = args.ifc
+    if not ifc_path:
+        ifc_path = os.path.join(work_dir, "synthetic.ifc")
+        stages.run("generate", lambda: synthetic_ifc.generate_file(
+            ifc_path, storeys=args.storeys, walls_per_storey=args.walls, doors_per_storey=args.doors,
+            psets_per_element=args.psets, properties_per_pset=args.properties, materials=args.materials,
+            seed=args.seed), items=lambda count: count, unit="entidades")
+
+    with app.app_context():
+        shapes = validation_engine.get_shapes()
+
+        model = stages.run("ifcopenshell_open", lambda: ifcopenshell.open(ifc_path),
+                           items=lambda m: len(m.by_type("IfcRoot")), unit="entidades")
+        data_graph = stages.run("populate_validation_graph",
+                                lambda: validation_engine._populate_rdf_graph_for_validation(ifc_path),
+                                items=len, unit="triplos")
+        stages.run("pyshacl_validate", lambda: validate(data_graph, shacl_graph=shapes["graph"], inference='rdfs',
+                                                        advanced=True, abort_on_first=False),
+                   items=len(data_graph), unit="triplos")
+        stages.run("shacl_partitioned", lambda: validation_engine._run_shacl(data_graph),
+                   items=len(data_graph), unit="triplos")
+        stages.run("native_validate", lambda: native_validator.validate(model, shapes["native_rules"]),
+                   items=len(model.by_type("IfcRoot")), unit="entidades")
+
+        graph = stages.run("convert_ifc_to_rdf", lambda: fuseki_manager.convert_ifc_to_rdf(ifc_path),
+                           items=len, unit="triplos")
+        serialized = stages.run("serialize_ntriples", lambda: graph.serialize(format="nt", encoding="utf-8"),
+                                items=len(graph), unit="triplos")
+        store_path = os.path.join(work_dir, "graph.bkg")
+        stages.run("write_compact_store", lambda: graph_store.write_graph(graph, store_path),
+                   items=lambda count: count, unit="triplos")
+        stages.run("read_compact_store", lambda: sum(1 for _ in graph_store.open_graph(store_path)),
+                   items=lambda count: count, unit="triplos")
+        stages.run("upload_to_fuseki", lambda: fuseki_manager.upload_to_fuseki(graph, "benchmark"),
+                   items=len(graph), unit="triplos")
+
+        graph_uri = fuseki_manager.model_graph_uri("benchmark")
+        local_store.load(graph, graph_uri)
+        label_index.set_index(label_index.build_from_graph(graph, graph_uri))
+        ontology_summary.store("benchmark", graph_uri, ontology_summary.compute(graph))
+        storey = model.by_type("IfcBuildingStorey")[0] if model.by_type("IfcBuildingStorey") else None
+        wall = model.by_type("IfcWall")[0] if model.by_type("IfcWall") else None
+        repetitions = args.query_repetitions
+
+        if wall is not None and wall.Name:
+            stages.run("chatbot_label_lookup", lambda: [label_index.lookup(wall.Name) for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+        if storey is not None:
+            storey_uri = str(inst[storey.GlobalId])
+            stages.run("chatbot_neighbourhood", lambda: [chatbot_logic.get_graph_for_node(storey_uri) for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+        stages.run("ontology_summary", lambda: [fuseki_manager.get_ontology_summary() for _ in range(repetitions)],
+                   items=repetitions, unit="consultas")
+        stages.run("full_graph_page", lambda: chatbot_logic.get_full_graph(limit=500, use_cache=False),
+                   items=lambda page: len(page["edges"]), unit="arestas")
+        stages.run("graph_summary", chatbot_logic.get_graph_summary,
+                   items=lambda summary: len(summary["nodes"]), unit="nós")
+
+        adjacency = stages.run("build_adjacency_index", lambda: adjacency_index.compute(graph), items=len, unit="nós")
+        if storey is not None and wall is not None:
+            stages.run("adjacency_expand_3_hops", lambda: [adjacency.expand(storey_uri, 3, max_nodes=2000)
+                                                           for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+            stages.run("adjacency_shortest_path", lambda: [adjacency.shortest_path(storey_uri, str(inst[wall.GlobalId]))
+                                                           for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+
+        takeoff = stages.run("build_quantity_takeoff", lambda: quantity_takeoff.compute(graph), items=len, unit="valores")
+        if "NetVolume" in takeoff.meta["measures"]:
+            stages.run("takeoff_totals", lambda: [takeoff.totals("NetVolume", group_by=("container", "material"))
+                                                  for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+            stages.run("takeoff_histogram", lambda: [takeoff.histogram("NetVolume", bins=20) for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+            stages.run("takeoff_top", lambda: [takeoff.top("NetVolume", n=10) for _ in range(repetitions)],
+                       items=repetitions, unit="consultas")
+
+    server.shutdown()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "ifc_bytes": os.path.getsize(ifc_path),
+        "ntriples_bytes": len(serialized),
+        "compact_store_bytes": os.path.getsize(store_path),
+        "stages": stages.results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline IFC → RDF → validação → consultas.")
+    parser.add_argument("--ifc", help="usar este ficheiro IFC em vez de gerar um modelo sintético")
+    parser.add_argument("--storeys", type=int, default=5)
+    parser.add_argument("--walls", type=int, default=100, help="paredes por andar")
+    parser.add_argument("--doors", type=int, default=20, help="portas por andar")
+    parser.add_argument("--psets", type=int, default=2, help="conjuntos de propriedades por elemento")
+    parser.add_argument("--properties", type=int, default=5, help="propriedades por conjunto")
+    parser.add_argument("--materials", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--query-repetitions", type=int, default=100)
+    parser.add_argument("--output", help="ficheiro JSON de resultados (por omissão, a saída padrão)")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"-> Resultados escritos em {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
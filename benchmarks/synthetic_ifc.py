@@ -0,0 +1,114 @@
+"""
+Gerador de modelos IFC sintéticos para os benchmarks: projeto, terreno,
+edifício e andares, com paredes, portas (em aberturas das paredes), conjuntos
+de propriedades, quantidades e materiais. O conteúdo é determinístico para a
+mesma semente, para que os resultados sejam comparáveis entre versões.
+"""
+import argparse
+import random
+import uuid
+
+import ifcopenshell
+import ifcopenshell.guid
+
+def _guid(rng):
+    return ifcopenshell.guid.compress(uuid.UUID(int=rng.getrandbits(128)).hex)
+
+def generate_model(storeys=3, walls_per_storey=50, doors_per_storey=10, psets_per_element=2,
+                   properties_per_pset=5, materials=5, quantities=True, seed=42):
+    """
+    Cria o modelo em memória e devolve o ifcopenshell.file. As portas ficam em
+    aberturas de paredes do mesmo andar (IfcRelVoidsElement + IfcRelFillsElement).
+    """
+    rng = random.Random(seed)
+    model = ifcopenshell.file(schema="IFC4")
+
+    def create(ifc_class, **attributes):
+        """Entidade IfcRoot (com GlobalId)."""
+        return model.create_entity(ifc_class, GlobalId=_guid(rng), **attributes)
+
+    project = create("IfcProject", Name="Projeto Sintético")
+    site = create("IfcSite", Name="Terreno")
+    building = create("IfcBuilding", Name="Edifício")
+    create("IfcRelAggregates", RelatingObject=project, RelatedObjects=[site])
+    create("IfcRelAggregates", RelatingObject=site, RelatedObjects=[building])
+
+    material_entities = [model.create_entity("IfcMaterial", Name=f"Material {i}") for i in range(max(materials, 1))]
+    material_members = {material.id(): [] for material in material_entities}
+
+    storey_entities = []
+    elements = []
+    for storey_index in range(storeys):
+        storey = create("IfcBuildingStorey", Name=f"Piso {storey_index}", Elevation=3.0 * storey_index)
+        storey_entities.append(storey)
+
+        walls = [create("IfcWall", Name=f"Parede {storey_index}-{i}") for i in range(walls_per_storey)]
+        doors = []
+        for i in range(doors_per_storey):
+            door = create("IfcDoor", Name=f"Porta {storey_index}-{i}", OverallHeight=2.1, OverallWidth=0.9)
+            doors.append(door)
+            if walls:
+                opening = create("IfcOpeningElement", Name=f"Abertura {storey_index}-{i}")
+                create("IfcRelVoidsElement", RelatingBuildingElement=walls[i % len(walls)], RelatedOpeningElement=opening)
+                create("IfcRelFillsElement", RelatingOpeningElement=opening, RelatedBuildingElement=door)
+
+        slab = create("IfcSlab", Name=f"Laje {storey_index}")
+        create("IfcRelContainedInSpatialStructure", RelatingStructure=storey, RelatedElements=walls + doors + [slab])
+        elements.extend(walls + doors + [slab])
+
+    create("IfcRelAggregates", RelatingObject=building, RelatedObjects=storey_entities)
+
+    for element in elements:
+        for pset_index in range(psets_per_element):
+            properties = [
+                model.create_entity("IfcPropertySingleValue", Name=f"Propriedade_{pset_index}_{i}",
+                                    NominalValue=model.create_entity("IfcLabel", f"Valor {rng.randint(0, 999)}"))
+                for i in range(properties_per_pset)
+            ]
+            pset = create("IfcPropertySet", Name=f"Pset_Sintetico_{pset_index}", HasProperties=properties)
+            create("IfcRelDefinesByProperties", RelatedObjects=[element], RelatingPropertyDefinition=pset)
+
+        if quantities:
+            quantity_set = create("IfcElementQuantity", Name="Qto_Sintetico", Quantities=[
+                model.create_entity("IfcQuantityLength", Name="Length", LengthValue=round(rng.uniform(0.5, 12.0), 3)),
+                model.create_entity("IfcQuantityArea", Name="NetArea", AreaValue=round(rng.uniform(1.0, 40.0), 3)),
+                model.create_entity("IfcQuantityVolume", Name="NetVolume", VolumeValue=round(rng.uniform(0.1, 10.0), 3)),
+            ])
+            create("IfcRelDefinesByProperties", RelatedObjects=[element], RelatingPropertyDefinition=quantity_set)
+
+        material_members[material_entities[rng.randrange(len(material_entities))].id()].append(element)
+
+    for material in material_entities:
+        members = material_members[material.id()]
+        if members:
+            create("IfcRelAssociatesMaterial", RelatedObjects=members, RelatingMaterial=material)
+
+    return model
+
+def generate_file(path, **options):
+    """Gera o modelo e escreve-o em `path`. Devolve o número de entidades IfcRoot."""
+    model = generate_model(**options)
+    model.write(path)
+    return len(model.by_type("IfcRoot"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um modelo IFC sintético.")
+    parser.add_argument("output")
+    parser.add_argument("--storeys", type=int, default=3)
+    parser.add_argument("--walls", type=int, default=50, help="paredes por andar")
+    parser.add_argument("--doors", type=int, default=10, help="portas por andar")
+    parser.add_argument("--psets", type=int, default=2, help="conjuntos de propriedades por elemento")
+    parser.add_argument("--properties", type=int, default=5, help="propriedades por conjunto")
+    parser.add_argument("--materials", type=int, default=5)
+    parser.add_argument("--no-quantities", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    count = generate_file(
+        args.output, storeys=args.storeys, walls_per_storey=args.walls, doors_per_storey=args.doors,
+        psets_per_element=args.psets, properties_per_pset=args.properties, materials=args.materials,
+        quantities=not args.no_quantities, seed=args.seed,
+    )
+    print(f"-> Modelo sintético com {count} entidades IfcRoot escrito em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,39 @@ class Config:
     
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
     NLU_MODEL_PATH = os.path.join(BASE_DIR, 'nlu_model')
+    # Classificação de intenções: carregamento no arranque, tamanho dos lotes do
+    # nlp.pipe, perguntas por pedido em /ask/batch e cache de intenções
+    NLU_WARMUP = os.environ.get("NLU_WARMUP", "1") == "1"
+    NLU_BATCH_SIZE = int(os.environ.get("NLU_BATCH_SIZE", 64))
+    NLU_MAX_BATCH = int(os.environ.get("NLU_MAX_BATCH", 1000))
+    NLU_INTENT_CACHE_SIZE = int(os.environ.get("NLU_INTENT_CACHE_SIZE", 2048))
     SHACL_RULES_PATH = os.path.join(BASE_DIR, 'data', 'ifc-ontology.ttl')
+    # Motor de validação: 'pyshacl' (grafo RDF com inferência RDFS) ou 'native'
+    # (regras simples verificadas diretamente no modelo IFC, com pyshacl para o resto)
+    VALIDATION_ENGINE = os.environ.get("VALIDATION_ENGINE", "pyshacl")
+    # Conversão IFC→RDF em paralelo: processos e número mínimo de entidades IfcRoot para usar o pool
+    CONVERSION_WORKERS = int(os.environ.get("CONVERSION_WORKERS", os.cpu_count() or 1))
+    CONVERSION_PARALLEL_MIN_ENTITIES = int(os.environ.get("CONVERSION_PARALLEL_MIN_ENTITIES", 20000))
+    # Conversão em streaming (sem Graph em memória) para ficheiros IFC a partir deste
+    # tamanho em bytes (0 desativa) e limite de memória do processo em MB (0 = sem limite)
+    CONVERSION_STREAMING_MIN_BYTES = int(os.environ.get("CONVERSION_STREAMING_MIN_BYTES", 200 * 1024 * 1024))
+    CONVERSION_MEMORY_LIMIT_MB = int(os.environ.get("CONVERSION_MEMORY_LIMIT_MB", 0))
+    # Deteção de colisões geométricas: ativa ou não, threads/processos usados na
+    # triangulação e nas verificações exatas, e interpenetração mínima (metros)
+    CLASH_DETECTION = os.environ.get("CLASH_DETECTION", "0") == "1"
+    CLASH_WORKERS = int(os.environ.get("CLASH_WORKERS", os.cpu_count() or 1))
+    CLASH_TOLERANCE = float(os.environ.get("CLASH_TOLERANCE", 0.01))
+    # Validação SHACL em paralelo: processos e tamanho mínimo do grafo (triplos) para usar o pool
+    SHACL_WORKERS = int(os.environ.get("SHACL_WORKERS", os.cpu_count() or 1))
+    SHACL_PARALLEL_MIN_TRIPLES = int(os.environ.get("SHACL_PARALLEL_MIN_TRIPLES", 50000))
+    # Relatórios e grafos guardados por hash do ficheiro IFC e versão das regras, e tamanho
+    # máximo da pasta em MB (as entradas usadas há mais tempo são removidas; 0 = sem limite)
+    RESULT_CACHE_FOLDER = os.environ.get("RESULT_CACHE_FOLDER") or os.path.join(BASE_DIR, 'data', 'result_cache')
+    RESULT_CACHE_MAX_MB = int(os.environ.get("RESULT_CACHE_MAX_MB", 5120))
+    # Último grafo carregado de cada modelo, no formato binário compacto (recarregável sem o IFC)
+    MODEL_STORE_FOLDER = os.environ.get("MODEL_STORE_FOLDER") or os.path.join(BASE_DIR, 'data', 'models')
+    # Impressões digitais por projeto usadas nas atualizações incrementais do Fuseki
+    FINGERPRINT_FOLDER = os.environ.get("FINGERPRINT_FOLDER") or os.path.join(BASE_DIR, 'data', 'fingerprints')
     
     # --- INÍCIO DA CORREÇÃO ---
     # Adicionadas credenciais para o Fuseki
@@ -14,7 +46,65 @@ class Config:
     FUSEKI_PASSWORD = os.environ.get('FUSEKI_PASSWORD') or 'admin123'
     # --- FIM DA CORREÇÃO ---
 
+    # Profiler por amostragem ativado pedido a pedido (?profile=1 ou cabeçalho
+    # X-Profile: 1): permitido ou não, intervalo entre amostras (s) e perfis guardados
+    PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+    PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.005))
+    PROFILER_KEEP = int(os.environ.get("PROFILER_KEEP", 20))
+
+    # Motor de consultas: 'fuseki' (servidor SPARQL) ou 'local' (grafo em memória
+    # no próprio processo, sem Fuseki; útil para desenvolvimento e testes)
+    QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "fuseki")
     FUSEKI_QUERY_ENDPOINT = os.environ.get("FUSEKI_QUERY_ENDPOINT", "http://localhost:3030/BIM_Knowledge_Base/query")
     FUSEKI_GSP_ENDPOINT = os.environ.get("FUSEKI_GSP_ENDPOINT", "http://localhost:3030/BIM_Knowledge_Base/data")
+    FUSEKI_UPDATE_ENDPOINT = os.environ.get("FUSEKI_UPDATE_ENDPOINT", "http://localhost:3030/BIM_Knowledge_Base/update")
+    # Ligações mantidas abertas ao Fuseki e cache de resultados das consultas
+    # (número máximo de entradas e validade em segundos)
+    SPARQL_POOL_SIZE = int(os.environ.get("SPARQL_POOL_SIZE", 10))
+    SPARQL_CACHE_SIZE = int(os.environ.get("SPARQL_CACHE_SIZE", 512))
+    SPARQL_CACHE_TTL = int(os.environ.get("SPARQL_CACHE_TTL", 300))
+    # Paginação do grafo completo (arestas por página, por omissão e máximo)
+    FULL_GRAPH_PAGE_SIZE = int(os.environ.get("FULL_GRAPH_PAGE_SIZE", 500))
+    FULL_GRAPH_MAX_PAGE_SIZE = int(os.environ.get("FULL_GRAPH_MAX_PAGE_SIZE", 5000))
+    # Acima deste número de vizinhos, a expansão de um nó agrega-os por classe
+    GRAPH_LOD_THRESHOLD = int(os.environ.get("GRAPH_LOD_THRESHOLD", 50))
+    # Expansões de vários saltos e caminhos no índice de adjacência: profundidade máxima,
+    # número máximo de nós devolvidos e de nós visitados na procura de um caminho
+    GRAPH_MAX_DEPTH = int(os.environ.get("GRAPH_MAX_DEPTH", 6))
+    GRAPH_MAX_NODES = int(os.environ.get("GRAPH_MAX_NODES", 2000))
+    GRAPH_PATH_MAX_VISITED = int(os.environ.get("GRAPH_PATH_MAX_VISITED", 200000))
+    # Semelhança mínima (0 a 1) para aceitar um nome de elemento mal escrito no chatbot
+    LABEL_FUZZY_CUTOFF = float(os.environ.get("LABEL_FUZZY_CUTOFF", 0.75))
+    # Número máximo de exemplos por classe no resumo da ontologia
+    ONTOLOGY_SUMMARY_MAX_EXAMPLES = int(os.environ.get("ONTOLOGY_SUMMARY_MAX_EXAMPLES", 20))
+    # Número máximo de intervalos de um histograma e de elementos no "top N" do mapa de quantidades
+    TAKEOFF_MAX_RESULTS = int(os.environ.get("TAKEOFF_MAX_RESULTS", 1000))
+    # Número de triplos enviados por pedido durante o carregamento no Fuseki
+    FUSEKI_UPLOAD_CHUNK_SIZE = int(os.environ.get("FUSEKI_UPLOAD_CHUNK_SIZE", 50000))
     OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/chat")
-    BASE_URI = "http://exemplo.org/bim#"
\ No newline at end of file
+    OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "gemma3:4b")
+
+    # Sugestões do LLM: pedidos simultâneos, timeout (s) e cache persistente em disco
+    LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+    LLM_TIMEOUT = int(os.environ.get("LLM_TIMEOUT", 60))
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH") or os.path.join(BASE_DIR, 'data', 'llm_cache.sqlite3')
+    BASE_URI = "http://exemplo.org/bim#"
+
+    # Processamento assíncrono de uploads: número de workers, tamanho máximo
+    # da fila e tempo (s) durante o qual os resultados ficam disponíveis
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", 20))
+    JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 3600))
+    # Estado e resultado de cada tarefa, partilhados entre os processos do servidor, e
+    # intervalo (s) com que cada processo renova os registos das suas tarefas por terminar
+    JOB_STATE_FOLDER = os.environ.get("JOB_STATE_FOLDER") or os.path.join(BASE_DIR, 'data', 'jobs')
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get("JOB_HEARTBEAT_INTERVAL", 30))
+
+    # Servidor de produção (gunicorn -c gunicorn.conf.py run:app): endereço, processos
+    # criados por fork depois de carregar a aplicação, threads por processo e timeout (s)
+    SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:5001")
+    SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1))
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+    SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 120))
+    # Tempo máximo (s) da verificação do Fuseki em /ready
+    READINESS_TIMEOUT = float(os.environ.get("READINESS_TIMEOUT", 2))
\ No newline at end of file
@@ -0,0 +1,33 @@
+# Ficheiro: gunicorn.conf.py
+# Descrição: Servidor de produção. Executar com: gunicorn -c gunicorn.conf.py run:app
+#
+# Com preload_app, a aplicação (ifcopenshell, pyshacl, spaCy, regras SHACL e
+# modelo de NLU) é carregada uma única vez no processo mestre; os workers são
+# criados por fork e partilham essa memória. Cada worker atende SERVER_THREADS
+# pedidos em simultâneo. Valores configuráveis por variáveis de ambiente (config.py).
+
+from config import Config
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_class = "gthread"
+timeout = Config.SERVER_TIMEOUT
+preload_app = True
+accesslog = "-"
+
+# O motor de consultas local mantém o grafo na memória do processo: com vários
+# workers, cada um teria o seu próprio modelo ativo
+if Config.QUERY_BACKEND == "local":
+    workers = 1
+
+def when_ready(server):
+    # Corre no mestre, depois de carregar a aplicação e antes de criar os workers
+    from app import app
+    from app.services import serving
+    serving.preload(app)
+
+def post_fork(server, worker):
+    from app import app
+    from app.services import serving
+    serving.after_fork(app)
@@ -0,0 +1,37 @@
+"""
+Configuração comum dos testes: a aplicação corre com o motor de consultas
+local (sem Fuseki), sem carregar o modelo de NLU no arranque, sem Ollama (os
+pedidos de sugestões falham de imediato, exceto com o servidor simulado de
+test_llm_suggestions) e com todas as pastas de dados numa pasta temporária.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_DATA_DIR = tempfile.mkdtemp(prefix="bim-tests-")
+os.environ.update({
+    "QUERY_BACKEND": "local",
+    "NLU_WARMUP": "0",
+    "MODEL_STORE_FOLDER": os.path.join(_DATA_DIR, "models"),
+    "RESULT_CACHE_FOLDER": os.path.join(_DATA_DIR, "result_cache"),
+    "FINGERPRINT_FOLDER": os.path.join(_DATA_DIR, "fingerprints"),
+    "JOB_STATE_FOLDER": os.path.join(_DATA_DIR, "jobs"),
+    "LLM_CACHE_PATH": os.path.join(_DATA_DIR, "llm_cache.sqlite3"),
+    "OLLAMA_API_URL": "http://127.0.0.1:9/api/chat",
+})
+
+from app import app as flask_app  # noqa: E402  (as variáveis de ambiente têm de vir antes)
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.config.update(TESTING=True)
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
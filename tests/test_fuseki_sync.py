@@ -0,0 +1,44 @@
+"""Carregamento incremental no Fuseki (sync_model_to_fuseki), com as chamadas HTTP simuladas."""
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+from app.services import fuseki_manager, sparql_client
+
+def _graph(names):
+    graph = Graph()
+    for key, name in names.items():
+        graph.add((URIRef(f"http://exemplo.org/bim#{key}"), URIRef("http://exemplo.org/bim#name"), Literal(name)))
+    return graph
+
+@pytest.fixture
+def fuseki(app, monkeypatch):
+    """Regista os carregamentos completos e as atualizações incrementais; `triples` é o que o Fuseki tem."""
+    state = {"full": 0, "delta": 0, "triples": 0}
+
+    def upload(graph, model_name="default"):
+        state["full"] += 1
+        state["triples"] = len(graph)
+        return True
+
+    def delta(target_graph, rows, stale_subjects, new_subjects):
+        state["delta"] += 1
+        state["triples"] += sum(len(rows[subject]) for subject in new_subjects) - len(stale_subjects)
+
+    monkeypatch.setattr(fuseki_manager, "upload_to_fuseki", upload)
+    monkeypatch.setattr(fuseki_manager, "_apply_delta", delta)
+    monkeypatch.setattr(sparql_client, "count_graph_triples", lambda graph_uri: state["triples"])
+    monkeypatch.setattr(sparql_client, "set_active_graph", lambda graph_uri: None)
+    with app.app_context():
+        yield state
+
+def test_changed_subject_is_sent_as_a_delta(fuseki):
+    assert fuseki_manager.sync_model_to_fuseki(_graph({"a": "Parede", "b": "Porta"}), "incremental")
+    assert fuseki_manager.sync_model_to_fuseki(_graph({"a": "Parede", "b": "Janela"}), "incremental")
+    assert (fuseki["full"], fuseki["delta"], fuseki["triples"]) == (1, 1, 2)
+
+def test_lost_graph_falls_back_to_full_upload(fuseki):
+    assert fuseki_manager.sync_model_to_fuseki(_graph({"a": "Parede", "b": "Porta"}), "perdido")
+    # O Fuseki reiniciou com um dataset em memória: o grafo do modelo desapareceu
+    fuseki["triples"] = 0
+    assert fuseki_manager.sync_model_to_fuseki(_graph({"a": "Parede", "b": "Janela"}), "perdido")
+    assert (fuseki["full"], fuseki["delta"], fuseki["triples"]) == (2, 0, 2)
@@ -0,0 +1,61 @@
+"""API de tarefas assíncronas (/api/jobs) com o motor de consultas local."""
+import time
+
+import pytest
+
+from app.services import job_manager
+from benchmarks.synthetic_ifc import generate_file
+
+@pytest.fixture
+def ifc_path(tmp_path):
+    path = tmp_path / "tarefa.ifc"
+    generate_file(str(path), storeys=1, walls_per_storey=4, doors_per_storey=2, seed=11)
+    return path
+
+def _submit(client, path):
+    with open(path, "rb") as f:
+        return client.post("/api/jobs", data={"ifc_file": (f, "tarefa.ifc")}, content_type="multipart/form-data")
+
+def _wait(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").get_json()
+        if status["status"] in (job_manager.DONE, job_manager.FAILED):
+            return status
+        time.sleep(0.05)
+    pytest.fail(f"A tarefa {job_id} não terminou em {timeout}s.")
+
+def test_job_runs_to_completion(client, ifc_path):
+    response = _submit(client, ifc_path)
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    status = _wait(client, job_id)
+    assert status["status"] == job_manager.DONE
+    assert status["progress"] == 100
+    assert "result" not in status
+
+    result = client.get(f"/api/jobs/{job_id}/result")
+    assert result.status_code == 200
+    # As portas do modelo sintético preenchem aberturas, e não paredes
+    door_conflicts = [item for item in result.get_json()
+                      if item["type"] == "CONFLITO" and item["message"] == "Portas devem ser instaladas em paredes"]
+    assert len(door_conflicts) == 2
+    assert all("suggestion_llm" in item for item in door_conflicts)
+
+def test_unknown_job(client):
+    assert client.get("/api/jobs/inexistente").status_code == 404
+    assert client.get("/api/jobs/inexistente/result").status_code == 404
+
+def test_submit_requires_an_ifc_file(client, tmp_path):
+    assert client.post("/api/jobs", data={}, content_type="multipart/form-data").status_code == 400
+    other = tmp_path / "notas.txt"
+    other.write_text("não é IFC")
+    with open(other, "rb") as f:
+        response = client.post("/api/jobs", data={"ifc_file": (f, "notas.txt")}, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+def test_full_queue_rejects_jobs(app, client, ifc_path, monkeypatch):
+    monkeypatch.setitem(app.config, "JOB_QUEUE_MAX", 0)
+    response = _submit(client, ifc_path)
+    assert response.status_code == 503
@@ -0,0 +1,72 @@
+"""Sugestões do LLM contra um servidor Ollama simulado (http.server local)."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import llm_suggestions
+
+class _OllamaStub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.prompts.append(body["messages"][0]["content"])
+        if server.mode == "error":
+            self.send_response(500)
+            self.end_headers()
+            return
+        if server.mode == "malformed":
+            payload = {"message": None}
+        else:
+            payload = {"message": {"role": "assistant", "content": f"Corrigir: {body['messages'][0]['content'][-10:]}"}}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def ollama(app, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaStub)
+    server.prompts = []
+    server.mode = "ok"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    previous = {key: app.config[key] for key in ("OLLAMA_API_URL", "LLM_CACHE_PATH")}
+    app.config.update(OLLAMA_API_URL=f"http://127.0.0.1:{server.server_port}/api/chat",
+                      LLM_CACHE_PATH=str(tmp_path / "llm_cache.sqlite3"))
+    with app.app_context():
+        yield server
+    app.config.update(previous)
+    server.shutdown()
+    server.server_close()
+
+CONFLICTS = [("ShapeA", "Parede sem material"), ("ShapeA", "Parede sem material"), ("ShapeB", "Porta sem andar")]
+
+def test_repeated_conflicts_are_requested_once(ollama):
+    suggestions = llm_suggestions.get_suggestions(CONFLICTS)
+    assert len(ollama.prompts) == 2
+    assert set(suggestions) == set(CONFLICTS)
+    assert all(suggestion.startswith("Corrigir:") for suggestion in suggestions.values())
+
+def test_cached_suggestions_are_not_requested_again(ollama):
+    first = llm_suggestions.get_suggestions(CONFLICTS)
+    second = llm_suggestions.get_suggestions(CONFLICTS)
+    assert second == first
+    assert len(ollama.prompts) == 2
+
+@pytest.mark.parametrize("mode", ["error", "malformed"])
+def test_failures_are_not_cached(ollama, mode):
+    ollama.mode = mode
+    failed = llm_suggestions.get_suggestions(CONFLICTS)
+    assert set(failed.values()) == {llm_suggestions.FALLBACK_SUGGESTION}
+
+    ollama.mode = "ok"
+    recovered = llm_suggestions.get_suggestions(CONFLICTS)
+    assert llm_suggestions.FALLBACK_SUGGESTION not in recovered.values()
+    assert len(ollama.prompts) == 4
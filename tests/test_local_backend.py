@@ -0,0 +1,108 @@
+"""
+Consultas sobre um modelo carregado no motor local (QUERY_BACKEND=local):
+grafo completo por páginas, vista resumida, mapa de quantidades, expansão
+por vários níveis e caminho mais curto.
+"""
+import json
+
+import pytest
+
+from benchmarks.synthetic_ifc import generate_model
+
+BASE_URI = "http://exemplo.org/bim#"
+
+@pytest.fixture(scope="module")
+def model(app, tmp_path_factory):
+    """Modelo sintético enviado para /validate, que fica como modelo ativo."""
+    ifc_model = generate_model(storeys=2, walls_per_storey=6, doors_per_storey=2, seed=7)
+    path = tmp_path_factory.mktemp("local") / "modelo.ifc"
+    ifc_model.write(str(path))
+    with open(path, "rb") as f:
+        response = app.test_client().post("/validate", data={"ifc_file": (f, "modelo.ifc")},
+                                          content_type="multipart/form-data")
+    assert response.status_code == 200
+    return ifc_model
+
+def _uri(entity):
+    return BASE_URI + entity.GlobalId
+
+def _edges(page):
+    return [(edge["from"], edge["label"], edge["to"]) for edge in page["edges"]]
+
+def test_full_graph_pages_cover_the_stream_without_repeats(client, model):
+    paged, cursor, pages = [], None, 0
+    while True:
+        page = client.get("/api/full-graph", query_string={"limit": 25, **({"cursor": cursor} if cursor else {})}).get_json()
+        paged.extend(_edges(page))
+        pages += 1
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    assert pages > 1
+    assert len(paged) == len(set(paged))
+
+    response = client.get("/api/full-graph", query_string={"format": "ndjson", "limit": 25})
+    assert response.mimetype == "application/x-ndjson"
+    streamed = [edge for line in response.get_data(as_text=True).splitlines() for edge in _edges(json.loads(line))]
+    assert streamed == paged
+
+def test_full_graph_filters_and_invalid_cursor(client, model):
+    page = client.get("/api/full-graph", query_string={"predicate": "isContainedIn", "limit": 500}).get_json()
+    assert page["edges"] and all(edge["label"] == "is Contained In" for edge in page["edges"])
+    assert client.get("/api/full-graph", query_string={"cursor": "inválido"}).status_code == 400
+
+def test_graph_summary_groups_can_be_drilled_down(client, model):
+    summary = client.get("/api/graph-summary").get_json()
+    labels = {node["label"] for node in summary["nodes"]}
+    assert {"Piso 0 [Ifc Building Storey]", "Piso 1 [Ifc Building Storey]"} <= labels
+
+    group = next(node for node in summary["nodes"] if node.get("group_key", {}).get("type") == BASE_URI + "IfcWall")
+    members, cursor = [], None
+    while True:
+        page = client.post("/api/graph-group", json={"group_key": group["group_key"], "limit": 4, "cursor": cursor}).get_json()
+        members.extend(node["id"] for node in page["nodes"])
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    assert len(members) == len(set(members)) == group["count"] == 6
+
+def test_takeoff_analyses_agree(client, model):
+    measures = {entry["measure"]: entry for entry in client.get("/api/takeoff").get_json()}
+    volume = measures["NetVolume"]
+    # Cada parede, porta e laje do modelo sintético tem uma quantidade NetVolume
+    assert volume["count"] == sum(len(model.by_type(ifc_class)) for ifc_class in ("IfcWall", "IfcDoor", "IfcSlab"))
+
+    by_storey = client.get("/api/takeoff/totals", query_string={"measure": "NetVolume", "group_by": "container"}).get_json()
+    assert {row["container"] for row in by_storey} == {"Piso 0", "Piso 1"}
+    assert sum(row["count"] for row in by_storey) == volume["count"]
+    assert sum(row["sum"] for row in by_storey) == pytest.approx(volume["sum"])
+
+    histogram = client.get("/api/takeoff/histogram", query_string={"measure": "NetVolume", "bins": 4}).get_json()
+    assert sum(histogram["counts"]) == volume["count"]
+    assert histogram["edges"][0] == pytest.approx(volume["min"]) and histogram["edges"][-1] == pytest.approx(volume["max"])
+
+    top = client.get("/api/takeoff/top", query_string={"measure": "NetVolume", "n": 3}).get_json()
+    values = [item["value"] for item in top]
+    assert values == sorted(values, reverse=True) and values[0] == pytest.approx(volume["max"])
+    storey = client.get("/api/takeoff/top", query_string={"measure": "NetVolume", "n": 50, "container": "Piso 1"}).get_json()
+    assert storey and all(item["container"] == "Piso 1" for item in storey)
+
+    assert client.get("/api/takeoff/totals", query_string={"measure": "Inexistente"}).status_code == 400
+    assert client.get("/api/takeoff/top", query_string={"measure": "NetVolume", "n": 0}).status_code == 400
+
+def test_expand_and_shortest_path(client, model):
+    storey = model.by_type("IfcBuildingStorey")[0]
+    walls = {_uri(wall) for wall in model.by_type("IfcWall") if wall.ContainedInStructure[0].RelatingStructure == storey}
+    expanded = client.post("/api/expand-graph", json={"node_uri": _uri(storey), "depth": 2}).get_json()
+    nodes = {node["id"]: node for node in expanded["nodes"]}
+    assert walls <= set(nodes)
+    assert nodes[_uri(storey)]["level"] == 0
+
+    door = model.by_type("IfcDoor")[0]
+    project = model.by_type("IfcProject")[0]
+    path = client.post("/api/graph-path", json={"source": _uri(door), "target": _uri(project)}).get_json()
+    # Porta -> andar -> edifício -> terreno -> projeto
+    assert path["length"] == len(path["edges"]) == 4
+    assert {_uri(door), _uri(project)} <= {node["id"] for node in path["nodes"]}
+
+    assert client.post("/api/expand-graph", json={"node_uri": _uri(storey), "depth": 2, "direction": "lado"}).status_code == 400
@@ -0,0 +1,32 @@
+"""Recarregamento de um modelo a partir do grafo guardado (/api/models/<nome>/reload)."""
+import hashlib
+
+from app.services import result_cache
+from benchmarks.synthetic_ifc import generate_file
+
+def _upload(client, path):
+    with open(path, "rb") as f:
+        response = client.post("/validate", data={"ifc_file": (f, path.name)}, content_type="multipart/form-data")
+    assert response.status_code == 200
+
+def _derived(client):
+    """Mapa de quantidades e resumo da ontologia do modelo ativo."""
+    return client.get("/api/takeoff").get_json(), client.get("/ontology-summary").get_json()
+
+def test_reload_refreshes_the_derived_data(app, client, tmp_path):
+    first, second = tmp_path / "primeiro.ifc", tmp_path / "segundo.ifc"
+    generate_file(str(first), storeys=2, walls_per_storey=6, doors_per_storey=2, seed=3)
+    generate_file(str(second), storeys=1, walls_per_storey=3, doors_per_storey=1, seed=4)
+    first_hash = hashlib.sha256(first.read_bytes()).hexdigest()
+
+    _upload(client, first)
+    first_derived = _derived(client)
+    _upload(client, second)
+    assert _derived(client) != first_derived
+
+    assert client.post("/api/models/primeiro/reload").get_json() == {"success": True, "model": "primeiro"}
+    assert _derived(client) == first_derived
+    with app.app_context():
+        assert result_cache.get_loaded_hash("primeiro") == first_hash
+
+    assert client.post("/api/models/inexistente/reload").status_code == 404